@@ -0,0 +1,378 @@
+# analytics.py
+"""
+Columnar snapshot of the clinic's facts for long-range reports.
+
+    python maintenance.py analytics-refresh
+    python maintenance.py analytics-report
+
+Patients, appointments, prescriptions and bills are exported to one flat
+binary file per column under CLINIC_ANALYTICS_DIR (dates as day numbers,
+money in paise, status / gender / diagnosis as small integer codes) and
+memory-mapped by Snapshot, whose group-bys and time series are a few NumPy
+passes over those arrays instead of aggregate queries on the live tables.
+
+refresh() is incremental: each table continues from the last exported id
+and re-reads ID_OVERLAP ids behind it (a MySQL transaction can commit a
+lower id after a higher one). Appointment status changes are picked up from
+change_log. manifest.json (row counts, watermarks, code vocabularies) is
+replaced atomically after the columns are written, so readers never see a
+half-appended row; run one refresh at a time.
+"""
+import json
+import os
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+import models
+from db import db
+
+DIR = os.environ.get('CLINIC_ANALYTICS_DIR', 'analytics_snapshot')
+CHUNK = 50000           # rows per export query
+ID_OVERLAP = 200        # ids re-read behind each table's watermark
+EPOCH = date(1970, 1, 1).toordinal()
+NONE = -1               # missing day / age / code
+
+AGE_BINS = [18, 36, 51, 66]
+AGE_GROUPS = ['<18', '18-35', '36-50', '51-65', '66+', 'Unknown']
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _day(d):
+    if d is None:
+        return NONE
+    if isinstance(d, str):
+        d = date.fromisoformat(d[:10])
+    return d.toordinal() - EPOCH
+
+def _minutes(slot):
+    try:
+        h, m = str(slot).split(":")[:2]
+        return int(h) * 60 + int(m)
+    except ValueError:
+        return NONE
+
+def _paise(amount):
+    return NONE if amount is None else int(round(amount * 100))
+
+
+# table -> (export query, [(column, dtype, row -> value)]); `vocab` columns hold codes
+FACTS = {
+    'patient': ("""SELECT patient_id AS id, age, gender, created_at FROM patient
+                   WHERE patient_id > %s ORDER BY patient_id LIMIT %s""",
+                [('id', '<i4', lambda r, v: r['id']),
+                 ('age', '<i2', lambda r, v: NONE if r['age'] is None else r['age']),
+                 ('gender', '<i2', lambda r, v: v.code('gender', r['gender'])),
+                 ('created', '<i4', lambda r, v: _day(r['created_at']))]),
+    'appointment': ("""SELECT appointment_id AS id, patient_id, date, time_slot, status FROM appointment
+                       WHERE appointment_id > %s ORDER BY appointment_id LIMIT %s""",
+                    [('id', '<i4', lambda r, v: r['id']),
+                     ('patient', '<i4', lambda r, v: r['patient_id']),
+                     ('day', '<i4', lambda r, v: _day(r['date'])),
+                     ('minute', '<i2', lambda r, v: _minutes(r['time_slot'])),
+                     ('status', '<i2', lambda r, v: v.code('status', r['status']))]),
+    'prescription': ("""SELECT pr.prescription_id AS id, pr.appointment_id, a.patient_id, a.date, d.name AS diagnosis
+                        FROM prescription pr JOIN appointment a ON a.appointment_id = pr.appointment_id
+                        LEFT JOIN diagnosis d ON d.diagnosis_id = pr.diagnosis_id
+                        WHERE pr.prescription_id > %s ORDER BY pr.prescription_id LIMIT %s""",
+                     [('id', '<i4', lambda r, v: r['id']),
+                      ('appointment', '<i4', lambda r, v: r['appointment_id']),
+                      ('patient', '<i4', lambda r, v: r['patient_id']),
+                      ('day', '<i4', lambda r, v: _day(r['date'])),
+                      ('diagnosis', '<i4', lambda r, v: v.code('diagnosis', r['diagnosis']))]),
+    'billing': ("""SELECT b.bill_id AS id, b.appointment_id, a.patient_id, b.date, b.total_amount
+                   FROM billing b JOIN appointment a ON a.appointment_id = b.appointment_id
+                   WHERE b.bill_id > %s ORDER BY b.bill_id LIMIT %s""",
+                [('id', '<i4', lambda r, v: r['id']),
+                 ('appointment', '<i4', lambda r, v: r['appointment_id']),
+                 ('patient', '<i4', lambda r, v: r['patient_id']),
+                 ('day', '<i4', lambda r, v: _day(r['date'])),
+                 ('paise', '<i8', lambda r, v: _paise(r['total_amount']))]),
+}
+
+
+class Vocab:
+    """name -> list of values; a value's code is its index (None / '' -> NONE)."""
+    def __init__(self, lists=None):
+        self.lists = {k: list(vs) for k, vs in (lists or {}).items()}
+        self._index = {k: {v: i for i, v in enumerate(vs)} for k, vs in self.lists.items()}
+
+    def code(self, name, value):
+        if value is None or value == '':
+            return NONE
+        index = self._index.setdefault(name, {})
+        i = index.get(value)
+        if i is None:
+            values = self.lists.setdefault(name, [])
+            i = index[value] = len(values)
+            values.append(value)
+        return i
+
+    def values(self, name):
+        return self.lists.get(name, [])
+
+
+# --- export ---
+def _path(path, table, column):
+    return os.path.join(path, f"{table}.{column}.bin")
+
+def _load_manifest(path):
+    try:
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'tables': {}, 'change_id': 0, 'vocab': {}}
+
+def _save_manifest(path, manifest):
+    tmp = os.path.join(path, "manifest.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(path, "manifest.json"))
+
+def _ids(path, table, rows):
+    return np.memmap(_path(path, table, 'id'), '<i4', 'r', shape=(rows,)) if rows else np.empty(0, '<i4')
+
+def _export(path, table, vocab, rows, last_id, floor):
+    """Re-export `table` from id > floor, overwriting from the first row past it. Returns (rows, last_id)."""
+    query, columns = FACTS[table]
+    pos = int(np.searchsorted(_ids(path, table, rows), floor, side='right'))
+    after = floor
+    files = {name: open(_path(path, table, name), "r+b" if os.path.exists(_path(path, table, name)) else "w+b")
+             for name, _, _ in columns}
+    try:
+        for name, dtype, _ in columns:
+            files[name].seek(pos * np.dtype(dtype).itemsize)
+        while True:
+            batch = db.fetchall(query, (after, CHUNK))
+            for name, dtype, get in columns:
+                files[name].write(np.fromiter((get(r, vocab) for r in batch), dtype, len(batch)).tobytes())
+            pos += len(batch)
+            if batch:
+                after = batch[-1]['id']
+            if len(batch) < CHUNK:
+                break
+        for f in files.values():
+            f.truncate()        # drop rows past the new end (a re-read tail that shrank, a crashed refresh)
+    finally:
+        for f in files.values():
+            f.close()
+    return pos, max(last_id, after)
+
+def _apply_status_changes(path, manifest, vocab):
+    """Rewrite the status of exported appointments changed since the last refresh."""
+    t = manifest['tables'].get('appointment')
+    if not t or not t['rows']:
+        return
+    ids = _ids(path, 'appointment', t['rows'])
+    after = max(0, manifest['change_id'] - models.CHANGE_OVERLAP)
+    changed = set()
+    while True:
+        rows = models.changes_since('appointment', after, CHUNK)
+        changed.update(r['row_id'] for r in rows)
+        if len(rows) < CHUNK:
+            break
+        after = rows[-1]['change_id']
+    changed = sorted(i for i in changed if i <= t['last_id'])
+    if not changed:
+        return
+    status = np.memmap(_path(path, 'appointment', 'status'), '<i2', 'r+', shape=(t['rows'],))
+    for k in range(0, len(changed), 1000):
+        part = changed[k:k + 1000]
+        rows = db.fetchall(f"""SELECT appointment_id, status FROM appointment
+                               WHERE appointment_id IN ({','.join(['%s'] * len(part))})""", part)
+        got = np.array([r['appointment_id'] for r in rows], '<i4')
+        at = np.searchsorted(ids, got)
+        found = (at < len(ids)) & (ids[np.minimum(at, len(ids) - 1)] == got)
+        status[at[found]] = np.array([vocab.code('status', r['status']) for r in rows], '<i2')[found]
+    status.flush()
+
+def _change_log_pruned(after):
+    row = db.fetchone("SELECT MIN(change_id) AS id FROM change_log")
+    return after > 0 and (row['id'] is None or row['id'] > after + 1)
+
+def refresh(path=None, full=False):
+    """
+    Bring the snapshot at `path` up to date (from scratch with full=True).
+    Returns {table: rows} after the refresh.
+    """
+    path = path or DIR
+    os.makedirs(path, exist_ok=True)
+    manifest = {'tables': {}, 'change_id': 0, 'vocab': {}} if full else _load_manifest(path)
+    vocab = Vocab(manifest['vocab'])
+    change_id = models.last_change_id()      # taken first: changes committed during the export are re-read next time
+    # status changes are followed through change_log; if it was pruned past the watermark, re-export appointments
+    rescan = _change_log_pruned(manifest['change_id'])
+    for table in FACTS:
+        t = manifest['tables'].get(table, {'rows': 0, 'last_id': 0})
+        if table == 'appointment' and not rescan:
+            _apply_status_changes(path, manifest, vocab)
+        floor = 0 if table == 'appointment' and rescan else max(0, t['last_id'] - ID_OVERLAP)
+        rows, last_id = _export(path, table, vocab, t['rows'], t['last_id'], floor)
+        manifest['tables'][table] = {'rows': rows, 'last_id': last_id}
+    manifest['change_id'] = change_id
+    manifest['vocab'] = vocab.lists
+    manifest['refreshed_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    _save_manifest(path, manifest)
+    return {table: t['rows'] for table, t in manifest['tables'].items()}
+
+
+# --- reading ---
+class Snapshot:
+    """
+    Read-only, memory-mapped view of the snapshot at `path` as of its last refresh.
+
+    Day columns are days since 1970-01-01 (NONE when unknown); `first` /
+    `last` arguments take dates or 'YYYY-MM-DD' and are inclusive.
+    """
+    def __init__(self, path=None):
+        self.path = path or DIR
+        manifest = _load_manifest(self.path)
+        self.rows = {table: t['rows'] for table, t in manifest['tables'].items()}
+        self.refreshed_at = manifest.get('refreshed_at')
+        self.vocab = Vocab(manifest['vocab'])
+        self._cols = {}
+
+    def column(self, table, name):
+        key = (table, name)
+        if key not in self._cols:
+            dtype = next(d for c, d, _ in FACTS[table][1] if c == name)
+            n = self.rows.get(table, 0)
+            self._cols[key] = (np.memmap(_path(self.path, table, name), dtype, 'r', shape=(n,)) if n
+                               else np.empty(0, dtype))
+        return self._cols[key]
+
+    def _in_range(self, days, first, last):
+        keep = days != NONE
+        if first is not None:
+            keep &= days >= _day(first)
+        if last is not None:
+            keep &= days <= _day(last)
+        return keep
+
+    def _by_code(self, codes, name):
+        return np.bincount(codes[codes != NONE], minlength=len(self.vocab.values(name)))
+
+    def _age_groups_of(self, patient_ids):
+        """Index into AGE_GROUPS for each patient id (Unknown when the patient is not in the snapshot)."""
+        ids, ages = self.column('patient', 'id'), self.column('patient', 'age')
+        age = np.full(len(patient_ids), NONE, '<i2')
+        if len(ids):
+            at = np.minimum(np.searchsorted(ids, patient_ids), len(ids) - 1)
+            known = ids[at] == patient_ids
+            age[known] = ages[at[known]]
+        return np.where(age == NONE, len(AGE_GROUPS) - 1, np.digitize(age, AGE_BINS))
+
+    # --- counts ---
+    def age_groups(self):
+        """[{'age_group', 'cnt'}] like models.get_age_group_counts (empty groups left out)."""
+        ages = self.column('patient', 'age')
+        groups = np.where(ages == NONE, len(AGE_GROUPS) - 1, np.digitize(ages, AGE_BINS))
+        counts = np.bincount(groups, minlength=len(AGE_GROUPS))
+        return [{'age_group': g, 'cnt': int(c)} for g, c in zip(AGE_GROUPS, counts) if c]
+
+    def status_counts(self, first=None, last=None):
+        """[{'status', 'cnt'}] over appointments dated first..last."""
+        keep = self._in_range(self.column('appointment', 'day'), first, last)
+        counts = self._by_code(self.column('appointment', 'status')[keep], 'status')
+        return [{'status': s, 'cnt': int(c)} for s, c in zip(self.vocab.values('status'), counts) if c]
+
+    def disease_distribution(self, limit=10, first=None, last=None):
+        """[{'diagnosis', 'cnt'}], most frequent first, over prescriptions dated first..last."""
+        keep = self._in_range(self.column('prescription', 'day'), first, last)
+        counts = self._by_code(self.column('prescription', 'diagnosis')[keep], 'diagnosis')
+        top = np.argsort(-counts, kind='stable')[:limit]
+        names = self.vocab.values('diagnosis')
+        return [{'diagnosis': names[i], 'cnt': int(counts[i])} for i in top if counts[i]]
+
+    def age_by_diagnosis(self, top=10, first=None, last=None):
+        """(diagnoses, AGE_GROUPS, counts[len(diagnoses), len(AGE_GROUPS)]) for the `top` diagnoses."""
+        keep = self._in_range(self.column('prescription', 'day'), first, last)
+        dx = self.column('prescription', 'diagnosis')[keep]
+        patients = self.column('prescription', 'patient')[keep]
+        known = dx != NONE
+        dx, patients = dx[known], patients[known]
+        names = self.vocab.values('diagnosis')
+        table = np.bincount(dx * len(AGE_GROUPS) + self._age_groups_of(patients),
+                            minlength=len(names) * len(AGE_GROUPS)).reshape(len(names), len(AGE_GROUPS))
+        order = np.argsort(-table.sum(axis=1), kind='stable')[:top]
+        order = order[table[order].sum(axis=1) > 0]
+        return [names[i] for i in order], AGE_GROUPS, table[order]
+
+    def weekday_load(self, first=None, last=None):
+        """[{'weekday', 'appointments', 'per_day'}], Monday first; per_day averages over days with appointments."""
+        days = self.column('appointment', 'day')
+        days = days[self._in_range(days, first, last)]
+        weekday = (days + 3) % 7            # 1970-01-01 was a Thursday
+        counts = np.bincount(weekday, minlength=7)
+        open_days = np.unique(days)
+        opened = np.bincount((open_days + 3) % 7, minlength=7)
+        return [{'weekday': w, 'appointments': int(c), 'per_day': c / o if o else 0.0}
+                for w, c, o in zip(WEEKDAYS, counts, opened)]
+
+    # --- time series ---
+    def _series(self, days, weights, first, last, unit):
+        keep = self._in_range(days, first, last)
+        days = days[keep].astype('datetime64[D]')
+        if not len(days):
+            return np.empty(0, f'datetime64[{unit}]'), np.empty(0), np.empty(0, np.int64)
+        periods = days.astype(f'datetime64[{unit}]')
+        start = periods.min()
+        k = (periods - start).astype(np.int64)
+        n = int(k.max()) + 1
+        labels = start + np.arange(n)
+        counts = np.bincount(k, minlength=n)
+        sums = np.bincount(k, weights=weights[keep], minlength=n) if weights is not None else counts.astype(float)
+        return labels, sums, counts
+
+    def revenue(self, unit='D', first=None, last=None):
+        """(periods, rupees, bills) per day ('D'), month ('M') or year ('Y'); periods without bills are zero."""
+        paise = self.column('billing', 'paise')
+        labels, sums, counts = self._series(self.column('billing', 'day'), np.where(paise == NONE, 0, paise),
+                                            first, last, unit)
+        return labels, sums / 100, counts
+
+    def revenue_last_n_days(self, n=30):
+        """[{'date', 'total'}] like models.get_revenue_last_n_days (days with bills only)."""
+        today = date.today()
+        labels, rupees, bills = self.revenue('D', date.fromordinal(today.toordinal() - n), today)
+        return [{'date': d.item(), 'total': float(t)} for d, t, b in zip(labels, rupees, bills) if b]
+
+    def appointments(self, unit='M', first=None, last=None, status=None):
+        """(periods, appointments) per day / month / year, optionally only `status`."""
+        days = self.column('appointment', 'day')
+        if status is not None:
+            codes = self.column('appointment', 'status')
+            days = days[codes == self.vocab.code('status', status)]
+        labels, _, counts = self._series(days, None, first, last, unit)
+        return labels, counts
+
+    def new_patients(self, unit='M', first=None, last=None):
+        labels, _, counts = self._series(self.column('patient', 'created'), None, first, last, unit)
+        return labels, counts
+
+
+def report(path=None, months=12):
+    """Print the long-range reports the snapshot exists for."""
+    snap = Snapshot(path)
+    if not snap.rows:
+        raise SystemExit("No analytics snapshot yet; run: python maintenance.py analytics-refresh")
+    print(f"Snapshot {snap.path} refreshed {snap.refreshed_at}: "
+          + ", ".join(f"{n} {t}" for t, n in snap.rows.items()))
+
+    months_rev, rupees, bills = snap.revenue('M')
+    months_appt, appts = snap.appointments('M')
+    appts = dict(zip(months_appt.tolist(), appts.tolist()))
+    print(f"\nMonthly trend (last {months})\n  {'month':<8} {'appointments':>12} {'bills':>8} {'revenue':>14}")
+    for m, r, b in list(zip(months_rev.tolist(), rupees, bills))[-months:]:
+        print(f"  {m.strftime('%Y-%m'):<8} {appts.get(m, 0):>12} {b:>8} {r:>14,.2f}")
+
+    print(f"\nLoad per weekday\n  {'day':<4} {'appointments':>12} {'per day':>8}")
+    for r in snap.weekday_load():
+        print(f"  {r['weekday']:<4} {r['appointments']:>12} {r['per_day']:>8.1f}")
+
+    names, groups, table = snap.age_by_diagnosis()
+    print("\nAge group by diagnosis (top 10)\n  " + f"{'diagnosis':<24}" + "".join(f"{g:>8}" for g in groups))
+    for name, row in zip(names, table):
+        print(f"  {name[:24]:<24}" + "".join(f"{int(c):>8}" for c in row))
+
+    print("\nPatients by age group\n  " + "  ".join(f"{r['age_group']}: {r['cnt']}" for r in snap.age_groups()))
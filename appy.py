@@ -1,24 +1,49 @@
 # app.py
+import sys, time
+_startup = [("start", time.perf_counter())]
+import importlib
+from functools import wraps
 import customtkinter as ctk
-from tkinter import messagebox, ttk
+from tkinter import filedialog, messagebox, ttk
 from datetime import date, datetime
-import matplotlib
+_startup.append(("import customtkinter / tkinter", time.perf_counter()))
 
-# use Agg backend for embedding in Tkinter
-matplotlib.use("Agg")
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-
-import models, utils, seed_demo
+# heavy modules load on first use: matplotlib via dashboard, reportlab via utils
+import models
+import metrics
+import scheduling
+_startup.append(("import models + db (no connection yet)", time.perf_counter()))
+from tasks import TaskRunner
+from widgets import AutocompleteEntry, PagedTreeview, TreeSync
+_startup.append(("import app modules", time.perf_counter()))
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("green")
 
+LIVE_REFRESH_MS = 3000      # how often open lists ask change_log for other terminals' edits
+
+def screen(name):
+    """With metrics on, record a screen's build time and its time until first paint (Tk idle)."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(self, *args):
+            if not metrics.ENABLED:
+                return fn(self, *args)
+            t0 = time.perf_counter()
+            result = fn(self, *args)
+            metrics.record('screen', f"{name} (build)", time.perf_counter() - t0)
+            self.after_idle(lambda: metrics.record('screen', name, time.perf_counter() - t0))
+            return result
+        return wrapper
+    return deco
+
 class ClinicApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, startup_timing=False):
         super().__init__()
         self.title("Clinic OPD - Dark Professional")
         self.geometry("1100x700")
+        self.tasks = TaskRunner(self)
+        self.dashboard = None
         self.sidebar = ctk.CTkFrame(self, width=200); self.sidebar.pack(side="left", fill="y")
         self.header = ctk.CTkFrame(self, height=60); self.header.pack(side="top", fill="x")
         self.main = ctk.CTkFrame(self); self.main.pack(side="right", fill="both", expand=True)
@@ -27,64 +52,84 @@ class ClinicApp(ctk.CTk):
         for t,c in [("Dashboard", self.show_dashboard), ("Register", self.show_register),
                     ("Add Appointment", self.show_add_appointment), ("Appointments", self.show_appointments),
                     ("Doctor", self.show_doctor), ("Billing", self.show_billing),
-                    ("Exit", self.destroy)]:
+                    ("Diagnostics", self.show_diagnostics), ("Exit", self.destroy)]:
             ctk.CTkButton(self.sidebar, text=t, command=c).pack(padx=12, pady=8, fill="x")
+        self._timing = StartupTiming(self) if startup_timing else None
         self.show_dashboard()
+        # connect in the background; the window is usable (and shows errors) meanwhile
+        self.tasks.submit(self._timed, models.db.connect, on_done=lambda r: self._phase_done("database connect", r),
+                          on_error=lambda e: messagebox.showerror("Database Connection Failed", f"Cannot connect to the database:\n{e}"),
+                          sticky=True)
+
+    @staticmethod
+    def _timed(fn, *args):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - t0
+
+    def _phase_done(self, phase, timed):
+        if self._timing:
+            self._timing.background(phase, timed[1])
+        return timed[0]
 
     def clear(self):
-        for w in self.main.winfo_children(): w.destroy()
+        self.tasks.cancel_stale()
+        keep = None
+        if self.dashboard:
+            self.dashboard.hide(); keep = self.dashboard.frame
+        for w in self.main.winfo_children():
+            if w is not keep: w.destroy()
+
+    def destroy(self):
+        self.tasks.shutdown()
+        super().destroy()
+
+    def _live(self, widget, table, fetch_changed, on_changes, reload):
+        """
+        Keep a list on the current screen live: every LIVE_REFRESH_MS, poll a
+        models.ChangeFeed on `table` and hand fetch_changed(ids) (run on a
+        worker) to on_changes(rows). reload() is called for the first load and
+        whenever the feed (or fetch_changed returning None) asks for a full
+        one. Stops by itself when the screen changes.
+        """
+        feed = models.ChangeFeed(table)
+        def poll():
+            ids = feed.poll()
+            if ids is None:
+                return None
+            return fetch_changed(ids) if ids else []
+        def done(rows):
+            if rows is None: reload()
+            elif rows: on_changes(rows)
+            self.after(LIVE_REFRESH_MS, tick)
+        def tick():
+            if widget.winfo_exists():
+                self.tasks.submit(poll, on_done=done, on_error=lambda e: self.after(LIVE_REFRESH_MS, tick))
+        tick()
 
     # ---------- DASHBOARD ----------
+    @screen("dashboard")
     def show_dashboard(self):
         self.clear()
-        plt.style.use('seaborn-v0_8-darkgrid')
-        header_frame = ctk.CTkFrame(self.main)
-        header_frame.pack(fill="x", padx=12, pady=8)
-        today = date.today().isoformat()
-
-        appts_today = models.list_appointments_for_date(today)
-        patients_today = len(appts_today)
-
-        # ✅ Total appointments lifetime
-        total_appts_lifetime = models.count_all_appointments()
-
-        today_rev = models.get_revenue_for_date(today) or 0
-        total_rev = models.get_total_revenue() or 0
-
-        stat_font = ctk.CTkFont(size=16, weight="bold")
-        for label in [
-            (f"Patients Today\n{patients_today}"),
-            (f"Total Appointments (Lifetime)\n{total_appts_lifetime}"),
-            (f"Today's Revenue\n₹{today_rev:.2f}"),
-            (f"Total Revenue\n₹{total_rev:.2f}")
-]:
-
-            ctk.CTkLabel(header_frame, text=label, font=stat_font).pack(side="left", padx=15)
-
-        charts_frame = ctk.CTkFrame(self.main)
-        charts_frame.pack(fill="both", expand=True, padx=12, pady=6)
-
-        fig = plt.Figure(figsize=(10,5), tight_layout=True)
-        ax1 = fig.add_subplot(1,2,1)
-        ax2 = fig.add_subplot(1,2,2)
-
-        dis = models.get_disease_distribution(10)
-        diseases = [r['diagnosis'] for r in dis] if dis else ["No Data"]
-        counts = [int(r['cnt']) for r in dis] if dis else [1]
-        ax1.bar(diseases, counts)
-        ax1.set_title("Disease Distribution")
-        ax1.tick_params(axis='x', rotation=45)
-
-        appt_stats = models.get_appointment_status_counts_for_date(today)
-        statuses = [r['status'] for r in appt_stats] or ['No Data']
-        st_counts = [int(r['cnt']) for r in appt_stats] or [1]
-        ax2.pie(st_counts, labels=statuses, autopct='%1.1f%%')
-
-        canvas = FigureCanvasTkAgg(fig, master=charts_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True, padx=8, pady=8)
+        if self.dashboard is None:
+            # matplotlib is the slowest import in the app: load it on a worker
+            # while the window is already up, then build the view on the Tk thread.
+            # Sticky, so leaving the screen early still finishes the import and its timing.
+            placeholder = ctk.CTkLabel(self.main, text="Loading dashboard...")
+            placeholder.pack(pady=20)
+            def build(timed):
+                mod = self._phase_done("import dashboard (matplotlib)", timed)
+                if self.dashboard is not None or not placeholder.winfo_exists():
+                    return      # another screen is up: the next visit builds the view from the loaded module
+                placeholder.destroy()
+                self.dashboard = mod.DashboardView(self.main, self.tasks)
+                self.dashboard.show()
+            self.tasks.submit(self._timed, importlib.import_module, "dashboard", on_done=build, sticky=True)
+            return
+        self.dashboard.show()
 
     # ---------- REGISTER PATIENT ----------
+    @screen("register")
     def show_register(self):
         self.clear()
         frame = ctk.CTkFrame(self.main); frame.pack(fill="both", expand=True, padx=12, pady=8)
@@ -106,7 +151,8 @@ class ClinicApp(ctk.CTk):
 
         labeled(left,"Phone",phone,"10-digit")
         labeled(left,"Address",addr,"City / Address")
-        ctk.CTkButton(left, text="Save", command=lambda: self._save_patient(name,age,gender,phone,addr)).pack(pady=6)
+        save_btn = ctk.CTkButton(left, text="Save", command=lambda: self._save_patient(name,age,gender,phone,addr,save_btn))
+        save_btn.pack(pady=6)
 
         right = ctk.CTkFrame(frame); right.pack(side="left", fill="both", expand=True)
 
@@ -122,49 +168,109 @@ class ClinicApp(ctk.CTk):
         tree.pack(fill="both",expand=True,padx=6,pady=6)
         self.tree_pat = tree
 
-        def load_rows(rows):
-            for i in tree.get_children(): tree.delete(i)
-            for r in rows:
-                tree.insert("", "end", values=(r['patient_id'], r['name'], r['age'], r['gender'], r['phone']))
-
-        def load_all(): load_rows(models.list_patients(200))
-        def load_search(): load_rows(models.search_patients(search_var.get(), 200))
-        load_all()
-
-    def _save_patient(self, name, age, gender, phone, addr):
+        sync = TreeSync(tree, row_key=lambda r: r['patient_id'],
+                        row_values=lambda r: (r['patient_id'], r['name'], r['age'], r['gender'], r['phone']))
+        searching = {'q': "", 'shown': None}
+
+        def load_rows(q, rows):
+            if q != searching['q']:
+                return      # answer to an earlier search / browse
+            if q != searching['shown']:
+                # newest first while browsing; search results keep their relevance order.
+                # Switching modes starts from an empty tree: the sync's ordering state is per mode.
+                sync.clear()
+                sync.sort_key = None if q else (lambda r: r['patient_id'])
+                sync.reverse = True
+                searching['shown'] = q
+            sync.replace(rows)
+
+        def load_all():
+            searching['q'] = ""
+            self.tasks.submit(models.list_patients, 200, on_done=lambda rows: load_rows("", rows))
+        def load_search():
+            q = searching['q'] = search_var.get().strip()
+            self.tasks.submit(models.search_patients, q, 200, on_done=lambda rows: load_rows(q, rows))
+        def on_changes(rows):
+            if searching['shown'] == "" and not searching['q']: sync.apply(rows)
+        self._live(tree, 'patient', models.get_patients_by_ids, on_changes,
+                   reload=lambda: load_search() if searching['q'] else load_all())
+
+    def _write(self, button, fn, *args, on_done, on_error=None):
+        """
+        Run a database write on a worker with `button` disabled until it is
+        done. Sticky: leaving the screen must not cancel a save that has not
+        started yet, so the callbacks check that their widgets still exist.
+        """
+        button.configure(state="disabled")
+        def release():
+            if button.winfo_exists(): button.configure(state="normal")
+        def done(result):
+            release(); on_done(result)
+        def failed(e):
+            release()
+            if on_error: on_error(e)
+            else: messagebox.showerror("Database Error", str(e))
+        self.tasks.submit(fn, *args, on_done=done, on_error=failed, sticky=True)
+
+    def _save_patient(self, name, age, gender, phone, addr, button):
         if not name.get().strip(): messagebox.showwarning("Missing","Name required"); return
         try: a = int(age.get().strip()) if age.get().strip() else None
         except: messagebox.showerror("Age","Invalid age"); return
-        models.insert_patient(name.get().strip(), a, gender.get().strip(), phone.get().strip(), addr.get().strip())
-        messagebox.showinfo("Saved","Patient saved"); self.show_register()
+        def saved(pid):
+            messagebox.showinfo("Saved","Patient saved")
+            if button.winfo_exists(): self.show_register()
+        self._write(button, models.insert_patient, name.get().strip(), a, gender.get().strip(), phone.get().strip(),
+                    addr.get().strip(), on_done=saved)
 
     # ---------- ADD APPOINTMENT ----------
+    @screen("add_appointment")
     def show_add_appointment(self):
         self.clear()
         frm = ctk.CTkFrame(self.main); frm.pack(fill="both", expand=True, padx=12, pady=8)
         ctk.CTkLabel(frm, text="Add Appointment", font=ctk.CTkFont(size=14, weight="bold")).pack(pady=6)
 
-        pats = models.list_patients(1000)
-        patient_map = {f"{p['patient_id']} - {p['name']} ({p.get('phone','')})": p['patient_id'] for p in pats}
-        patient_var = ctk.StringVar()
-        ttk.Combobox(frm, values=list(patient_map.keys()), textvariable=patient_var, width=60).pack(pady=6)
+        # type a name, phone or patient ID; matches come from the whole table
+        pat_box = AutocompleteEntry(frm, self.tasks, models.search_patients,
+                                    row_label=lambda p: f"{p['patient_id']} - {p['name']} ({p.get('phone') or ''})",
+                                    row_key=lambda p: p['patient_id'], narrow=models.narrow_by_name, width=60)
+        pat_box.pack(pady=6)
 
         date_var = ctk.StringVar(value=date.today().isoformat())
-        time_var = ctk.StringVar(value="09:00")
-        ctk.CTkEntry(frm, textvariable=date_var, width=160).pack(pady=4)
-        ctk.CTkEntry(frm, textvariable=time_var, width=160).pack(pady=4)
+        time_var = ctk.StringVar()
+        date_entry = ctk.CTkEntry(frm, textvariable=date_var, width=160); date_entry.pack(pady=4)
+        slot_box = ttk.Combobox(frm, textvariable=time_var, values=[], width=18, state="readonly")
+        slot_box.pack(pady=4)
+
+        def fill_slots(slots):
+            slot_box.configure(values=slots)
+            time_var.set(slots[0] if slots else "")
+            if not slots: messagebox.showinfo("Full", "No free slots left on this day")
+        def load_slots(*_):
+            try: day = date.fromisoformat(date_var.get())
+            except ValueError: return
+            self.tasks.submit(scheduling.free_slots, day, len(scheduling.GRID), on_done=fill_slots)
+        date_entry.bind("<FocusOut>", load_slots); date_entry.bind("<Return>", load_slots)
+        load_slots()
 
         def add():
-            if not patient_var.get(): return messagebox.showwarning("Select","Select a patient")
+            if pat_box.value is None: return messagebox.showwarning("Select","Select a patient")
             try: datetime.fromisoformat(date_var.get())
             except: return messagebox.showerror("Date","Invalid date format")
-            models.create_appointment(patient_map[patient_var.get()], date_var.get(), time_var.get())
+            if not time_var.get(): return messagebox.showwarning("Slot","Pick a free slot")
+            self._write(add_btn, scheduling.book, pat_box.value, date_var.get(), time_var.get(), on_done=booked, on_error=refused)
+        def booked(appt_id):
             messagebox.showinfo("Added","Appointment created")
-            patient_var.set(""); time_var.set("09:00"); date_var.set(date.today().isoformat())
+            if frm.winfo_exists():
+                pat_box.clear(); date_var.set(date.today().isoformat()); load_slots()
+        def refused(e):
+            if not isinstance(e, models.SlotTaken): return messagebox.showerror("Database Error", str(e))
+            messagebox.showwarning("Taken", f"{e}. Next free: {', '.join(e.suggestions) or 'none'}")
+            if frm.winfo_exists(): load_slots()
 
-        ctk.CTkButton(frm, text="Create Appointment", command=add).pack(pady=8)
+        add_btn = ctk.CTkButton(frm, text="Create Appointment", command=add); add_btn.pack(pady=8)
 
     # ---------- LIFETIME APPOINTMENTS + SEARCH ----------
+    @screen("appointments")
     def show_appointments(self):
         self.clear()
         frm=ctk.CTkFrame(self.main); frm.pack(fill="both",expand=True,padx=12,pady=8)
@@ -176,36 +282,45 @@ class ClinicApp(ctk.CTk):
         ctk.CTkButton(sf, text="Search", command=lambda: load(search.get())).pack(side="left", padx=6)
         ctk.CTkButton(sf, text="Show All", command=lambda: load("")).pack(side="left", padx=6)
 
-        tree=ttk.Treeview(frm, columns=("ApptID","Patient","Date","Time","Status"), show="headings", height=17)
+        tree=PagedTreeview(frm, self.tasks, models.list_appointments_page,
+                           row_values=lambda r: (r['appointment_id'], r['name'], r['date'], r['time_slot'], r['status']),
+                           row_cursor=models.appointment_cursor, row_key=lambda r: r['appointment_id'],
+                           columns=("ApptID","Patient","Date","Time","Status"), show="headings", height=17)
         for c in ("ApptID","Patient","Date","Time","Status"):
             tree.heading(c,text=c); tree.column(c,anchor="center")
+        tree.scrollbar.pack(side="right", fill="y", pady=6)
         tree.pack(fill="both",expand=True,padx=6,pady=6)
 
+        note = ctk.CTkLabel(frm, text="", anchor="w")
+        note.pack(fill="x", padx=6)
+
+        query = {'q': ""}
         def load(q):
-            for i in tree.get_children(): tree.delete(i)
-            rows = models.search_appointments(q) if q else models.list_all_appointments(2000)
-            for r in rows:
-                tree.insert("", "end", values=(r['appointment_id'], r['name'], r['date'], r['time_slot'], r['status']))
+            query['q'] = q
+            note.configure(text="")
+            if q:
+                tree.reset(lambda cursor, limit: models.search_appointments(q, cursor, limit))
+                self.tasks.submit(models.appointment_search_truncated, q, on_done=lambda more: truncated(q, more))
+            else: tree.reset(models.list_appointments_page)
+        def truncated(q, more):
+            if more and q == query['q']:
+                note.configure(text=f"Showing appointments of the best {models.APPT_SEARCH_PATIENTS} matching patients"
+                                    " only; refine the search to see the rest")
 
         def complete():
             sel = tree.selection()
             if not sel: return messagebox.showwarning("Select","Select appointment")
-            models.mark_appointment_completed(tree.item(sel[0])['values'][0])
-            load(search.get())
-
-        ctk.CTkButton(frm, text="Mark Completed", command=complete).pack(pady=4)
-        load("")
-
+            # the row may be gone by now (reload, other screen): TaskRunner swallows the TclError
+            self._write(complete_btn, models.mark_appointment_completed, tree.item(sel[0])['values'][0],
+                        on_done=lambda _: tree.set(sel[0], "Status", "Completed"))
 
-    def _mark_complete(self, tree, reload_cb):
-        sel = tree.selection()
-        if not sel: messagebox.showwarning("Select","Select appointment"); return
-        apid = tree.item(sel[0])['values'][0]
-        models.mark_appointment_completed(apid)
-        messagebox.showinfo("Done","Marked Completed")
-        reload_cb()
+        complete_btn = ctk.CTkButton(frm, text="Mark Completed", command=complete); complete_btn.pack(pady=4)
+        # a search result only gets in-place updates: new rows may not match the query
+        self._live(tree, 'appointment', models.get_appointments_by_ids,
+                   lambda rows: tree.apply_changes(rows, insert=not query['q']), reload=lambda: load(query['q']))
 
     # Doctor (prescription)
+    @screen("doctor")
     def show_doctor(self):
         self.clear()
         frm=ctk.CTkFrame(self.main); frm.pack(fill="both",expand=True,padx=12,pady=8)
@@ -217,11 +332,18 @@ class ClinicApp(ctk.CTk):
             tree.heading(c,text=c); tree.column(c,anchor="center")
         tree.pack(fill="both",expand=True,padx=6,pady=6)
 
-        def load(): 
-            for i in tree.get_children(): tree.delete(i)
-            for r in models.get_pending_appointments_today():
-                tree.insert("", "end", values=(r['appointment_id'], r['name'], r['time_slot']))
-        load()
+        shown = {'day': date.today()}
+        sync = TreeSync(tree, row_key=lambda r: r['appointment_id'],
+                        row_values=lambda r: (r['appointment_id'], r['name'], r['time_slot']),
+                        sort_key=lambda r: (r['time_slot'] or '', r['appointment_id']),
+                        keep=lambda r: r['status'] == 'Pending' and r['date'] == shown['day'])
+        def load():
+            shown['day'] = date.today()
+            self.tasks.submit(models.get_pending_appointments_today, on_done=sync.replace)
+        def changed(ids):
+            # past midnight the queue is a different day: reload it whole
+            return models.get_appointments_by_ids(ids) if date.today() == shown['day'] else None
+        self._live(tree, 'appointment', changed, sync.apply, reload=load)
         ctk.CTkButton(left, text="Refresh", command=load).pack(pady=6)
 
         right=ctk.CTkFrame(frm); right.pack(side="left", fill="both", expand=True)
@@ -232,7 +354,11 @@ class ClinicApp(ctk.CTk):
         def labeled(p,txt,var):
             ctk.CTkLabel(p,text=txt).pack(fill="x")
             ctk.CTkEntry(p,textvariable=var).pack(fill="x",pady=(2,8))
-        labeled(right,"Diagnosis",diag)
+        # free text; suggestions come from the diagnosis dictionary, most used first
+        ctk.CTkLabel(right,text="Diagnosis").pack(fill="x")
+        AutocompleteEntry(right, self.tasks, models.diagnosis_choices, row_label=lambda r: r['name'],
+                          row_key=lambda r: r['diagnosis_id'], narrow=models.narrow_diagnoses,
+                          textvariable=diag, delay_ms=100).pack(fill="x",pady=(2,8))
         labeled(right,"Medicines (comma sep)",meds)
         labeled(right,"Dosage",dosage)
         labeled(right,"Notes",notes)
@@ -244,44 +370,59 @@ class ClinicApp(ctk.CTk):
             sel = tree.selection()
             if not sel: messagebox.showwarning("Select","Select appointment"); return
             apid = tree.item(sel[0])['values'][0]; current_appt['id']=apid
-            row = models.db.fetchone("""SELECT a.*, p.name, p.age, p.gender, p.phone 
-                                        FROM appointment a JOIN patient p ON a.patient_id=p.patient_id 
-                                        WHERE a.appointment_id=%s""",(apid,))
-            info_lbl.configure(text=f"Patient: {row['name']}  Age:{row['age']}  Gender:{row['gender']}  Phone:{row['phone']}")
-            diag.set(""); meds.set(""); dosage.set(""); notes.set(""); follow.set("")
+            info_lbl.configure(text="Loading...")
+            def show(row):
+                info_lbl.configure(text=f"Patient: {row['name']}  Age:{row['age']}  Gender:{row['gender']}  Phone:{row['phone']}")
+                diag.set(""); meds.set(""); dosage.set(""); notes.set(""); follow.set("")
+            self.tasks.submit(models.get_appointment_detail, apid, on_done=show)
 
         def save_pres():
             if not current_appt['id']: messagebox.showwarning("Load","Load appointment"); return
-            models.save_prescription(current_appt['id'], diag.get(), meds.get(), dosage.get(), notes.get(), follow.get() or None)
-            models.mark_appointment_completed(current_appt['id'])
-            messagebox.showinfo("Saved","Prescription saved")
-            load()
+            def saved(_):
+                messagebox.showinfo("Saved","Prescription saved")
+                if tree.winfo_exists(): load()
+            self._write(save_btn, models.complete_consultation, current_appt['id'], diag.get(), meds.get(), dosage.get(),
+                        notes.get(), follow.get() or None, on_done=saved)
 
         ctk.CTkButton(right, text="Load Selected", command=load_sel).pack(pady=6)
-        ctk.CTkButton(right, text="Save Prescription", command=save_pres).pack(pady=6)
-        ctk.CTkButton(right, text="Export Prescription PDF", command=lambda: self._export_prescription(current_appt)).pack(pady=6)
+        save_btn = ctk.CTkButton(right, text="Save Prescription", command=save_pres); save_btn.pack(pady=6)
+        export_btn = ctk.CTkButton(right, text="Export Prescription PDF",
+                                   command=lambda: self._export_prescription(current_appt, export_btn))
+        export_btn.pack(pady=6)
 
-    def _export_prescription(self, current_appt):
+    def _export_prescription(self, current_appt, button):
         apid = current_appt.get('id')
         if not apid: messagebox.showwarning("Load","Load appointment"); return
+        self._write(button, self._write_prescription, apid, on_done=self._prescription_written)
+
+    @staticmethod
+    def _write_prescription(apid):
+        """Worker side of the export: file name written, or None without a prescription."""
         pres = models.latest_prescription_for_appt(apid)
-        ap = models.db.fetchone("SELECT a.*, p.name, p.age, p.gender, p.phone FROM appointment a JOIN patient p ON a.patient_id=p.patient_id WHERE a.appointment_id=%s",(apid,))
-        if not pres: messagebox.showwarning("No Data","No prescription"); return
+        if not pres: return None
+        ap = models.get_appointment_detail(apid)
         fname = f"prescription_{apid}.pdf"
         patient_info = {'name': ap['name'], 'age': ap['age'], 'gender': ap['gender'], 'phone': ap['phone']}
+        import utils  # reportlab: loaded on first export
         utils.export_prescription_pdf(fname, patient_info, pres)
+        return fname
+
+    @staticmethod
+    def _prescription_written(fname):
+        if not fname: messagebox.showwarning("No Data","No prescription"); return
         messagebox.showinfo("Exported", f"Saved {fname}")
 
     # Billing
+    @screen("billing")
     def show_billing(self):
         self.clear()
         frm=ctk.CTkFrame(self.main); frm.pack(fill="both",expand=True,padx=12,pady=8)
         ctk.CTkLabel(frm, text="Billing (Itemized)", font=ctk.CTkFont(size=14, weight="bold")).pack(pady=6)
 
-        appts = models.get_appointments_for_billing()
-        apt_map = {f"{r['appointment_id']} - {r['name']} ({r['date']})": r['appointment_id'] for r in appts}
-        ap_sel = ctk.StringVar()
-        comb = ttk.Combobox(frm, values=list(apt_map.keys()), textvariable=ap_sel, width=60)
+        # appointment ID, patient name / phone or a date
+        comb = AutocompleteEntry(frm, self.tasks, models.appointment_choices,
+                                 row_label=lambda r: f"{r['appointment_id']} - {r['name']} ({r['date']})",
+                                 row_key=lambda r: r['appointment_id'], narrow=models.narrow_by_name, width=60)
         comb.pack(pady=6)
 
         cols = ("Item","Qty","Price","Amount")
@@ -297,19 +438,19 @@ class ClinicApp(ctk.CTk):
             total_var.set(f"{total:.2f}")
 
         def import_meds():
-            sel_text = ap_sel.get()
-            if not sel_text: messagebox.showwarning("Select","Select appointment"); return
-            apid = apt_map[sel_text]
-            pres = models.latest_prescription_for_appt(apid)
-            if not pres:
-                messagebox.showinfo("No Presc","No prescription to import")
+            apid = comb.value
+            if apid is None: messagebox.showwarning("Select","Select appointment"); return
+            self.tasks.submit(models.billable_medicines, apid, on_done=fill_meds)
+
+        def fill_meds(items):
+            # named and priced from the medicine catalog
+            if not items:
+                messagebox.showinfo("No Presc","No prescribed medicines to import")
                 return
-            meds = pres['medicines'] or ""
-            meds_list = [m.strip() for m in meds.split(",") if m.strip()]
-            for m in meds_list:
-                qty = 1; price = 0.0
+            for it in items:
+                qty = it['qty']; price = float(it['price'])
                 amt = qty * price
-                tree.insert("", "end", values=(m, qty, f"{price:.2f}", f"{amt:.2f}"))
+                tree.insert("", "end", values=(it['item_name'], qty, f"{price:.2f}", f"{amt:.2f}"))
             refresh_total()
 
         item_name = ctk.StringVar(); item_qty=ctk.StringVar(value="1"); item_price=ctk.StringVar(value="0.00")
@@ -332,27 +473,124 @@ class ClinicApp(ctk.CTk):
         ctk.CTkButton(entry_frame, text="Import Medicines", command=import_meds).pack(side="left", padx=6)
 
         def save_bill():
-            sel_text = ap_sel.get()
-            if not sel_text: messagebox.showwarning("Select","Select appointment"); return
-            apid = apt_map[sel_text]
+            apid = comb.value
+            if apid is None: messagebox.showwarning("Select","Select appointment"); return
             items = []
             for iid in tree.get_children():
                 it = tree.item(iid)['values']
                 items.append({'item_name': str(it[0]), 'qty': int(it[1]), 'price': float(it[2])})
             if not items: messagebox.showwarning("Empty","Add at least one item"); return
-            bill_id = models.create_bill(apid, items)
-            bill, its = models.get_bill(bill_id)
-            patient = sel_text.split("-")[1].split("(")[0].strip()
-            fname = f"invoice_{bill_id}.pdf"
-            utils.export_invoice_pdf(fname, bill, its, patient)
-            messagebox.showinfo("Billed", f"Saved invoice {fname}")
+            self._write(bill_btn, self._bill_and_export, apid, items, comb.row['name'],
+                        on_done=lambda fname: messagebox.showinfo("Billed", f"Saved invoice {fname}"))
 
         footer = ctk.CTkFrame(frm); footer.pack(fill="x", pady=6)
         ctk.CTkLabel(footer, text="Total: ").pack(side="left", padx=6)
         ctk.CTkLabel(footer, textvariable=total_var).pack(side="left")
-        ctk.CTkButton(footer, text="Save Bill & Export Invoice", command=save_bill).pack(side="right", padx=6)
+        bill_btn = ctk.CTkButton(footer, text="Save Bill & Export Invoice", command=save_bill)
+        bill_btn.pack(side="right", padx=6)
+
+    @staticmethod
+    def _bill_and_export(apid, items, patient):
+        """Worker side of Save Bill: create the bill and write its invoice; returns the file name."""
+        bill_id = models.create_bill(apid, items)
+        bill, its = models.get_bill(bill_id)
+        fname = f"invoice_{bill_id}.pdf"
+        import utils  # reportlab: loaded on first export
+        utils.export_invoice_pdf(fname, bill, its, patient)
+        return fname
+
+
+    # ---------- DIAGNOSTICS ----------
+    @screen("diagnostics")
+    def show_diagnostics(self):
+        self.clear()
+        frm=ctk.CTkFrame(self.main); frm.pack(fill="both",expand=True,padx=12,pady=8)
+        ctk.CTkLabel(frm, text="Diagnostics", font=ctk.CTkFont(size=14, weight="bold")).pack(pady=6)
+        status = ctk.StringVar()
+        ctk.CTkLabel(frm, textvariable=status, justify="left").pack(fill="x", padx=6)
+
+        cols = ("Kind","Name","Calls","Errors","Rows","p50 ms","p95 ms","p99 ms","Max ms")
+        tree = ttk.Treeview(frm, columns=cols, show="headings", height=12)
+        for c in cols: tree.heading(c,text=c); tree.column(c, anchor="e", width=70)
+        tree.column("Kind", anchor="w", width=60); tree.column("Name", anchor="w", width=420)
+        tree.pack(fill="both",expand=True,padx=6,pady=6)
+        ctk.CTkLabel(frm, text="Slow log").pack(anchor="w", padx=6)
+        slow = ctk.CTkTextbox(frm, height=120); slow.pack(fill="x", padx=6, pady=(0,6))
+
+        def refresh():
+            snap = metrics.snapshot()
+            pool = snap['gauges'].get('db_pool', {})
+            state = "on" if snap['enabled'] else "off (start with --metrics or press Enable)"
+            status.set(f"Instrumentation {state}   slow threshold {snap['slow_ms']:.0f} ms\n"
+                       f"DB pool: {pool.get('open', 0)} open / {pool.get('size', 0)}, {pool.get('checkouts', 0)} checkouts, "
+                       f"{pool.get('waits', 0)} waits, {pool.get('reconnects', 0)} reconnects, "
+                       f"{pool.get('prepares', 0)} prepares / {pool.get('stmt_hits', 0)} statement cache hits\n"
+                       "Caches: " + ", ".join(f"{n[6:]} {c['hits']}/{c['hits'] + c['misses']} hits ({c['size']} kept)"
+                                              for n, c in snap['gauges'].items() if n.startswith("cache_")))
+            tree.delete(*tree.get_children())
+            for r in snap['series']:
+                tree.insert("", "end", values=(r['kind'], r['name'], r['calls'], r['errors'], r['rows'],
+                                               f"{r['p50_ms']:.1f}", f"{r['p95_ms']:.1f}", f"{r['p99_ms']:.1f}", f"{r['max_ms']:.1f}"))
+            slow.delete("1.0", "end")
+            for e in reversed(snap['slow_log']):
+                slow.insert("end", f"{e['at']}  {e['ms']:8.1f} ms  {e['kind']:<6} {e['name']}\n")
+
+        def export():
+            path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="clinic_metrics.json")
+            if not path: return
+            metrics.export_json(path)
+            messagebox.showinfo("Exported", f"Saved {path}")
+
+        def toggle():
+            if metrics.ENABLED: metrics.disable()
+            else: metrics.enable()
+            refresh()
+
+        bar = ctk.CTkFrame(frm); bar.pack(fill="x", pady=6)
+        ctk.CTkButton(bar, text="Refresh", command=refresh).pack(side="left", padx=6)
+        ctk.CTkButton(bar, text="Enable / Disable", command=toggle).pack(side="left", padx=6)
+        ctk.CTkButton(bar, text="Reset", command=lambda: (metrics.reset(), refresh())).pack(side="left", padx=6)
+        ctk.CTkButton(bar, text="Export JSON", command=export).pack(side="right", padx=6)
+        refresh()
+
+
+class StartupTiming:
+    """
+    `python appy.py --startup-timing`: prints how long each startup phase took.
+    Import phases are sequential; background phases overlap with the window
+    being on screen.
+    """
+    WAIT_FOR = {"database connect", "import dashboard (matplotlib)"}
+
+    def __init__(self, app):
+        self.phases = [(name, t - prev) for (_, prev), (name, t) in zip(_startup, _startup[1:])]
+        self.phases.append(("build window", time.perf_counter() - _startup[-1][1]))
+        self.extra = {}
+        self.reported = False
+        self.start = _startup[0][1]
+        app.after_idle(self._painted)
+
+    def _painted(self):
+        self.phases.append(("window shown (total since start)", time.perf_counter() - self.start))
+        self._report()
+
+    def background(self, phase, seconds):
+        self.extra.setdefault(phase, seconds)      # a repeat (dashboard revisited early) is not startup
+        self._report()
+
+    def _report(self):
+        if self.reported or not self.WAIT_FOR <= set(self.extra) or len(self.phases) < len(_startup) + 1:
+            return
+        self.reported = True
+        print("Startup timing (ms)")
+        for name, sec in self.phases:
+            print(f"  {name:<42} {sec * 1000:8.1f}")
+        print("  background:")
+        for name, sec in self.extra.items():
+            print(f"  {name:<42} {sec * 1000:8.1f}")
 
-    
 
 if __name__ == "__main__":
-    app = ClinicApp(); app.mainloop()
+    if "--metrics" in sys.argv:
+        metrics.enable()
+    app = ClinicApp(startup_timing="--startup-timing" in sys.argv); app.mainloop()
@@ -0,0 +1,169 @@
+# batch_export.py
+"""
+Bulk invoice / prescription PDF export for a date range.
+
+    python batch_export.py invoices 2025-11-01 2025-11-30 --out exports/nov
+    python batch_export.py prescriptions 2025-11-01 2025-11-30 --out nov_rx.zip
+
+    python batch_export.py invoices 2025-11-01 2025-11-30 --out nov_invoices.pdf
+
+All rows are fetched with a handful of set-based queries, then the PDFs are
+rendered in memory in parallel by a process pool (one process per CPU core
+by default). An --out ending in .zip produces a single archive instead of a
+directory; one ending in .pdf produces a single merged PDF, rendered in one
+process so every page shares the same layout templates.
+"""
+import argparse
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+CHUNK = 50      # documents per worker task (amortizes process round trips)
+
+
+# --- set-based fetch ---
+def fetch_invoices(start, end):
+    """[(bill, items, patient_name)] for bills dated start..end (inclusive)."""
+    from db import db
+    bills = db.fetchall("""SELECT b.*, p.name FROM billing b
+                           JOIN appointment a ON a.appointment_id = b.appointment_id
+                           JOIN patient p ON p.patient_id = a.patient_id
+                           WHERE b.date >= %s AND b.date <= %s
+                           ORDER BY b.bill_id""", (start, end))
+    items = db.fetchall("""SELECT i.* FROM billing_items i
+                           JOIN billing b ON b.bill_id = i.bill_id
+                           WHERE b.date >= %s AND b.date <= %s
+                           ORDER BY i.bill_id""", (start, end))
+    by_bill = {}
+    for it in items:
+        by_bill.setdefault(it['bill_id'], []).append(it)
+    return [(b, by_bill.get(b['bill_id'], []), b['name']) for b in bills]
+
+
+def fetch_prescriptions(start, end):
+    """[(appointment_id, patient_info, prescription)] for appointments dated start..end,
+    latest prescription per appointment (same as models.latest_prescription_for_appt)."""
+    from db import db
+    rows = db.fetchall("""SELECT pr.*, p.name, p.age, p.gender, p.phone FROM prescription pr
+                          JOIN appointment a ON a.appointment_id = pr.appointment_id
+                          JOIN patient p ON p.patient_id = a.patient_id
+                          WHERE a.date >= %s AND a.date <= %s
+                          ORDER BY pr.appointment_id, pr.created_at, pr.prescription_id""", (start, end))
+    latest = {}
+    for r in rows:
+        latest[r['appointment_id']] = r
+    by_pres = {r['prescription_id']: r for r in latest.values()}
+    for r in by_pres.values():
+        r['items'] = []
+    ids = list(by_pres)
+    for i in range(0, len(ids), 1000):
+        part = ids[i:i + 1000]
+        for it in db.fetchall(f"""SELECT i.prescription_id, i.line, m.name, i.qty FROM prescription_items i
+                                  JOIN medicine m ON m.medicine_id = i.medicine_id
+                                  WHERE i.prescription_id IN ({','.join(['%s'] * len(part))})
+                                  ORDER BY i.prescription_id, i.line""", part):
+            by_pres[it['prescription_id']]['items'].append(it)
+    return [(apid, {k: r[k] for k in ('name', 'age', 'gender', 'phone')}, r) for apid, r in latest.items()]
+
+
+# --- rendering (runs in worker processes) ---
+def _render(kind, job):
+    import utils
+    if kind == 'invoices':
+        bill, items, name = job
+        return f"invoice_{bill['bill_id']}.pdf", utils.render_invoice_pdf(bill, items, name)
+    apid, patient_info, pres = job
+    return f"prescription_{apid}.pdf", utils.render_prescription_pdf(patient_info, pres)
+
+def _render_chunk(kind, jobs, out_dir):
+    """Write the chunk into out_dir, or return [(name, bytes)] when out_dir is None."""
+    docs = [_render(kind, job) for job in jobs]
+    if out_dir is None:
+        return docs
+    for name, data in docs:
+        with open(os.path.join(out_dir, name), "wb") as f:
+            f.write(data)
+    return len(docs)
+
+def _render_merged(kind, jobs, out, progress, t1):
+    import utils
+    r = utils.PdfRenderer()
+    for i, job in enumerate(jobs, start=1):
+        if kind == 'invoices':
+            r.invoice(*job)
+        else:
+            r.prescription(job[1], job[2])
+        if progress and (i % CHUNK == 0 or i == len(jobs)):
+            progress(i, len(jobs), time.perf_counter() - t1)
+    with open(out, "wb") as f:
+        f.write(r.getvalue())
+    return len(jobs)
+
+
+def export_range(kind, start, end, out, workers=None, chunk=CHUNK, progress=None):
+    """
+    Export every invoice or prescription in start..end to `out` (a directory,
+    a .zip file or a single merged .pdf). progress(done, total, elapsed_seconds)
+    is called as chunks finish. Returns a summary dict with counts and throughput.
+    """
+    t0 = time.perf_counter()
+    jobs = fetch_invoices(start, end) if kind == 'invoices' else fetch_prescriptions(start, end)
+    fetch_s = time.perf_counter() - t0
+
+    done = 0
+    t1 = time.perf_counter()
+    if out.lower().endswith(".pdf"):
+        done = _render_merged(kind, jobs, out, progress, t1)
+    else:
+        to_zip = out.lower().endswith(".zip")
+        if not to_zip:
+            os.makedirs(out, exist_ok=True)
+        zf = zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) if to_zip else None
+        try:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                futures = [pool.submit(_render_chunk, kind, jobs[i:i + chunk], None if to_zip else out)
+                           for i in range(0, len(jobs), chunk)]
+                for fut in as_completed(futures):
+                    res = fut.result()
+                    if to_zip:
+                        # PDFs are already compressed, so store them as-is
+                        for name, data in res:
+                            zf.writestr(name, data)
+                        res = len(res)
+                    done += res
+                    if progress:
+                        progress(done, len(jobs), time.perf_counter() - t1)
+        finally:
+            if zf:
+                zf.close()
+    render_s = time.perf_counter() - t1
+    total_s = time.perf_counter() - t0
+    return {'documents': done, 'fetch_seconds': fetch_s, 'render_seconds': render_s,
+            'total_seconds': total_s, 'docs_per_second': done / render_s if render_s else 0.0}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bulk PDF export for a date range")
+    ap.add_argument("kind", choices=["invoices", "prescriptions"])
+    ap.add_argument("start", type=date.fromisoformat)
+    ap.add_argument("end", type=date.fromisoformat)
+    ap.add_argument("--out", required=True, help="output directory, or a file ending in .zip / .pdf")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    ap.add_argument("--chunk", type=int, default=CHUNK)
+    args = ap.parse_args(argv)
+
+    def progress(done, total, elapsed):
+        rate = done / elapsed if elapsed else 0
+        print(f"\r{done}/{total} documents  {rate:.0f} docs/s", end="", flush=True)
+
+    summary = export_range(args.kind, args.start, args.end, args.out, args.workers, args.chunk, progress)
+    print()
+    print(f"Exported {summary['documents']} {args.kind} to {args.out}: "
+          f"fetch {summary['fetch_seconds']:.2f}s, render {summary['render_seconds']:.2f}s "
+          f"({summary['docs_per_second']:.0f} docs/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# bench/billing_bench.py
+"""
+Bills per second: one create_bill call per bill vs one create_bills batch.
+
+    python -m bench.billing_bench --bills 500 --items 4
+
+Writes real bills (and rollup totals) into the configured database, so
+point db.DB_CONFIG at a scratch copy before running it.
+"""
+import argparse
+import random
+import time
+
+import models
+from db import db
+
+
+def make_bills(appt_ids, n, n_items, rng):
+    return [(rng.choice(appt_ids),
+             [{'item_name': f"Item {j}", 'qty': rng.randint(1, 3), 'price': round(rng.uniform(10, 500), 2)}
+              for j in range(n_items)])
+            for _ in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bills", type=int, default=500)
+    ap.add_argument("--items", type=int, default=4, help="items per bill")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    appt_ids = [r['appointment_id'] for r in db.fetchall("SELECT appointment_id FROM appointment LIMIT 1000")]
+    if not appt_ids:
+        raise SystemExit("No appointments to bill; seed the database first (python seed_demo.py)")
+    bills = make_bills(appt_ids, args.bills, args.items, rng)
+    db.connect()  # keep connection setup out of the timings
+
+    t0 = time.perf_counter()
+    for appointment_id, items in bills:
+        models.create_bill(appointment_id, items)
+    single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ids = models.create_bills(bills)
+    batch = time.perf_counter() - t0
+    assert len(ids) == len(bills)
+
+    print(f"{args.bills} bills x {args.items} items")
+    print(f"  create_bill per bill   {args.bills / single:9.0f} bills/s")
+    print(f"  create_bills (1 txn)   {args.bills / batch:9.0f} bills/s   ({single / batch:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
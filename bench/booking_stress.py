@@ -0,0 +1,140 @@
+# bench/booking_stress.py
+"""
+Concurrent booking stress test: several receptionists filling the same days.
+
+    python -m bench.booking_stress --processes 4 --threads 4 --days 3
+
+Every process (a "terminal", with its own connection pool and slot bitmap)
+runs --threads workers that keep asking scheduling.next_free for a random
+test day and booking it with scheduling.book, retrying on SlotTaken, until
+every test day is full. The test days are far in the future, past any
+booked day. Afterwards it checks that each grid slot of each test day holds
+exactly one appointment and that no appointment was left without its slot,
+prints throughput, conflicts and booking latency, and exits 1 on any
+violation. --cleanup deletes the test appointments again.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+
+
+def pct(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * p))] if s else 0.0
+
+
+def receptionist(days, patient_ids, seed, stats, lock):
+    import models
+    import scheduling
+    rng = random.Random(seed)
+    open_days = list(days)
+    while open_days:
+        day = rng.choice(open_days)
+        slot = scheduling.next_free(day)
+        if slot is None:
+            open_days.remove(day)
+            continue
+        t0 = time.perf_counter()
+        try:
+            scheduling.book(rng.choice(patient_ids), day, slot)
+        except models.SlotTaken:
+            with lock:
+                stats['conflicts'] += 1
+            continue
+        ms = (time.perf_counter() - t0) * 1000
+        with lock:
+            stats['booked'] += 1
+            stats['ms'].append(ms)
+
+
+def terminal(days, patient_ids, threads, seed):
+    """One process: its own pool and bitmap, `threads` receptionists. Returns its stats."""
+    from db import db       # the parent closed its connections before forking: this pool starts empty
+    stats = {'booked': 0, 'conflicts': 0, 'ms': []}
+    lock = threading.Lock()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for f in [pool.submit(receptionist, days, patient_ids, seed * 1000 + t, stats, lock)
+                      for t in range(threads)]:
+                f.result()
+    finally:
+        db.pool.close_all()
+    return stats
+
+
+def verify(days, grid):
+    """Violations found on the test days (empty list when booking was conflict-free)."""
+    from db import db
+    problems = []
+    first, last = days[0], days[-1]
+    for r in db.fetchall("""SELECT date, time_slot, COUNT(*) AS n FROM appointment
+                            WHERE date >= %s AND date <= %s GROUP BY date, time_slot HAVING COUNT(*) > 1""",
+                         (first, last)):
+        problems.append(f"{r['date']} {r['time_slot']}: {r['n']} appointments")
+    orphans = db.fetchone("""SELECT COUNT(*) AS n FROM appointment a
+                             LEFT JOIN appointment_slot s ON s.appointment_id = a.appointment_id
+                             WHERE a.date >= %s AND a.date <= %s AND s.appointment_id IS NULL""", (first, last))['n']
+    if orphans:
+        problems.append(f"{orphans} appointments without a slot")
+    booked = db.fetchone("SELECT COUNT(*) AS n FROM appointment_slot WHERE date >= %s AND date <= %s",
+                         (first, last))['n']
+    if booked != len(days) * len(grid):
+        problems.append(f"{booked} slots booked, expected {len(days) * len(grid)}")
+    return problems
+
+
+def cleanup(days):
+    from db import db
+    first, last = days[0], days[-1]
+    db.execute("DELETE FROM appointment WHERE date >= %s AND date <= %s", (first, last))
+    db.execute("DELETE FROM daily_appointment_status WHERE day >= %s AND day <= %s", (first, last))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Concurrent appointment booking stress test")
+    ap.add_argument("--processes", type=int, default=4, help="terminals (separate processes)")
+    ap.add_argument("--threads", type=int, default=4, help="receptionists per terminal")
+    ap.add_argument("--days", type=int, default=3, help="days to fill")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--cleanup", action="store_true", help="delete the test appointments afterwards")
+    args = ap.parse_args(argv)
+
+    import scheduling
+    from db import db
+    patient_ids = [r['patient_id'] for r in db.fetchall("SELECT patient_id FROM patient ORDER BY patient_id DESC LIMIT 1000")]
+    if not patient_ids:
+        raise SystemExit("No patients; load a dataset first (python loader.py)")
+    row = db.fetchone("SELECT date FROM appointment ORDER BY date DESC LIMIT 1")
+    start = max(row['date'], date.today()) + timedelta(days=30) if row else date.today() + timedelta(days=30)
+    days = [start + timedelta(days=k) for k in range(args.days)]
+    db.pool.close_all()     # each terminal process opens its own connections
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        results = list(pool.map(terminal, [days] * args.processes, [patient_ids] * args.processes,
+                                [args.threads] * args.processes, range(args.processes)))
+    wall = time.perf_counter() - t0
+
+    booked = sum(r['booked'] for r in results)
+    conflicts = sum(r['conflicts'] for r in results)
+    ms = [m for r in results for m in r['ms']]
+    print(f"{args.processes} terminals x {args.threads} receptionists, {args.days} days x {len(scheduling.GRID)} slots "
+          f"({days[0]} .. {days[-1]})")
+    print(f"  booked {booked} in {wall:.2f}s ({booked / wall:.0f}/s), {conflicts} conflicts retried")
+    print(f"  book() latency p50 {pct(ms, .5):.2f} ms  p99 {pct(ms, .99):.2f} ms  max {max(ms, default=0):.2f} ms")
+    problems = verify(days, scheduling.GRID)
+    for p in problems:
+        print("  VIOLATION", p)
+    if args.cleanup:
+        cleanup(days)
+    if problems:
+        sys.exit(1)
+    print("  no double bookings")
+
+
+if __name__ == "__main__":
+    main()
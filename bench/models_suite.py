@@ -0,0 +1,264 @@
+# bench/models_suite.py
+"""
+Latency of every public models function at a given dataset scale.
+
+    python -m bench.models_suite --scale 100k --out results.json
+    python -m bench.models_suite --scale 100k --baseline results.json
+
+Runs offline against the database configured in db.DB_CONFIG; point it at a
+scratch local MySQL/MariaDB, since the write functions really write. With
+--scale, patients are topped up to that count with loader.py first (10k,
+100k, 1m or a plain number). Each function gets --iterations timed calls
+(fewer for bulk / rebuild ones) with arguments sampled from the data, after
+a short warm-up. Results are JSON: p50/p99/mean ms, calls/s and rows/s per
+function. With --baseline, a comparison is printed and the exit status is 1
+if any p50 or p99 got slower than --tolerance.
+"""
+import argparse
+import inspect
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import loader
+import models
+import scheduling
+from db import db
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+NOT_TIMED = {'appointment_cursor': "pure helper, no database access",
+             'narrow_by_name': "pure helper, no database access",
+             'narrow_diagnoses': "pure helper, no database access",
+             'normalize_diagnosis': "pure helper, no database access",
+             'normalize_medicine': "pure helper, no database access",
+             'parse_medicines': "pure helper, no database access"}
+
+
+def pct(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * p))]
+
+
+def count_rows(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 0 if result is None else 1
+
+
+class Sample:
+    """Arguments drawn from the data actually in the database."""
+    def __init__(self, rng):
+        self.rng = rng
+        pats = db.fetchall("SELECT patient_id, name, phone FROM patient ORDER BY RAND() LIMIT 2000")
+        if not pats:
+            raise SystemExit("No patients; load a dataset first (--scale 10k)")
+        self.patient_ids = [r['patient_id'] for r in pats]
+        self.names = [r['name'] for r in pats]
+        self.phones = [r['phone'] for r in pats if r['phone']]
+        appts = db.fetchall("""SELECT appointment_id, date, time_slot, status FROM appointment
+                               ORDER BY RAND() LIMIT 2000""")
+        self.appts = appts
+        self.pending = [r['appointment_id'] for r in appts if r['status'] == 'Pending'] or [appts[0]['appointment_id']]
+        self.bill_ids = [r['bill_id'] for r in db.fetchall("SELECT bill_id FROM billing ORDER BY RAND() LIMIT 2000")] or [0]
+        self.prescription_ids = [r['prescription_id'] for r in db.fetchall(
+            "SELECT prescription_id FROM prescription ORDER BY RAND() LIMIT 2000")] or [0]
+        self.days = [r['date'] for r in appts]
+        self.change_floor = max(0, models.last_change_id() - 100)
+        # free (day, slot) pairs past every booked day, so create_appointment never hits SlotTaken
+        row = db.fetchone("SELECT date FROM appointment_slot ORDER BY date DESC LIMIT 1")
+        last = max(row['date'], date.today()) if row else date.today()
+        self.free_slots = ((last + timedelta(days=k), t) for k in itertools.count(1) for t in scheduling.GRID)
+
+    def pick(self, seq):
+        return self.rng.choice(seq)
+
+    def name_query(self):
+        words = self.pick(self.names).split()
+        r = self.rng.random()
+        if r < 0.4:
+            return words[0][:self.rng.randint(2, len(words[0]))]          # typing a first name
+        if r < 0.8:
+            return " ".join(words)
+        return f"{words[-1]} {words[0][:2]}"
+
+    def items(self, n=4):
+        return [{'item_name': f"Item {i}", 'qty': self.rng.randint(1, 3), 'price': round(self.rng.uniform(10, 500), 2)}
+                for i in range(n)]
+
+    def new_patient(self):
+        return (f"Bench {self.rng.choice(loader.FIRST)}", self.rng.randint(1, 90), "Other",
+                str(7000000000 + self.rng.randrange(10**9)), "Bench")
+
+
+def cases(s):
+    """name -> (fn, args_factory, iteration share). Shares < 1 are for expensive calls."""
+    return {
+        'insert_patient': (models.insert_patient, s.new_patient, 1),
+        'list_patients': (models.list_patients, lambda: (), 0.25),
+        'get_patient': (models.get_patient, lambda: (s.pick(s.patient_ids),), 1),
+        'get_patients_by_ids': (models.get_patients_by_ids, lambda: (s.rng.sample(s.patient_ids, 50),), 1),
+        'search_patients[name]': (models.search_patients, lambda: (s.name_query(),), 1),
+        'search_patients[phone]': (models.search_patients, lambda: (s.pick(s.phones)[:6],), 1),
+        'search_patients[id]': (models.search_patients, lambda: (str(s.pick(s.patient_ids)),), 1),
+        'rebuild_rollups': (models.rebuild_rollups, lambda: (), 0.02),
+        'backfill_diagnoses': (models.backfill_diagnoses, lambda: (), 0.1),
+        'backfill_prescription_items': (models.backfill_prescription_items, lambda: (), 0.1),
+        'set_medicine_prices': (models.set_medicine_prices,
+                                lambda: ({m: p + s.rng.randint(0, 5) for m, p in loader.MEDICINES.items()},), 0.1),
+        'create_appointment': (models.create_appointment, lambda: (s.pick(s.patient_ids), *next(s.free_slots)), 1),
+        'list_appointments_for_date': (models.list_appointments_for_date, lambda: (s.pick(s.days),), 1),
+        'list_appointments_page': (models.list_appointments_page, lambda: (models.appointment_cursor(s.pick(s.appts)),), 1),
+        'search_appointments[date]': (models.search_appointments, lambda: (s.pick(s.days).isoformat(),), 1),
+        'search_appointments[name]': (models.search_appointments, lambda: (s.name_query(),), 1),
+        'appointment_search_truncated': (models.appointment_search_truncated, lambda: (s.name_query(),), 1),
+        'get_appointments_by_ids': (models.get_appointments_by_ids,
+                                    lambda: ([r['appointment_id'] for r in s.rng.sample(s.appts, 20)],), 1),
+        'last_change_id': (models.last_change_id, lambda: (), 1),
+        'changes_since': (models.changes_since, lambda: (s.pick(('patient', 'appointment')), s.change_floor), 1),
+        'get_appointment_detail': (models.get_appointment_detail, lambda: (s.pick(s.appts)['appointment_id'],), 1),
+        'appointment_choices[id]': (models.appointment_choices, lambda: (str(s.pick(s.appts)['appointment_id']),), 1),
+        'appointment_choices[name]': (models.appointment_choices, lambda: (s.name_query(),), 1),
+        'mark_appointment_completed': (models.mark_appointment_completed, lambda: (s.pick(s.pending),), 1),
+        'save_prescription': (models.save_prescription,
+                              lambda: (s.pick(s.pending), s.pick(loader.DIAGNOSES), "Paracetamol 500mg, ORS Pack",
+                                       "2 Times a day", "", None), 1),
+        'complete_consultation': (models.complete_consultation,
+                                  lambda: (s.pick(s.pending), s.pick(loader.DIAGNOSES), "Cetirizine 10mg",
+                                           "1 Time a day", "", None), 1),
+        'latest_prescription_for_appt': (models.latest_prescription_for_appt, lambda: (s.pick(s.appts)['appointment_id'],), 1),
+        'prescription_items': (models.prescription_items, lambda: (s.pick(s.prescription_ids),), 1),
+        'billable_medicines': (models.billable_medicines, lambda: (s.pick(s.appts)['appointment_id'],), 1),
+        'create_bill': (models.create_bill, lambda: (s.pick(s.pending), s.items()), 1),
+        'create_bills': (models.create_bills, lambda: ([(s.pick(s.pending), s.items()) for _ in range(50)],), 0.1),
+        'get_bill': (models.get_bill, lambda: (s.pick(s.bill_ids),), 1),
+        'get_pending_appointments_today': (models.get_pending_appointments_today, lambda: (), 1),
+        'get_appointments_for_billing': (models.get_appointments_for_billing, lambda: (), 0.25),
+        'get_revenue_last_n_days': (models.get_revenue_last_n_days, lambda: (30,), 1),
+        'get_age_group_counts': (models.get_age_group_counts, lambda: (), 0.1),
+        'get_appointment_status_counts': (models.get_appointment_status_counts, lambda: (), 1),
+        'get_today_revenue': (models.get_today_revenue, lambda: (), 1),
+        'get_total_revenue': (models.get_total_revenue, lambda: (), 1),
+        'get_disease_distribution': (models.get_disease_distribution, lambda: (10,), 1),
+        'diagnosis_choices': (models.diagnosis_choices, lambda: (s.pick(loader.DIAGNOSES)[:s.rng.randint(1, 4)],), 1),
+        'get_revenue_for_date': (models.get_revenue_for_date, lambda: (s.pick(s.days),), 1),
+        'get_appointment_status_counts_for_date': (models.get_appointment_status_counts_for_date,
+                                                   lambda: (s.pick(s.days).isoformat(),), 1),
+        'count_all_appointments': (models.count_all_appointments, lambda: (), 1),
+        'list_all_appointments': (models.list_all_appointments, lambda: (1000,), 0.1),
+    }
+
+
+def public_functions():
+    return {n for n, f in vars(models).items()
+            if inspect.isfunction(f) and f.__module__ == models.__name__ and not n.startswith("_")}
+
+
+def time_case(fn, make_args, n, warmup=3):
+    for _ in range(warmup):
+        fn(*make_args())
+    ms, rows = [], 0
+    t_all = time.perf_counter()
+    for _ in range(n):
+        args = make_args()
+        t0 = time.perf_counter()
+        result = fn(*args)
+        ms.append((time.perf_counter() - t0) * 1000)
+        rows += count_rows(result)
+    wall = time.perf_counter() - t_all
+    busy = sum(ms) / 1000
+    return {'calls': n, 'p50_ms': pct(ms, .5), 'p99_ms': pct(ms, .99), 'mean_ms': sum(ms) / n,
+            'calls_per_s': n / busy if busy else 0.0, 'rows': rows,
+            'rows_per_s': rows / busy if busy else 0.0, 'wall_s': wall}
+
+
+def dataset_counts():
+    return {t: db.fetchone(f"SELECT COUNT(*) AS n FROM {t}")['n']
+            for t in ('patient', 'appointment', 'prescription', 'billing', 'billing_items')}
+
+
+def ensure_scale(patients, workers):
+    have = db.fetchone("SELECT COUNT(*) AS n FROM patient")['n']
+    if have >= patients:
+        return 0.0
+    print(f"Loading {patients - have} patients (have {have})...", file=sys.stderr)
+    return loader.load(patients - have, workers=workers)['seconds']
+
+
+def compare(results, baseline, tolerance):
+    """Print current vs baseline per function; return the names that regressed."""
+    base = baseline['results']
+    worse = []
+    print(f"{'function':<42} {'p50 ms':>9} {'base':>9} {'Δ%':>7}   {'p99 ms':>9} {'base':>9} {'Δ%':>7}")
+    for name, r in results.items():
+        b = base.get(name)
+        if not b:
+            print(f"{name:<42} {r['p50_ms']:>9.2f} {'-':>9} {'':>7}   {r['p99_ms']:>9.2f} {'-':>9}")
+            continue
+        d50 = (r['p50_ms'] / b['p50_ms'] - 1) * 100 if b['p50_ms'] else 0.0
+        d99 = (r['p99_ms'] / b['p99_ms'] - 1) * 100 if b['p99_ms'] else 0.0
+        flag = ""
+        if d50 > tolerance * 100 or d99 > tolerance * 100:
+            worse.append(name); flag = "  SLOWER"
+        print(f"{name:<42} {r['p50_ms']:>9.2f} {b['p50_ms']:>9.2f} {d50:>+7.1f}   "
+              f"{r['p99_ms']:>9.2f} {b['p99_ms']:>9.2f} {d99:>+7.1f}{flag}")
+    return worse
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark every public models function")
+    ap.add_argument("--scale", help="top the dataset up to this many patients first (10k, 100k, 1m or a number)")
+    ap.add_argument("--iterations", type=int, default=200, help="timed calls per function (before its share)")
+    ap.add_argument("--only", help="comma-separated case names (prefix match)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=None, help="loader processes")
+    ap.add_argument("--out", help="write results JSON here (default: stdout)")
+    ap.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    args = ap.parse_args(argv)
+
+    load_s = ensure_scale(SCALES.get(args.scale, None) or int(args.scale), args.workers) if args.scale else 0.0
+    rng = random.Random(args.seed)
+    sample = Sample(rng)
+    table = cases(sample)
+    missing = public_functions() - {n.split("[")[0] for n in table} - set(NOT_TIMED)
+    if missing:
+        print(f"warning: not benchmarked: {', '.join(sorted(missing))}", file=sys.stderr)
+    if args.only:
+        wanted = args.only.split(",")
+        table = {n: c for n, c in table.items() if any(n.startswith(w) for w in wanted)}
+
+    db.connect()
+    t0 = time.perf_counter()
+    models._sync_name_index()       # first name search builds the index: time it once, apart
+    index_s = time.perf_counter() - t0
+
+    results = {}
+    for name, (fn, make_args, share) in table.items():
+        results[name] = time_case(fn, make_args, max(3, int(args.iterations * share)), warmup=3 if share >= 1 else 1)
+        print(f"{name:<42} p50 {results[name]['p50_ms']:8.2f} ms  p99 {results[name]['p99_ms']:8.2f} ms",
+              file=sys.stderr)
+
+    report = {'meta': {'at': time.strftime("%Y-%m-%dT%H:%M:%S"), 'python': platform.python_version(),
+                       'host': platform.node(), 'iterations': args.iterations, 'seed': args.seed,
+                       'dataset': dataset_counts(), 'load_seconds': load_s, 'name_index_build_seconds': index_s,
+                       'pool': db.pool_stats()},
+              'results': results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    elif not args.baseline:
+        json.dump(report, sys.stdout, indent=2, default=str); print()
+    if args.baseline:
+        with open(args.baseline) as f:
+            worse = compare(results, json.load(f), args.tolerance)
+        if worse:
+            print(f"{len(worse)} function(s) slower than baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
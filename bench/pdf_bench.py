@@ -0,0 +1,132 @@
+# bench/pdf_bench.py
+"""
+Documents per second: previous per-call canvas rendering vs utils.PdfRenderer.
+
+    python -m bench.pdf_bench --docs 500
+
+legacy      the original export_* body (new Canvas per document, whole page
+            drawn every time), writing to an in-memory buffer
+per-doc     utils.render_*_pdf (one renderer per document)
+merged      one PdfRenderer for all documents: layout form drawn once
+"""
+import argparse
+import io
+import time
+from datetime import date, datetime
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+import utils
+
+PATIENT = {'name': 'Rohan Sharma', 'age': 32, 'gender': 'Male', 'phone': '9876543210'}
+PRESCRIPTION = {'diagnosis': 'Viral Fever', 'medicines': 'Paracetamol 500mg, ORS Pack, Cetirizine',
+                'dosage': '2 Times a day', 'notes': 'Drink water', 'follow_up_date': date(2025, 11, 2),
+                'created_at': datetime(2025, 10, 30, 10, 15)}
+BILL = {'bill_id': 1042, 'date': date(2025, 10, 30)}
+ITEMS = [{'item_name': f'Item {i}', 'qty': 1 + i % 3, 'price': 12.5 * (i + 1)} for i in range(8)]
+
+
+def legacy_prescription(buf, patient_info, prescription):
+    c = canvas.Canvas(buf, pagesize=A4)
+    w, h = A4
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(40, h-60, "City Care Clinic")
+    c.setFont("Helvetica", 11)
+    c.drawString(40, h-90, f"Patient Name: {patient_info.get('name','')}")
+    c.drawString(300, h-90, f"Age: {patient_info.get('age','')}  Gender: {patient_info.get('gender','')}")
+    c.drawString(40, h-110, f"Phone: {patient_info.get('phone','')}")
+    c.drawString(40, h-140, "Diagnosis:")
+    t = c.beginText(40, h-160); t.setFont("Helvetica", 11)
+    for line in (prescription.get('diagnosis') or "").split("\n"):
+        t.textLine(line)
+    c.drawText(t)
+    c.drawString(40, h-250, "Medicines & Dosage:")
+    t2 = c.beginText(40, h-270); t2.setFont("Helvetica", 11)
+    meds_list = [m.strip() for m in prescription.get('medicines','').split(",") if m.strip()]
+    for i,m in enumerate(meds_list, start=1):
+        t2.textLine(f"{i}. {m} - {prescription.get('dosage','')}")
+    c.drawText(t2)
+    c.drawString(40, h-380, f"Notes: {prescription.get('notes','')}")
+    c.drawString(40, h-410, f"Follow-up Date: {prescription.get('follow_up_date') or 'N/A'}")
+    c.drawString(40, h-460, f"Date: {prescription.get('created_at') or datetime.now()}")
+    c.drawString(40, h-500, "Doctor Signature: ____________________")
+    c.save()
+
+
+def legacy_invoice(buf, bill, items, patient_name):
+    c = canvas.Canvas(buf, pagesize=A4)
+    w, h = A4
+    c.setFont("Helvetica-Bold", 16); c.drawString(40, h-60, "City Care Clinic   Invoice")
+    c.setFont("Helvetica", 11)
+    c.drawString(40, h-90, f"Patient / Visit: {patient_name}")
+    c.drawString(40, h-110, f"Bill ID: {bill['bill_id']}   Date: {bill['date']}")
+    y = h-150
+    c.drawString(40, y, "Item"); c.drawString(320, y, "Qty"); c.drawString(420, y, "Price"); c.drawString(520, y, "Amount")
+    y -= 20
+    total = 0
+    for it in items:
+        amt = it['qty'] * float(it['price'])
+        c.drawString(40, y, it['item_name'])
+        c.drawString(320, y, str(it['qty']))
+        c.drawString(420, y, f"{it['price']:.2f}")
+        c.drawString(520, y, f"{amt:.2f}")
+        total += amt
+        y -= 18
+    c.drawString(420, y-10, "Total:"); c.drawString(520, y-10, f"{total:.2f}")
+    c.save()
+
+
+def rate(fn, n):
+    t0 = time.perf_counter()
+    size = fn(n)
+    dt = time.perf_counter() - t0
+    return n / dt, size / n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=500)
+    n = ap.parse_args().docs
+
+    def legacy(kind):
+        def run(n):
+            size = 0
+            for _ in range(n):
+                buf = io.BytesIO()
+                if kind == 'prescription':
+                    legacy_prescription(buf, PATIENT, PRESCRIPTION)
+                else:
+                    legacy_invoice(buf, BILL, ITEMS, PATIENT['name'])
+                size += len(buf.getvalue())
+            return size
+        return run
+
+    def per_doc(kind):
+        def run(n):
+            if kind == 'prescription':
+                return sum(len(utils.render_prescription_pdf(PATIENT, PRESCRIPTION)) for _ in range(n))
+            return sum(len(utils.render_invoice_pdf(BILL, ITEMS, PATIENT['name'])) for _ in range(n))
+        return run
+
+    def merged(kind):
+        def run(n):
+            r = utils.PdfRenderer()
+            for _ in range(n):
+                if kind == 'prescription':
+                    r.prescription(PATIENT, PRESCRIPTION)
+                else:
+                    r.invoice(BILL, ITEMS, PATIENT['name'])
+            return len(r.getvalue())
+        return run
+
+    print(f"{'document':<13} {'mode':<8} {'docs/s':>9} {'bytes/doc':>10}")
+    for kind in ('prescription', 'invoice'):
+        for mode, make in (('legacy', legacy), ('per-doc', per_doc), ('merged', merged)):
+            make(kind)(10)  # warm up font / module caches
+            per_s, size = rate(make(kind), n)
+            print(f"{kind:<13} {mode:<8} {per_s:>9.0f} {size:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
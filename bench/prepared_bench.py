@@ -0,0 +1,82 @@
+# bench/prepared_bench.py
+"""
+Per-query latency of the hot models lookups, text protocol vs cached
+prepared statements (DB.fetchall/fetchone with prepared=True).
+
+    python -m bench.prepared_bench --lookups 2000
+
+Read-only: replays the SQL of latest_prescription_for_appt, get_bill,
+list_appointments_for_date and get_pending_appointments_today against ids
+already in the configured database, on one warm pooled connection.
+"""
+import argparse
+import random
+import time
+from datetime import date
+
+from db import db
+
+QUERIES = {
+    'latest_prescription': ("SELECT * FROM prescription WHERE appointment_id=%s ORDER BY created_at DESC LIMIT 1", 'one'),
+    'bill': ("SELECT * FROM billing WHERE bill_id=%s", 'one'),
+    'bill_items': ("SELECT * FROM billing_items WHERE bill_id=%s", 'all'),
+    'appointments_for_date': ("""SELECT a.appointment_id, a.time_slot, a.status, p.name
+           FROM appointment a JOIN patient p ON a.patient_id=p.patient_id
+           WHERE a.date=%s ORDER BY a.time_slot""", 'all'),
+    'pending_today': ("""SELECT a.appointment_id, p.name, a.time_slot FROM appointment a
+                          JOIN patient p ON a.patient_id=p.patient_id
+                          WHERE a.date=%s AND a.status='Pending' ORDER BY a.time_slot""", 'all'),
+}
+
+
+def pct(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * p))]
+
+
+def sample_params(rng, n):
+    appts = [r['appointment_id'] for r in db.fetchall("SELECT appointment_id FROM appointment ORDER BY appointment_id DESC LIMIT 5000")]
+    bills = [r['bill_id'] for r in db.fetchall("SELECT bill_id FROM billing ORDER BY bill_id DESC LIMIT 5000")] or [0]
+    days = [r['date'] for r in db.fetchall("SELECT DISTINCT date FROM appointment ORDER BY date DESC LIMIT 60")]
+    if not appts:
+        raise SystemExit("No appointments; seed the database first (python seed_demo.py)")
+    today = date.today().isoformat()
+    return {
+        'latest_prescription': [(rng.choice(appts),) for _ in range(n)],
+        'bill': [(rng.choice(bills),) for _ in range(n)],
+        'bill_items': [(rng.choice(bills),) for _ in range(n)],
+        'appointments_for_date': [(rng.choice(days),) for _ in range(n)],
+        'pending_today': [(today,)] * n,
+    }
+
+
+def run(q, kind, params, prepared):
+    fetch = db.fetchone if kind == 'one' else db.fetchall
+    out = []
+    for p in params:
+        t0 = time.perf_counter()
+        fetch(q, p, prepared=prepared)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lookups", type=int, default=2000, help="lookups per query and mode")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+    params = sample_params(rng, args.lookups)
+    db.connect()
+
+    print(f"{'query':<22} {'mode':<9} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for name, (q, kind) in QUERIES.items():
+        for mode, prepared in (('text', False), ('prepared', True)):
+            run(q, kind, params[name][:50], prepared)   # warm up (and prepare)
+            ms = run(q, kind, params[name], prepared)
+            print(f"{name:<22} {mode:<9} {pct(ms, .5):>8.3f} {pct(ms, .99):>8.3f} {sum(ms) / len(ms):>8.3f}")
+    print("pool:", db.pool_stats())
+
+
+if __name__ == "__main__":
+    main()
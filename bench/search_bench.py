@@ -0,0 +1,84 @@
+# bench/search_bench.py
+"""
+Latency of the in-process patient name index (search.NameIndex).
+
+    python -m bench.search_bench --patients 1000000
+
+No database needed: names mix seed_demo's common names with generated
+ones, so the vocabulary is large and skewed like a real clinic's.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from search import NameIndex
+
+FIRST = ["Aman","Riya","Vikram","Priya","Arun","Sneha","Rohan","Meera","Karan","Sonal","Deepa","Nitin",
+         "Anita","Pooja","Rahul","Sahil","Nisha","Varun","Tina","Jay","Arjun","Kavya","Ishaan","Tanvi"]
+LAST = ["Sharma","Verma","Singh","Patel","Kumar","Nair","Joshi","Gupta","Reddy","Mehta","Iyer","Das"]
+
+
+SYLLABLES = ["a","an","ar","ka","ki","ma","mi","na","ni","pra","ra","ri","sa","sh","ta","vi","ya","deep","preet","esh"]
+
+
+def make_vocab(rng, common, size):
+    words = set(w.lower() for w in common)
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(w.capitalize() for w in words)
+
+
+def make_names(n, rng):
+    firsts = make_vocab(rng, FIRST, 20000)
+    lasts = make_vocab(rng, LAST, 5000)
+    for pid in range(1, n + 1):
+        # half the patients carry one of the common names
+        first = rng.choice(FIRST) if rng.random() < 0.5 else rng.choice(firsts)
+        last = rng.choice(LAST) if rng.random() < 0.5 else rng.choice(lasts)
+        yield pid, f"{first} {last}"
+
+
+def pct(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * p))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--patients", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    idx = NameIndex()
+    t0 = time.perf_counter()
+    idx.bulk_load(make_names(args.patients, rng))
+    print(f"indexed {len(idx):,} patients in {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    for pid in range(args.patients + 1, args.patients + 1001):
+        idx.add(pid, f"{rng.choice(FIRST)} {rng.choice(LAST)}")
+    print(f"incremental add: {(time.perf_counter() - t0) * 1000 / 1000:.3f} ms/patient")
+
+    kinds = {
+        "full name": lambda: f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+        "one word": lambda: rng.choice(FIRST + LAST),
+        "short prefix": lambda: rng.choice(FIRST)[:2],
+        "two prefixes": lambda: f"{rng.choice(FIRST)[:3]} {rng.choice(LAST)[:2]}",
+        "no match": lambda: "zzqx",
+    }
+    print(f"{'query kind':<14} {'p50 ms':>8} {'p99 ms':>8} {'mean hits':>10}")
+    for kind, gen in kinds.items():
+        times, hits = [], []
+        for _ in range(args.queries):
+            q = gen()
+            t0 = time.perf_counter()
+            hits.append(len(idx.search(q, 200)))
+            times.append((time.perf_counter() - t0) * 1000)
+        print(f"{kind:<14} {pct(times, .5):>8.3f} {pct(times, .99):>8.3f} {statistics.mean(hits):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
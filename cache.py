@@ -0,0 +1,103 @@
+# cache.py
+"""
+Bounded read-through caches for detail lookups the screens repeat (patient
+row, appointment detail, latest prescription, bill).
+
+Entries are evicted least-recently-used once a cache holds `maxsize` keys and
+expire `ttl` seconds after they were loaded, which bounds how long a change
+made from another terminal can go unseen. Changes made through models.py
+invalidate the affected keys as soon as they commit. Hit / miss counters
+appear in the metrics export (and the Diagnostics screen) as gauges.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+_caches = {}    # name -> LRUCache, for stats() / clear_all()
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    key -> value with LRU eviction and a per-entry TTL.
+
+    get_or_load(key, load) returns the cached value or calls load() and keeps
+    its result. A None result is returned but not kept, so "not found yet"
+    is always re-read. load() runs outside the lock: two threads missing the
+    same key may both load it, the later result wins.
+    """
+    def __init__(self, name, maxsize=512, ttl=60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()      # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = self.invalidations = 0
+        _caches[name] = self
+        metrics.gauge(f"cache_{name}", self.stats)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+                self.expired += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, load):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = load()
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'ttl_s': self.ttl,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'expired': self.expired, 'invalidations': self.invalidations}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.expired = self.invalidations = 0
+
+
+def stats():
+    """name -> stats() for every cache."""
+    return {name: c.stats() for name, c in _caches.items()}
+
+def clear_all():
+    for c in _caches.values():
+        c.clear()
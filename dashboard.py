@@ -0,0 +1,175 @@
+# dashboard.py
+import math
+from datetime import date
+import customtkinter as ctk
+import matplotlib
+
+# use Agg backend for embedding in Tkinter
+matplotlib.use("Agg")
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+
+import analytics
+import models
+
+REFRESH_MS = 60_000        # auto-refresh while the dashboard is on screen
+MAX_BARS = 10
+TREND_DAYS = 30
+STATUSES = ('Pending', 'Completed')
+STYLE = 'seaborn-v0_8-darkgrid'
+
+
+def load_dashboard_data():
+    # runs on a worker thread: queries only, no Tk calls
+    today = date.today().isoformat()
+    return {
+        'patients_today': len(models.list_appointments_for_date(today)),
+        # ✅ Total appointments lifetime
+        'total_appts': models.count_all_appointments(),
+        'today_rev': models.get_revenue_for_date(today) or 0,
+        'total_rev': models.get_total_revenue() or 0,
+        'diseases': models.get_disease_distribution(MAX_BARS),
+        'status': models.get_appointment_status_counts_for_date(today),
+        'trend': load_trend(),
+    }
+
+def load_trend():
+    """
+    (refreshed_at, ((day, rupees), ...)) of the last TREND_DAYS from the
+    analytics snapshot, or None before the first analytics-refresh. The
+    tiles above stay on the live rollups: they show today, which a snapshot
+    only has as of its last refresh.
+    """
+    snap = analytics.Snapshot()
+    if not snap.rows:
+        return None
+    return snap.refreshed_at, tuple((r['date'], r['total']) for r in snap.revenue_last_n_days(TREND_DAYS))
+
+
+class DashboardView:
+    """
+    The dashboard screen, built once per app.
+
+    The figure, canvas, bars and pie wedges are created on first use and then
+    updated in place: bar heights / tick labels and wedge angles change, no
+    artists or canvases are recreated, and nothing is redrawn when the data
+    did not change. While shown it refreshes itself every REFRESH_MS.
+    """
+    def __init__(self, master, runner):
+        self.runner = runner
+        self.frame = ctk.CTkFrame(master)
+        self._timer = None
+        self._last = None
+
+        header_frame = ctk.CTkFrame(self.frame)
+        header_frame.pack(fill="x", padx=12, pady=8)
+        stat_font = ctk.CTkFont(size=16, weight="bold")
+        self.stats = [ctk.StringVar(value=f"{title}\n...") for title in
+                      ("Patients Today", "Total Appointments (Lifetime)", "Today's Revenue", "Total Revenue")]
+        for var in self.stats:
+            ctk.CTkLabel(header_frame, textvariable=var, font=stat_font).pack(side="left", padx=15)
+
+        charts_frame = ctk.CTkFrame(self.frame)
+        charts_frame.pack(fill="both", expand=True, padx=12, pady=6)
+
+        with plt.style.context(STYLE):
+            self.fig = Figure(figsize=(10,6), tight_layout=True)
+            self.ax1 = self.fig.add_subplot(2,2,1)
+            self.ax2 = self.fig.add_subplot(2,2,2)
+            self.ax3 = self.fig.add_subplot(2,1,2)
+            self.bars = self.ax1.bar(range(MAX_BARS), [0] * MAX_BARS)
+            self.ax1.set_title("Disease Distribution")
+            self.ax1.tick_params(axis='x', rotation=45)
+            self.wedges, self.wedge_labels, self.wedge_pcts = self.ax2.pie(
+                [1] * len(STATUSES), labels=STATUSES, autopct='%1.1f%%')
+            self.ax2.set_aspect('equal')
+            self.trend, = self.ax3.plot([], [], marker='.')
+            days = mdates.AutoDateLocator()
+            self.ax3.xaxis.set_major_locator(days)
+            self.ax3.xaxis.set_major_formatter(mdates.ConciseDateFormatter(days))
+
+        self.canvas = FigureCanvasTkAgg(self.fig, master=charts_frame)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True, padx=8, pady=8)
+
+    # ---------- visibility / refresh ----------
+    def show(self):
+        self.frame.pack(fill="both", expand=True)
+        self.refresh()
+
+    def hide(self):
+        self.frame.pack_forget()
+        if self._timer:
+            self.frame.after_cancel(self._timer)
+            self._timer = None
+
+    def refresh(self):
+        if self._timer:
+            self.frame.after_cancel(self._timer)
+        self._timer = self.frame.after(REFRESH_MS, self.refresh)
+        self.runner.submit(load_dashboard_data, on_done=self.update)
+
+    # ---------- in-place updates ----------
+    def update(self, data):
+        stats = (data['patients_today'], data['total_appts'], float(data['today_rev']), float(data['total_rev']))
+        diseases = tuple((r['diagnosis'], int(r['cnt'])) for r in data['diseases'])
+        status = {r['status']: int(r['cnt']) for r in data['status']}
+        snapshot = (stats, diseases, tuple(status.get(s, 0) for s in STATUSES), data['trend'])
+        if snapshot == self._last:
+            return
+        if self._last is None or stats != self._last[0]:
+            self.stats[0].set(f"Patients Today\n{stats[0]}")
+            self.stats[1].set(f"Total Appointments (Lifetime)\n{stats[1]}")
+            self.stats[2].set(f"Today's Revenue\n₹{stats[2]:.2f}")
+            self.stats[3].set(f"Total Revenue\n₹{stats[3]:.2f}")
+        if self._last is None or snapshot[1:] != self._last[1:]:
+            self._update_bars(diseases or (("No Data", 1),))
+            self._update_pie(snapshot[2])
+            self._update_trend(snapshot[3])
+            self.canvas.draw_idle()
+        self._last = snapshot
+
+    def _update_bars(self, diseases):
+        for i, rect in enumerate(self.bars):
+            rect.set_height(diseases[i][1] if i < len(diseases) else 0)
+        self.ax1.set_xticks(range(len(diseases)))
+        self.ax1.set_xticklabels([d[0] for d in diseases])
+        self.ax1.set_xlim(-0.6, len(diseases) - 0.4)
+        self.ax1.set_ylim(0, max(c for _, c in diseases) * 1.1)
+
+    def _update_trend(self, trend):
+        if trend is None:
+            self.ax3.set_title("Revenue trend: no analytics snapshot yet (maintenance.py analytics-refresh)")
+            self.trend.set_data([], [])
+            return
+        refreshed, points = trend
+        self.ax3.set_title(f"Revenue, last {TREND_DAYS} days (snapshot {str(refreshed or '')[:16]})")
+        self.trend.set_data([d for d, _ in points], [t for _, t in points])
+        if points:
+            self.ax3.relim()
+            self.ax3.autoscale_view()
+
+    def _update_pie(self, counts):
+        total = sum(counts)
+        labels = STATUSES
+        if not total:
+            counts, labels = (1,) + (0,) * (len(STATUSES) - 1), ("No Data",) + ("",) * (len(STATUSES) - 1)
+            total = 1
+        theta = 0.0
+        for wedge, label, pct, cnt, text in zip(self.wedges, self.wedge_labels, self.wedge_pcts, counts, labels):
+            frac = cnt / total
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + 360 * frac)
+            mid = math.radians(theta + 180 * frac)
+            x, y = math.cos(mid), math.sin(mid)
+            # same placement pie() uses: labels at 1.1 r, percentages at 0.6 r
+            label.set_position((1.1 * x, 1.1 * y))
+            label.set_horizontalalignment('left' if x > 0 else 'right')
+            label.set_text(text)
+            label.set_visible(bool(cnt))
+            pct.set_position((0.6 * x, 0.6 * y))
+            pct.set_text(f"{100 * frac:.1f}%")
+            pct.set_visible(bool(cnt))
+            wedge.set_visible(bool(cnt))
+            theta += 360 * frac
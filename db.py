@@ -1,7 +1,24 @@
 # db.py
-import mysql.connector
-from mysql.connector import Error, InterfaceError, OperationalError
-from tkinter import messagebox
+import threading
+import time
+from collections import OrderedDict, deque
+import os
+from contextlib import contextmanager
+try:
+    from mysql.connector import Error, IntegrityError, InterfaceError, OperationalError
+except ImportError:     # SQLite-only install
+    class Error(Exception):
+        pass
+    class IntegrityError(Error):
+        pass
+    class InterfaceError(Error):
+        pass
+    class OperationalError(Error):
+        pass
+import metrics
+
+# Storage backend: 'mysql' (server, DB_CONFIG) or 'sqlite' (in-process file, SQLITE_CONFIG)
+DB_BACKEND = os.environ.get("CLINIC_DB_BACKEND", "mysql")
 
 DB_CONFIG = {
     'host': 'localhost',
@@ -11,72 +28,418 @@ DB_CONFIG = {
     'port': 3306
 }
 
-class DB:
-    def __init__(self, cfg=DB_CONFIG):
-        self.cfg = cfg
-        self.conn = None
-        self.connect()
+SQLITE_CONFIG = {
+    'path': os.environ.get("CLINIC_DB_PATH", "clinicdb.sqlite3"),
+}
+
+# Pool tuning
+POOL_SIZE = 5               # max open connections
+POOL_TIMEOUT = 30           # seconds a caller waits for a free connection
+MAX_IDLE = 60               # idle seconds after which a connection is pinged before reuse
+CONNECT_RETRIES = 3
+BACKOFF = 0.5               # first retry delay, doubled each attempt (seconds)
+STMT_CACHE_SIZE = 32        # prepared statements kept per connection (LRU)
+
+
+class PoolTimeout(Error):
+    pass
+
+
+class MySQLBackend:
+    """mysql.connector connections in autocommit mode."""
+    name = 'mysql'
+    errors = (Error,)
+    retry_errors = (OperationalError, InterfaceError)   # lost / broken connection
+    integrity_errors = (IntegrityError,)                # duplicate key, foreign key
+
+    def __init__(self, cfg):
+        self.cfg = dict(cfg, autocommit=True)
 
     def connect(self):
+        import mysql.connector
+        return mysql.connector.connect(**self.cfg)
+
+    @staticmethod
+    def is_duplicate(e):
+        return getattr(e, 'errno', None) == 1062       # ER_DUP_ENTRY
+
+
+def make_backend(name=None, cfg=None):
+    name = name or DB_BACKEND
+    if name == 'mysql':
+        return MySQLBackend(cfg or DB_CONFIG)
+    if name == 'sqlite':
+        from sqlite_backend import SQLiteBackend
+        return SQLiteBackend(cfg or SQLITE_CONFIG)
+    raise ValueError(f"Unknown DB backend {name!r} (expected 'mysql' or 'sqlite')")
+
+
+class PooledConnection:
+    """A raw connection plus the bookkeeping the pool needs."""
+    def __init__(self, raw, stmt_cache=STMT_CACHE_SIZE):
+        self.raw = raw
+        self.last_used = time.monotonic()
+        self.stmt_cache = stmt_cache
+        self._stmts = OrderedDict()     # sql text -> (sql, prepared cursor)
+
+    def statement(self, q):
+        """
+        Prepared cursor for q on this connection, least recently used one
+        evicted past stmt_cache. Returns (cursor, sql, hit): execute the cached
+        sql object, not q, since the connector only skips re-preparing when it
+        is handed the very same string. A new connection starts with an empty
+        cache, so a reconnect never reuses a dead statement id.
+        """
+        entry = self._stmts.get(q)
+        if entry is not None:
+            self._stmts.move_to_end(q)
+            return entry[1], entry[0], True
+        cur = self.raw.cursor(prepared=True)
+        self._stmts[q] = (q, cur)
+        if len(self._stmts) > self.stmt_cache:
+            _close_quietly(self._stmts.popitem(last=False)[1][1])
+        return cur, q, False
+
+    def forget(self, q):
+        entry = self._stmts.pop(q, None)
+        if entry:
+            _close_quietly(entry[1])
+
+    def clear_statements(self):
+        stmts, self._stmts = self._stmts, OrderedDict()
+        for _, cur in stmts.values():
+            _close_quietly(cur)
+
+    def close(self):
+        self.clear_statements()
+        _close_quietly(self.raw)
+
+
+def _close_quietly(obj):
+    try:
+        obj.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of backend connections.
+    Connections are opened on demand up to `size`; callers beyond that wait.
+    A connection is only pinged when it sat idle longer than `max_idle`,
+    so hot paths pay no extra round trip.
+    """
+    def __init__(self, backend, size=POOL_SIZE, timeout=POOL_TIMEOUT, max_idle=MAX_IDLE,
+                 retries=CONNECT_RETRIES, backoff=BACKOFF):
+        self.backend = backend
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.retries = retries
+        self.backoff = backoff
+        self._idle = deque()
+        self._open = 0
+        self._cond = threading.Condition()
+        self.stats = {'checkouts': 0, 'waits': 0, 'connects': 0, 'reconnects': 0,
+                      'pings': 0, 'discarded': 0, 'prepares': 0, 'stmt_hits': 0}
+
+    def _connect(self):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                raw = self.backend.connect()
+                self._bump('connects')
+                return PooledConnection(raw)
+            except self.backend.errors:
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def _bump(self, key, n=1):
+        with self._cond:
+            self.stats[key] += n
+
+    def _alive(self, pc):
+        self._bump('pings')
         try:
-            self.conn = mysql.connector.connect(**self.cfg)
-        except Error as e:
-            messagebox.showerror("Database Connection Failed", f"Cannot connect to the database:\n{e}")
+            pc.raw.ping(reconnect=False)
+            return True
+        except self.backend.errors:
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self.stats['checkouts'] += 1
+            waited = False
+            while not self._idle and self._open >= self.size:
+                if not waited:
+                    self.stats['waits'] += 1
+                    waited = True
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise PoolTimeout(f"No free database connection after {self.timeout}s")
+                self._cond.wait(left)
+            if self._idle:
+                pc = self._idle.pop()
+            else:
+                pc = None
+                self._open += 1
+        if pc is not None:
+            if time.monotonic() - pc.last_used < self.max_idle or self._alive(pc):
+                return pc
+            pc.close()
+            self._bump('reconnects')
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, pc, discard=False):
+        with self._cond:
+            if discard:
+                self._open -= 1
+                self.stats['discarded'] += 1
+            else:
+                pc.last_used = time.monotonic()
+                self._idle.append(pc)
+            self._cond.notify()
+        if discard:
+            pc.close()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for pc in idle:
+            pc.close()
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, open=self._open, idle=len(self._idle), size=self.size)
+
+
+class DB:
+    # Creating a DB opens nothing; the first query (or connect()) does.
+    # backend/cfg default to DB_BACKEND and its config block above.
+    def __init__(self, cfg=None, pool_size=POOL_SIZE, backend=None):
+        self.backend = make_backend(backend, cfg)
+        self.pool = ConnectionPool(self.backend, size=pool_size)
+        self._local = threading.local()     # .tx: connection of this thread's open transaction
+
+    def connect(self):
+        """Open (and return to the pool) one connection, raising if the server is unreachable."""
+        self.pool.release(self.pool.acquire())
+
+    def _run(self, work):
+        """Check out a connection, run work(pooled_conn), return it to the pool.
+        A dropped connection is discarded and the call retried once on a fresh one.
+        Inside transaction() the work runs on the transaction's connection instead,
+        with no retry: replaying one statement of a half-done unit is never safe."""
+        tx = getattr(self._local, 'tx', None)
+        if tx is not None:
+            return work(tx)
+        for attempt in (0, 1):
+            pc = self.pool.acquire()
+            try:
+                result = work(pc)
+            except self.backend.retry_errors:
+                self.pool.release(pc, discard=True)
+                if attempt:
+                    raise
+                self.pool._bump('reconnects')
+                continue
+            except Exception:
+                self.pool.release(pc)
+                raise
+            self.pool.release(pc)
+            return result
 
-    def ensure_connection(self):
+    def _call(self, q, work, rows=None):
+        """_run(work), recording latency and rows(result) under q's fingerprint when metrics are on."""
+        if not metrics.ENABLED:
+            return self._run(work)
+        t0 = time.perf_counter()
         try:
-            if not self.conn.is_connected():
-                self.connect()
-        except:
-            self.connect()
+            result = self._run(work)
+        except Exception:
+            metrics.record_sql(q, time.perf_counter() - t0, error=True)
+            raise
+        metrics.record_sql(q, time.perf_counter() - t0, rows(result) if rows else 0)
+        return result
 
-    def fetchall(self, q, params=()):
-        self.ensure_connection()
+    def in_transaction(self):
+        return getattr(self._local, 'tx', None) is not None
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group every db call this thread makes inside the block into one
+        transaction on one connection: a single commit when the block exits,
+        a rollback if it raises. A nested transaction() (or atomic) joins the
+        outer one. Connection loss is not retried here; use run_in_transaction
+        to replay the whole unit.
+        """
+        if self.in_transaction():
+            yield self
+            return
+        pc = self.pool.acquire()
         try:
-            cur = self.conn.cursor(dictionary=True)
-            cur.execute(q, params)
-            rows = cur.fetchall()
-            cur.close()
-            return rows
-        except (OperationalError, InterfaceError):
-            self.connect()
-            return self.fetchall(q, params)
-
-    def fetchone(self, q, params=()):
-        self.ensure_connection()
+            pc.raw.start_transaction()
+        except self.backend.retry_errors:
+            self.pool.release(pc, discard=True)
+            raise
+        self._local.tx = pc
+        self._local.on_commit = []
         try:
-            cur = self.conn.cursor(dictionary=True)
-            cur.execute(q, params)
-            row = cur.fetchone()
-            cur.close()
-            return row
-        except (OperationalError, InterfaceError):
-            self.connect()
-            return self.fetchone(q, params)
-
-    def execute(self, q, params=()):
-        self.ensure_connection()
+            yield self
+            if metrics.ENABLED:
+                t0 = time.perf_counter()
+                pc.raw.commit()
+                metrics.record('txn', 'commit', time.perf_counter() - t0)
+            else:
+                pc.raw.commit()
+        except BaseException as e:
+            broken = isinstance(e, self.backend.retry_errors)
+            if not broken:
+                try:
+                    pc.raw.rollback()
+                except self.backend.errors:
+                    broken = True
+            self._local.tx = self._local.on_commit = None
+            self.pool.release(pc, discard=broken)
+            raise
+        callbacks, self._local.tx, self._local.on_commit = self._local.on_commit, None, None
+        self.pool.release(pc)
+        for fn in callbacks:
+            fn()
+
+    def after_commit(self, fn):
+        """Call fn() once this thread's open transaction commits (dropped on rollback);
+        right away when no transaction is open."""
+        if self.in_transaction():
+            self._local.on_commit.append(fn)
+        else:
+            fn()
+
+    def run_in_transaction(self, fn, *args, **kw):
+        """
+        Call fn(*args, **kw) inside transaction() and return its result. If the
+        connection drops, the rolled-back unit is replayed once from the start
+        on a fresh connection. Called within an open transaction it just joins it.
+        """
+        if self.in_transaction():
+            return fn(*args, **kw)
+        for attempt in (0, 1):
+            try:
+                with self.transaction():
+                    return fn(*args, **kw)
+            except self.backend.retry_errors:
+                if attempt:
+                    raise
+                self.pool._bump('reconnects')
+
+    def _prepared(self, pc, q, params):
+        """Execute q as a cached server-side prepared statement; the cursor is left drained."""
+        cur, sql, hit = pc.statement(q)
+        self.pool._bump('stmt_hits' if hit else 'prepares')
         try:
-            cur = self.conn.cursor()
-            cur.execute(q, params)
-            self.conn.commit()
-            cur.close()
-            return True
-        except (OperationalError, InterfaceError):
-            self.connect()
-            return self.execute(q, params)
+            cur.execute(sql, params)
+            return cur
+        except Exception:
+            pc.forget(q)
+            raise
+
+    # prepared=True: for hot fixed-shape queries (same SQL text every call);
+    # the server parses them once per connection instead of on every call
+    def fetchall(self, q, params=(), prepared=False):
+        def work(pc):
+            if prepared:
+                cur = self._prepared(pc, q, params)
+                names = cur.column_names
+                return [dict(zip(names, row)) for row in cur.fetchall()]
+            cur = pc.raw.cursor(dictionary=True)
+            try:
+                cur.execute(q, params)
+                return cur.fetchall()
+            finally:
+                cur.close()
+        return self._call(q, work, len)
+
+    def fetchone(self, q, params=(), prepared=False):
+        def work(pc):
+            if prepared:
+                cur = self._prepared(pc, q, params)
+                names = cur.column_names
+                rows = cur.fetchall()
+                return dict(zip(names, rows[0])) if rows else None
+            cur = pc.raw.cursor(dictionary=True)
+            try:
+                cur.execute(q, params)
+                row = cur.fetchone()
+                cur.fetchall()  # drain so the connection can be reused
+                return row
+            finally:
+                cur.close()
+        return self._call(q, work, lambda row: int(row is not None))
+
+    def execute(self, q, params=(), prepared=False):
+        # connections run in autocommit mode, so outside transaction() a single statement commits itself
+        def work(pc):
+            if prepared:
+                self._prepared(pc, q, params)
+                return True
+            cur = pc.raw.cursor()
+            try:
+                cur.execute(q, params)
+                return True
+            finally:
+                cur.close()
+        return self._call(q, work)
+
+    def insert(self, q, params=()):
+        """Run one INSERT and return the auto-increment id it generated."""
+        def work(pc):
+            cur = pc.raw.cursor()
+            try:
+                cur.execute(q, params)
+                return cur.lastrowid
+            finally:
+                cur.close()
+        return self._call(q, work, lambda _: 1)
+
+    def atomic(self, work):
+        """
+        Run work(cursor) as one transaction (see run_in_transaction): commit if
+        it returns, roll back if it raises, whole unit retried on a dropped
+        connection. The cursor is buffered and returns dict rows.
+        """
+        def run(pc):
+            cur = pc.raw.cursor(dictionary=True, buffered=True)
+            try:
+                return work(cur)
+            finally:
+                cur.close()
+        return self.run_in_transaction(self._run, run)
 
     def executemany(self, q, params_list):
-        self.ensure_connection()
-        try:
-            cur = self.conn.cursor()
+        def work(cur):
             cur.executemany(q, params_list)
-            self.conn.commit()
-            cur.close()
             return True
-        except (OperationalError, InterfaceError):
-            self.connect()
-            return self.executemany(q, params_list)
+        if not metrics.ENABLED:
+            return self.atomic(work)
+        t0 = time.perf_counter()
+        result = self.atomic(work)
+        metrics.record_sql(q, time.perf_counter() - t0, len(params_list))
+        return result
+
+    def pool_stats(self):
+        return self.pool.snapshot()
 
-# Shared DB instance
+# Shared DB instance (lazy: connects on first use)
 db = DB()
+metrics.gauge('db_pool', db.pool_stats)
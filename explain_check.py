@@ -0,0 +1,133 @@
+# explain_check.py
+"""
+EXPLAIN every query the hot models functions issue and flag full table scans.
+
+    python maintenance.py explain-check
+
+The SQL is not copied here: each function in HOT is called with arguments
+taken from the live data while DB.fetchall/fetchone are intercepted, so the
+check always covers the queries models.py really sends. A plan with
+type=ALL (a plain SCAN on SQLite) on a table outside SCAN_OK fails the
+check. Run it on a database with realistic volumes (see loader.py); on a
+near-empty table the optimizer may prefer a scan no matter which indexes
+exist.
+"""
+import re
+from contextlib import contextmanager
+from datetime import date
+
+import cache
+import metrics
+import models
+import scheduling
+from db import db
+
+# rollup tables hold one row per day (per status / diagnosis): reading them whole is the design
+SCAN_OK = {'daily_revenue', 'daily_appointment_status'}
+# functions that aggregate a whole table on purpose
+SCAN_OK_FUNCTIONS = {'get_age_group_counts'}
+
+
+def hot_calls():
+    """[(label, fn, args)] for the hot read paths, with arguments from the data."""
+    appt = db.fetchone("SELECT appointment_id, date, time_slot FROM appointment ORDER BY appointment_id DESC LIMIT 1")
+    pat = db.fetchone("SELECT patient_id, name, phone FROM patient ORDER BY patient_id DESC LIMIT 1")
+    bill = db.fetchone("SELECT bill_id FROM billing ORDER BY bill_id DESC LIMIT 1")
+    if not appt or not pat:
+        raise SystemExit("explain-check needs some patients and appointments (see loader.py)")
+    today = date.today()
+    calls = [
+        ('list_patients', models.list_patients, (100,)),
+        ('get_patient', models.get_patient, (pat['patient_id'],)),
+        ('search_patients[id]', models.search_patients, (str(pat['patient_id']),)),
+        ('search_patients[name]', models.search_patients, (pat['name'].split()[0],)),
+        ('list_appointments_for_date', models.list_appointments_for_date, (appt['date'],)),
+        ('list_appointments_page', models.list_appointments_page, ()),
+        ('list_appointments_page[next]', models.list_appointments_page, (models.appointment_cursor(appt),)),
+        ('search_appointments[date]', models.search_appointments, (appt['date'].isoformat(),)),
+        ('search_appointments[name]', models.search_appointments, (pat['name'],)),
+        ('appointment_choices[id]', models.appointment_choices, (str(appt['appointment_id']),)),
+        ('get_appointments_by_ids', models.get_appointments_by_ids, ([appt['appointment_id']],)),
+        ('changes_since', models.changes_since, ('appointment', max(0, models.last_change_id() - 100))),
+        ('get_appointment_detail', models.get_appointment_detail, (appt['appointment_id'],)),
+        ('latest_prescription_for_appt', models.latest_prescription_for_appt, (appt['appointment_id'],)),
+        ('billable_medicines', models.billable_medicines, (appt['appointment_id'],)),
+        ('get_pending_appointments_today', models.get_pending_appointments_today, ()),
+        ('get_appointments_for_billing', models.get_appointments_for_billing, ()),
+        ('list_all_appointments', models.list_all_appointments, (100,)),
+        ('get_revenue_last_n_days', models.get_revenue_last_n_days, (30,)),
+        ('get_today_revenue', models.get_today_revenue, ()),
+        ('get_total_revenue', models.get_total_revenue, ()),
+        ('get_revenue_for_date', models.get_revenue_for_date, (today,)),
+        ('get_appointment_status_counts', models.get_appointment_status_counts, ()),
+        ('get_appointment_status_counts_for_date', models.get_appointment_status_counts_for_date, (today.isoformat(),)),
+        ('count_all_appointments', models.count_all_appointments, ()),
+        ('get_disease_distribution', models.get_disease_distribution, (10,)),
+        ('diagnosis_choices', models.diagnosis_choices, ('',)),
+        ('get_age_group_counts', models.get_age_group_counts, ()),
+        ('scheduling.week_grid', lambda d: scheduling.Occupancy().week(d), (today,)),   # fresh bitmap: always reads
+    ]
+    if phone := pat['phone']:
+        calls.append(('search_patients[phone]', models.search_patients, (phone[:6],)))
+    if bill:
+        calls.append(('get_bill', models.get_bill, (bill['bill_id'],)))
+    return calls
+
+
+@contextmanager
+def captured():
+    """Record (sql, params) of every fetchall/fetchone made on the shared db inside the block."""
+    seen = []
+    def wrap(orig):
+        def call(q, params=(), **kw):
+            seen.append((q, params))
+            return orig(q, params, **kw)
+        return call
+    db.fetchall, db.fetchone = wrap(db.fetchall), wrap(db.fetchone)
+    try:
+        yield seen
+    finally:
+        del db.fetchall, db.fetchone     # drop the instance overrides
+
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(.*)$")
+
+def explain(q, params):
+    """Plan rows as dicts with MySQL EXPLAIN keys (table, type, key, rows, Extra)."""
+    if db.backend.name != 'sqlite':
+        return db.fetchall("EXPLAIN " + q, params)
+    plan = []
+    for row in db.fetchall("EXPLAIN QUERY PLAN " + q, params):
+        detail = row['detail']
+        m = _SQLITE_SCAN.match(detail)
+        if m:   # a plain SCAN reads every row; SCAN ... USING (COVERING) INDEX walks an index in order
+            plan.append({'table': m.group(1), 'type': 'index' if 'INDEX' in m.group(2) else 'ALL',
+                         'key': None, 'rows': None, 'Extra': detail})
+        elif detail.startswith("SEARCH "):
+            plan.append({'table': detail.split()[1], 'type': 'ref', 'key': None, 'rows': None, 'Extra': detail})
+    return plan
+
+
+def check(log=print):
+    """EXPLAIN each hot query once; returns a list of (label, sql fingerprint, table) full scans."""
+    models._sync_name_index()       # its one-off bulk load reads the whole patient table by design
+    problems, done = [], set()
+    for label, fn, args in hot_calls():
+        cache.clear_all()           # a cache hit would hide the query
+        with captured() as seen:
+            fn(*args)
+        for q, params in seen:
+            fp = metrics.fingerprint(q)
+            if fp in done:
+                continue
+            done.add(fp)
+            for row in explain(q, params):
+                table = row.get('table') or ''
+                access = row.get('type') or ''
+                ok = (access != 'ALL' or table.startswith('<') or table in SCAN_OK
+                      or label.split('[')[0] in SCAN_OK_FUNCTIONS)
+                log(f"{'ok  ' if ok else 'SCAN'} {label:<40} {table:<26} {access:<7} key={row.get('key')} "
+                    f"rows={row.get('rows')}  {row.get('Extra') or ''}")
+                if not ok:
+                    problems.append((label, fp, table))
+    return problems
@@ -0,0 +1,255 @@
+# loader.py
+"""
+Synthetic data loader for capacity testing: patients, multi-year
+appointments, prescriptions, bills and bill items.
+
+    python loader.py --patients 1000000 --visits 4 --years 3 --workers 8
+    python loader.py --patients 200000 --method load-data
+
+Rows are generated lazily and written in chunks of --chunk patients (with
+all their visits), one transaction per chunk, in parallel processes. Ids are
+assigned up front from fixed ranges above the current maximum of each table,
+so no worker ever reads ids back; run it against a database nobody else is
+writing to. Unused ids in a range simply leave gaps. --method insert
+(default) uses multi-row INSERTs; load-data streams each chunk through a
+temp file with LOAD DATA LOCAL INFILE (MySQL only; needs local_infile=ON on
+the server). On the SQLite backend the workers take turns on the write lock.
+Prescriptions come with their prescription_items; MEDICINES missing from the
+medicine catalog are added at their listed price, prices already in the
+catalog are left alone. The dashboard rollups are rebuilt at the end (which
+also files the generated diagnoses in the diagnosis dictionary), and booked
+slots are claimed in appointment_slot (generated visits share slots freely;
+the earliest appointment keeps each one). Loaded rows are not written to change_log:
+screens that are open during a load see them on their next full reload.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+CHUNK = 1000            # patients per transaction
+TASK_PATIENTS = 20000   # patients per worker task
+ROWS_PER_INSERT = 1000  # rows per multi-row INSERT statement
+MAX_MEDS = 4
+
+FIRST = ["Aman","Riya","Vikram","Priya","Arun","Sneha","Rohan","Meera","Karan","Sonal","Deepa","Nitin","Anita",
+         "Pooja","Rahul","Sahil","Nisha","Varun","Tina","Jay","Arjun","Kavya","Ishaan","Tanvi","Manish","Divya"]
+LAST = ["Sharma","Verma","Singh","Patel","Kumar","Nair","Joshi","Gupta","Reddy","Mehta","Iyer","Das","Bose","Rao"]
+CITIES = ["Jaipur","Delhi","Mumbai","Pune","Chennai","Bangalore","Hyderabad","Kolkata","Lucknow","Chandigarh"]
+TIMES = ["09:00","09:20","09:40","10:00","10:20","10:40","11:00","11:20","11:40","12:00","12:20","12:40","14:00","14:20","14:40"]
+DIAGNOSES = ["Viral Fever","Common Cold","Hypertension","Type 2 Diabetes","Migraine","Gastritis","Allergic Rhinitis",
+             "Back Pain","Bronchitis","Urinary Tract Infection","Dermatitis","Anemia","Sinusitis","Conjunctivitis"]
+MEDICINES = {"Paracetamol 500mg": 20, "Cetirizine 10mg": 35, "Amoxicillin 500mg": 90, "Pantoprazole 40mg": 60,
+             "ORS Pack": 15, "Metformin 500mg": 45, "Amlodipine 5mg": 55, "Ibuprofen 400mg": 30,
+             "Azithromycin 500mg": 120, "Vitamin D3": 80, "Cough Syrup": 95, "Iron Folic Acid": 40}
+DOSAGES = ["1 Time a day", "2 Times a day", "3 Times a day", "As needed"]
+CONSULT_FEE = 300
+
+TABLES = {
+    'patient': ('patient_id', 'name', 'age', 'gender', 'phone', 'address'),
+    'appointment': ('appointment_id', 'patient_id', 'date', 'time_slot', 'status'),
+    'prescription': ('prescription_id', 'appointment_id', 'diagnosis', 'medicines', 'dosage', 'notes',
+                     'follow_up_date', 'created_at'),
+    'prescription_items': ('prescription_id', 'line', 'medicine_id', 'qty'),
+    'billing': ('bill_id', 'appointment_id', 'total_amount', 'date'),
+    'billing_items': ('item_id', 'bill_id', 'item_name', 'qty', 'price'),
+}
+ID_COLS = {t: cols[0] for t, cols in TABLES.items() if t != 'prescription_items'}   # items are keyed by their prescription
+
+
+# --- generation ---
+class Plan:
+    """Volumes plus the id each table starts from; picklable for worker processes."""
+    def __init__(self, patients, visits, years, rx_rate, bill_rate, today_rate, seed, base_ids, medicine_ids,
+                 today=None):
+        self.patients, self.visits, self.years = patients, visits, years
+        self.rx_rate, self.bill_rate, self.today_rate, self.seed = rx_rate, bill_rate, today_rate, seed
+        self.base_ids = base_ids
+        self.medicine_ids = medicine_ids          # MEDICINES name -> catalog id
+        self.today = today or date.today()
+        self.max_visits = 2 * visits - 1          # past visits per patient: uniform 1..max, mean `visits`
+
+    def id_ranges(self, first_patient, n):
+        """Start ids of every table for patients [first_patient, first_patient + n), relative to the plan."""
+        v = self.max_visits + 1                   # + one pending visit today
+        return {'patient': self.base_ids['patient'] + first_patient,
+                'appointment': self.base_ids['appointment'] + first_patient * v,
+                'prescription': self.base_ids['prescription'] + first_patient * v,
+                'billing': self.base_ids['billing'] + first_patient * v,
+                'billing_items': self.base_ids['billing_items'] + first_patient * v * (1 + MAX_MEDS)}
+
+
+def generate(plan, first_patient, n):
+    """
+    Yield (table, row) for patients [first_patient, first_patient + n) and all
+    their visits, parents before children. Deterministic for a given plan seed.
+    """
+    rng = random.Random(plan.seed * 1000003 + first_patient)
+    ids = {t: i + 1 for t, i in plan.id_ranges(first_patient, n).items()}
+    span = max(1, plan.years * 365)
+    meds = list(MEDICINES)
+    for _ in range(n):
+        pid = ids['patient']; ids['patient'] += 1
+        yield 'patient', (pid, f"{rng.choice(FIRST)} {rng.choice(LAST)}", rng.randint(1, 90),
+                          rng.choice(("Male", "Female", "Other")), str(6000000000 + rng.randrange(4000000000)),
+                          rng.choice(CITIES))
+        days = [plan.today - timedelta(days=1 + int(span * rng.random() ** 1.5))   # denser in recent months
+                for _ in range(rng.randint(1, plan.max_visits))]
+        if rng.random() < plan.today_rate:
+            days.append(plan.today)
+        for day in days:
+            slot = rng.choice(TIMES)
+            status = 'Pending' if day >= plan.today else 'Completed'
+            apid = ids['appointment']; ids['appointment'] += 1
+            yield 'appointment', (apid, pid, day, slot, status)
+            if status != 'Completed':
+                continue
+            picked = rng.sample(meds, rng.randint(1, MAX_MEDS))
+            if rng.random() < plan.rx_rate:
+                seen = datetime.combine(day, datetime.strptime(slot, "%H:%M").time())
+                follow = day + timedelta(days=rng.choice((7, 14, 30))) if rng.random() < 0.4 else None
+                yield 'prescription', (ids['prescription'], apid, rng.choice(DIAGNOSES), ", ".join(picked),
+                                       rng.choice(DOSAGES), "", follow, seen)
+                for line, m in enumerate(picked, 1):
+                    yield 'prescription_items', (ids['prescription'], line, plan.medicine_ids[m], 1)
+                ids['prescription'] += 1
+            if rng.random() < plan.bill_rate:
+                bill_id = ids['billing']; ids['billing'] += 1
+                items = [("Consultation", 1, CONSULT_FEE)] + [(m, rng.randint(1, 3), MEDICINES[m]) for m in picked]
+                yield 'billing', (bill_id, apid, sum(q * p for _, q, p in items), day)
+                for name, qty, price in items:
+                    yield 'billing_items', (ids['billing_items'], bill_id, name, qty, price)
+                    ids['billing_items'] += 1
+
+
+# --- writing ---
+def _insert(db, table, rows):
+    cols = TABLES[table]
+    one = "(" + ",".join(["%s"] * len(cols)) + ")"
+    for i in range(0, len(rows), ROWS_PER_INSERT):
+        part = rows[i:i + ROWS_PER_INSERT]
+        db.execute(f"INSERT INTO {table} ({','.join(cols)}) VALUES {','.join([one] * len(part))}",
+                   [v for row in part for v in row])
+
+def _tsv(v):
+    if v is None:
+        return "\\N"
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def _load_data(db, table, rows):
+    fd, path = tempfile.mkstemp(suffix=".tsv", prefix=f"clinic_{table}_")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+            for row in rows:
+                f.write("\t".join(_tsv(v) for v in row)); f.write("\n")
+        db.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+                   f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({','.join(TABLES[table])})", (path,))
+    finally:
+        os.remove(path)
+
+WRITERS = {'insert': _insert, 'load-data': _load_data}
+
+
+def _write_chunk(db, write, rows_by_table):
+    with db.transaction():
+        # every child row references a parent written earlier in this same transaction,
+        # and the connection is private to this loader, so skip the per-row checks
+        if db.backend.name == 'sqlite':
+            db.execute("PRAGMA defer_foreign_keys = ON")
+        else:
+            db.execute("SET foreign_key_checks = 0, unique_checks = 0")
+        for table in TABLES:
+            if rows_by_table[table]:
+                write(db, table, rows_by_table[table])
+
+
+def load_task(plan, first_patient, n, chunk=CHUNK, method='insert'):
+    """Worker: generate and write patients [first_patient, first_patient + n). Returns row counts."""
+    from db import DB, DB_CONFIG
+    cfg = dict(DB_CONFIG, allow_local_infile=True) if method == 'load-data' else None
+    db = DB(cfg, pool_size=1)      # own connection: never reuse one inherited across fork
+    write = WRITERS[method]
+    counts = dict.fromkeys(TABLES, 0)
+    try:
+        for start in range(first_patient, first_patient + n, chunk):
+            rows = {t: [] for t in TABLES}
+            for table, row in generate(plan, start, min(chunk, first_patient + n - start)):
+                rows[table].append(row)
+            _write_chunk(db, write, rows)
+            for t in TABLES:
+                counts[t] += len(rows[t])
+    finally:
+        db.pool.close_all()
+    return counts
+
+
+def base_ids():
+    from db import db
+    return {t: db.fetchone(f"SELECT COALESCE(MAX({col}), 0) AS m FROM {t}")['m'] for t, col in ID_COLS.items()}
+
+
+def load(patients, visits=4, years=3, rx_rate=0.85, bill_rate=0.7, today_rate=0.02, seed=1, workers=None,
+         chunk=CHUNK, method='insert', progress=None, rebuild=True):
+    """
+    Load a synthetic dataset and return {'rows': {table: n}, 'seconds': s, 'rows_per_second': r}.
+    progress(rows_so_far, patients_done, elapsed) is called as worker tasks finish.
+    """
+    import models
+    if method == 'load-data' and models.db.backend.name != 'mysql':
+        raise SystemExit("--method load-data needs the MySQL backend")
+    plan = Plan(patients, visits, years, rx_rate, bill_rate, today_rate, seed, base_ids(),
+                models.set_medicine_prices(MEDICINES, reprice=False))
+    task = max(chunk, min(TASK_PATIENTS, -(-patients // (workers or os.cpu_count() or 1))))
+    totals = dict.fromkeys(TABLES, 0)
+    done = 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(load_task, plan, p, min(task, patients - p), chunk, method): min(task, patients - p)
+                   for p in range(0, patients, task)}
+        for fut in as_completed(futures):
+            for t, n in fut.result().items():
+                totals[t] += n
+            done += futures[fut]
+            if progress:
+                progress(sum(totals.values()), done, time.perf_counter() - t0)
+    load_s = time.perf_counter() - t0
+    if rebuild:
+        import scheduling
+        models.rebuild_rollups()
+        scheduling.backfill()
+    rows = sum(totals.values())
+    return {'rows': totals, 'seconds': load_s, 'rebuild_seconds': time.perf_counter() - t0 - load_s,
+            'rows_per_second': rows / load_s if load_s else 0.0}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load a synthetic clinic dataset")
+    ap.add_argument("--patients", type=int, default=100000)
+    ap.add_argument("--visits", type=int, default=4, help="mean appointments per patient")
+    ap.add_argument("--years", type=int, default=3, help="spread appointments over this many past years")
+    ap.add_argument("--rx-rate", type=float, default=0.85, help="share of completed visits with a prescription")
+    ap.add_argument("--bill-rate", type=float, default=0.7, help="share of completed visits that are billed")
+    ap.add_argument("--today-rate", type=float, default=0.02, help="share of patients with a pending visit today")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    ap.add_argument("--chunk", type=int, default=CHUNK, help="patients per transaction")
+    ap.add_argument("--method", choices=sorted(WRITERS), default="insert")
+    args = ap.parse_args(argv)
+
+    def progress(rows, patients, elapsed):
+        print(f"\r{patients}/{args.patients} patients  {rows} rows  {rows / elapsed:.0f} rows/s", end="", flush=True)
+
+    summary = load(args.patients, args.visits, args.years, args.rx_rate, args.bill_rate, args.today_rate, args.seed,
+                   args.workers, args.chunk, args.method, progress)
+    print()
+    for table, n in summary['rows'].items():
+        print(f"  {table:<14} {n:>12}")
+    print(f"Loaded {sum(summary['rows'].values())} rows in {summary['seconds']:.1f}s "
+          f"({summary['rows_per_second']:.0f} rows/s), rollups and slots rebuilt in {summary['rebuild_seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# maintenance.py
+"""
+Database maintenance commands.
+
+    python maintenance.py migrate
+    python maintenance.py explain-check
+    python maintenance.py rebuild-rollups
+    python maintenance.py prune-changes --days 7
+    python maintenance.py medicine-prices prices.csv
+    python maintenance.py analytics-refresh [--full]
+    python maintenance.py analytics-report
+"""
+import argparse
+import sys
+import time
+
+
+def cmd_rebuild_rollups(args):
+    import models
+    t0 = time.perf_counter()
+    models.rebuild_rollups()
+    print(f"Rebuilt dashboard rollups in {time.perf_counter() - t0:.2f}s")
+
+
+def cmd_prune_changes(args):
+    from db import db
+    # open screens only look a few seconds back; ids are not reused (SQLite AUTOINCREMENT, MySQL 8 counter)
+    db.execute("DELETE FROM change_log WHERE changed_at < CURDATE() - INTERVAL %s DAY", (args.days,))
+    print(f"Dropped change_log entries older than {args.days} day(s)")
+
+
+def cmd_medicine_prices(args):
+    import csv
+    import models
+    with open(args.file, newline="", encoding="utf-8") as f:
+        prices = {row[0]: row[1] for row in csv.reader(f)
+                  if len(row) >= 2 and row[0].strip() and row[0].strip().lower() != 'name'}     # optional header
+    try:
+        prices = {name: round(float(p), 2) for name, p in prices.items()}
+    except ValueError as e:
+        sys.exit(f"{args.file}: {e}")
+    models.set_medicine_prices(prices)
+    print(f"Priced {len(prices)} medicine(s)")
+
+
+def cmd_analytics_refresh(args):
+    import analytics
+    t0 = time.perf_counter()
+    rows = analytics.refresh(full=args.full)
+    print(f"Analytics snapshot in {analytics.DIR} refreshed in {time.perf_counter() - t0:.2f}s: "
+          + ", ".join(f"{n} {t}" for t, n in rows.items()))
+
+
+def cmd_analytics_report(args):
+    import analytics
+    analytics.report()
+
+
+def cmd_migrate(args):
+    import migrations
+    todo = migrations.pending()
+    if not todo:
+        print("Schema is up to date")
+        return
+    print(f"Applying {len(todo)} migration(s)")
+    migrations.migrate()
+
+
+def cmd_explain_check(args):
+    import explain_check
+    problems = explain_check.check()
+    if problems:
+        print(f"\n{len(problems)} full table scan(s) on hot queries:")
+        for label, fp, table in problems:
+            print(f"  {label}: {table}\n    {fp}")
+        sys.exit(1)
+    print("\nNo full table scans on hot queries")
+
+
+COMMANDS = {
+    'migrate': (cmd_migrate, "apply pending schema migrations (indexes, column fixes)"),
+    'explain-check': (cmd_explain_check, "EXPLAIN hot models queries; exit 1 on a full table scan"),
+    'rebuild-rollups': (cmd_rebuild_rollups, "recompute daily revenue / status tables, intern and count diagnoses"),
+    'prune-changes': (cmd_prune_changes, "delete old change_log entries (kept for delta refresh only)"),
+    'medicine-prices': (cmd_medicine_prices, "add / re-price medicine catalog entries from a name,price CSV"),
+    'analytics-refresh': (cmd_analytics_refresh, "export new rows to the columnar analytics snapshot"),
+    'analytics-report': (cmd_analytics_report, "monthly trends, weekday load, age by diagnosis from the snapshot"),
+}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Clinic OPD database maintenance")
+    sub = ap.add_subparsers(dest="command", required=True)
+    for name, (fn, help_text) in COMMANDS.items():
+        p = sub.add_parser(name, help=help_text)
+        p.set_defaults(fn=fn)
+        if name == 'prune-changes':
+            p.add_argument("--days", type=int, default=7, help="keep this many days")
+        if name == 'medicine-prices':
+            p.add_argument("file", help="CSV with rows: name,price")
+        if name == 'analytics-refresh':
+            p.add_argument("--full", action="store_true", help="re-export everything instead of only new rows")
+    args = ap.parse_args(argv)
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# metrics.py
+"""
+Opt-in instrumentation: latency histograms for SQL (per statement
+fingerprint), screens and PDF rendering, plus a slow-call log.
+
+Off by default. Turn it on with `python appy.py --metrics`, CLINIC_METRICS=1
+or metrics.enable(). While off, every hook is a single `if ENABLED` check.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache, wraps
+
+ENABLED = os.environ.get("CLINIC_METRICS", "") not in ("", "0")
+SLOW_MS = float(os.environ.get("CLINIC_SLOW_MS", 200))   # calls slower than this go to the slow log
+WINDOW = 2048           # recent samples kept per series for percentiles
+SLOW_LOG_SIZE = 200
+
+_lock = threading.Lock()
+_series = {}            # (kind, name) -> Series
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_gauges = {}            # name -> fn returning a JSON-able dict (e.g. db pool stats)
+
+
+class Series:
+    """Call count, errors, rows and a rolling window of latencies (ms)."""
+    __slots__ = ('calls', 'errors', 'rows', 'total_ms', 'max_ms', 'samples')
+
+    def __init__(self):
+        self.calls = self.errors = self.rows = 0
+        self.total_ms = self.max_ms = 0.0
+        self.samples = deque(maxlen=WINDOW)
+
+    def add(self, ms, rows, error):
+        self.calls += 1
+        self.errors += error
+        self.rows += rows
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        self.samples.append(ms)
+
+    def summary(self):
+        s = sorted(self.samples)
+        def pct(p):
+            return s[min(len(s) - 1, int(len(s) * p))] if s else 0.0
+        return {'calls': self.calls, 'errors': self.errors, 'rows': self.rows,
+                'mean_ms': self.total_ms / self.calls if self.calls else 0.0,
+                'p50_ms': pct(.50), 'p95_ms': pct(.95), 'p99_ms': pct(.99), 'max_ms': self.max_ms}
+
+
+def enable(slow_ms=None):
+    global ENABLED, SLOW_MS
+    ENABLED = True
+    if slow_ms is not None:
+        SLOW_MS = float(slow_ms)
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    with _lock:
+        _series.clear()
+        _slow.clear()
+
+def gauge(name, fn):
+    """Register a snapshot source included in every export (e.g. db pool stats)."""
+    _gauges[name] = fn
+
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_ROWS = re.compile(r"(\(\?\))(?:\s*,\s*\(\?\))+")
+
+@lru_cache(maxsize=1024)
+def fingerprint(q):
+    """Statement shape: whitespace collapsed, literals and IN / VALUES lists folded to ?."""
+    q = " ".join(q.split())
+    q = _LITERALS.sub("?", q)
+    q = _LISTS.sub("(?)", q)
+    return _ROWS.sub(r"\1", q)
+
+
+def record(kind, name, seconds, rows=0, error=False):
+    ms = seconds * 1000
+    with _lock:
+        series = _series.get((kind, name))
+        if series is None:
+            series = _series[(kind, name)] = Series()
+        series.add(ms, rows, error)
+        if ms >= SLOW_MS:
+            _slow.append({'at': time.strftime("%Y-%m-%d %H:%M:%S"), 'kind': kind, 'name': name,
+                          'ms': round(ms, 2), 'rows': rows, 'error': error})
+
+def record_sql(q, seconds, rows=0, error=False):
+    record('sql', fingerprint(q), seconds, rows, error)
+
+
+def timed(kind, name):
+    """Decorator: record the wrapped call's duration under (kind, name) while enabled."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kw):
+            if not ENABLED:
+                return fn(*args, **kw)
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kw)
+            except Exception:
+                record(kind, name, time.perf_counter() - t0, error=True)
+                raise
+            record(kind, name, time.perf_counter() - t0)
+            return result
+        return wrapper
+    return deco
+
+
+def snapshot():
+    """Everything collected so far as a JSON-able dict, slowest series first."""
+    with _lock:
+        series = [dict(kind=k, name=n, **s.summary()) for (k, n), s in _series.items()]
+        slow = list(_slow)
+    series.sort(key=lambda r: r['p95_ms'], reverse=True)
+    gauges = {}
+    for name, fn in _gauges.items():
+        try:
+            gauges[name] = fn()
+        except Exception as e:
+            gauges[name] = {'error': str(e)}
+    return {'enabled': ENABLED, 'slow_ms': SLOW_MS, 'series': series, 'slow_log': slow, 'gauges': gauges}
+
+def export_json(path):
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2, default=str)
@@ -0,0 +1,202 @@
+# migrations.py
+"""
+Versioned schema migrations.
+
+    python maintenance.py migrate
+
+Each migration runs once, in order, and is recorded in schema_version. They
+are written to be safe on any schema this app has shipped with: indexes and
+columns are checked in information_schema (sqlite_master on SQLite) before
+being added or renamed, so a database created from the current workbench.txt,
+or by the SQLite backend's built-in schema, simply gets every version
+recorded. Add new migrations at the end of MIGRATIONS; never edit one that
+has shipped.
+"""
+import time
+
+from db import db
+
+
+def _sqlite():
+    return db.backend.name == 'sqlite'
+
+def _has_table(table):
+    if _sqlite():
+        return db.fetchone("SELECT 1 AS x FROM sqlite_master WHERE type = 'table' AND name = %s", (table,)) is not None
+    return db.fetchone("""SELECT 1 AS x FROM information_schema.tables
+                          WHERE table_schema = DATABASE() AND table_name = %s""", (table,)) is not None
+
+def _has_column(table, column):
+    if _sqlite():
+        return db.fetchone("SELECT 1 AS x FROM pragma_table_info(%s) WHERE name = %s", (table, column)) is not None
+    return db.fetchone("""SELECT 1 AS x FROM information_schema.columns
+                          WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+                       (table, column)) is not None
+
+def _has_index(table, index):
+    if _sqlite():
+        return db.fetchone("SELECT 1 AS x FROM sqlite_master WHERE type = 'index' AND name = %s", (index,)) is not None
+    return db.fetchone("""SELECT 1 AS x FROM information_schema.statistics
+                          WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1""",
+                       (table, index)) is not None
+
+def add_index(table, index, columns):
+    if not _has_index(table, index):
+        db.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+
+# --- migrations ---
+def m001_search_indexes():
+    add_index('patient', 'idx_patient_phone', 'phone')
+    add_index('appointment', 'idx_appt_date_slot', 'date, time_slot')
+    add_index('appointment', 'idx_appt_patient_date', 'patient_id, date')
+
+def m002_rollup_tables():
+    fresh = not _has_table('daily_revenue')
+    db.execute("""CREATE TABLE IF NOT EXISTS daily_revenue (
+                    day DATE PRIMARY KEY,
+                    total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    bills INT NOT NULL DEFAULT 0)""")
+    db.execute("""CREATE TABLE IF NOT EXISTS daily_appointment_status (
+                    day DATE NOT NULL,
+                    status VARCHAR(20) NOT NULL,
+                    cnt INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, status))""")
+    db.execute("""CREATE TABLE IF NOT EXISTS daily_diagnosis (
+                    day DATE NOT NULL,
+                    diagnosis VARCHAR(255) NOT NULL,
+                    cnt INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, diagnosis))""")
+    return fresh
+
+def m003_billing_total_amount():
+    # the original schema named the column `amount`; the app has always written total_amount
+    if _has_column('billing', 'amount'):
+        if _has_column('billing', 'total_amount'):
+            db.execute("UPDATE billing SET total_amount = amount WHERE total_amount IS NULL")
+            db.execute("ALTER TABLE billing DROP COLUMN amount")
+        else:
+            db.execute("ALTER TABLE billing CHANGE amount total_amount DECIMAL(10,2)")
+    db.execute("""CREATE TABLE IF NOT EXISTS billing_items (
+                    item_id INT AUTO_INCREMENT PRIMARY KEY,
+                    bill_id INT NOT NULL,
+                    item_name VARCHAR(200) NOT NULL,
+                    qty INT NOT NULL DEFAULT 1,
+                    price DECIMAL(10,2) NOT NULL DEFAULT 0,
+                    FOREIGN KEY (bill_id) REFERENCES billing(bill_id) ON DELETE CASCADE)""")
+    return True     # revenue rollups may have read NULL totals
+
+def m004_hot_path_indexes():
+    add_index('appointment', 'idx_appt_date_status_slot', 'date, status, time_slot')
+    add_index('patient', 'idx_patient_created', 'created_at')
+    add_index('prescription', 'idx_pres_appt_created', 'appointment_id, created_at')
+    add_index('billing', 'idx_billing_date', 'date')
+
+def m005_appointment_slots():
+    db.execute("""CREATE TABLE IF NOT EXISTS appointment_slot (
+                    date DATE NOT NULL,
+                    time_slot VARCHAR(20) NOT NULL,
+                    appointment_id INT NOT NULL UNIQUE,
+                    PRIMARY KEY (date, time_slot),
+                    FOREIGN KEY (appointment_id) REFERENCES appointment(appointment_id) ON DELETE CASCADE)""")
+    import scheduling
+    scheduling.backfill()
+
+def m006_change_log():
+    if _has_table('change_log'):
+        return
+    db.execute("""CREATE TABLE change_log (
+                    change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    tbl VARCHAR(30) NOT NULL,
+                    row_id INT NOT NULL,
+                    op CHAR(1) NOT NULL DEFAULT 'U',
+                    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_change_tbl (tbl, change_id))""")
+
+def m007_diagnosis_dictionary():
+    if not _has_table('diagnosis'):
+        db.execute("""CREATE TABLE diagnosis (
+                        diagnosis_id INT AUTO_INCREMENT PRIMARY KEY,
+                        name VARCHAR(255) NOT NULL,
+                        norm VARCHAR(255) COLLATE utf8mb4_bin NOT NULL,
+                        uses INT NOT NULL DEFAULT 0,
+                        UNIQUE KEY uq_diagnosis_norm (norm),
+                        INDEX idx_diagnosis_uses (uses))""")
+    if not _has_column('prescription', 'diagnosis_id'):
+        if _sqlite():
+            db.execute("ALTER TABLE prescription ADD COLUMN diagnosis_id INT REFERENCES diagnosis(diagnosis_id)")
+        else:
+            db.execute("""ALTER TABLE prescription ADD COLUMN diagnosis_id INT NULL,
+                          ADD FOREIGN KEY (diagnosis_id) REFERENCES diagnosis(diagnosis_id)""")
+    # the text-keyed daily rollup is replaced by diagnosis.uses
+    db.execute("DROP TABLE IF EXISTS daily_diagnosis")
+    return True     # the rebuild interns existing diagnoses and counts them
+
+def m008_prescription_items():
+    if not _has_table('medicine'):
+        db.execute("""CREATE TABLE medicine (
+                        medicine_id INT AUTO_INCREMENT PRIMARY KEY,
+                        name VARCHAR(200) NOT NULL,
+                        norm VARCHAR(200) COLLATE utf8mb4_bin NOT NULL,
+                        price DECIMAL(10,2) NOT NULL DEFAULT 0,
+                        UNIQUE KEY uq_medicine_norm (norm))""")
+    db.execute("""CREATE TABLE IF NOT EXISTS prescription_items (
+                    prescription_id INT NOT NULL,
+                    line SMALLINT NOT NULL,
+                    medicine_id INT NOT NULL,
+                    qty INT NOT NULL DEFAULT 1,
+                    PRIMARY KEY (prescription_id, line),
+                    FOREIGN KEY (prescription_id) REFERENCES prescription(prescription_id) ON DELETE CASCADE,
+                    FOREIGN KEY (medicine_id) REFERENCES medicine(medicine_id))""")
+    import models
+    models.backfill_prescription_items()
+
+def m009_time_slot_not_null():
+    # appointment paging orders and compares on (date, time_slot, id): a NULL slot matches neither < nor =
+    db.execute("UPDATE appointment SET time_slot = '' WHERE time_slot IS NULL")
+    if not _sqlite():   # SQLite cannot change a column's constraints in place; its built-in schema has it
+        db.execute("ALTER TABLE appointment MODIFY time_slot VARCHAR(20) NOT NULL DEFAULT ''")
+
+
+# (version, name, fn); fn returns True when the dashboard rollups must be rebuilt afterwards
+MIGRATIONS = [
+    (1, "patient phone and appointment date/patient indexes", m001_search_indexes),
+    (2, "dashboard rollup tables", m002_rollup_tables),
+    (3, "billing.amount -> total_amount, billing_items", m003_billing_total_amount),
+    (4, "hot-path indexes: appointment(date,status,time_slot), patient(created_at), "
+        "prescription(appointment_id,created_at), billing(date)", m004_hot_path_indexes),
+    (5, "appointment_slot: one appointment per (date, time_slot)", m005_appointment_slots),
+    (6, "change_log for delta refresh of open lists", m006_change_log),
+    (7, "diagnosis dictionary, prescription.diagnosis_id", m007_diagnosis_dictionary),
+    (8, "medicine catalog, prescription_items parsed from prescription.medicines", m008_prescription_items),
+    (9, "appointment.time_slot NOT NULL DEFAULT ''", m009_time_slot_not_null),
+]
+
+
+def applied():
+    db.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+    return {r['version'] for r in db.fetchall("SELECT version FROM schema_version")}
+
+def pending():
+    done = applied()
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+def migrate(log=print):
+    """Apply every pending migration in order; returns the versions applied."""
+    rebuild = False
+    ran = []
+    for version, name, fn in pending():
+        t0 = time.perf_counter()
+        # MySQL DDL commits implicitly, so each step is made re-runnable instead of transactional
+        rebuild = bool(fn()) or rebuild
+        db.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name[:255]))
+        log(f"  {version:>3}  {name}  ({time.perf_counter() - t0:.2f}s)")
+        ran.append(version)
+    if rebuild:
+        import models
+        models.rebuild_rollups()
+        log("  rebuilt dashboard rollups")
+    return ran
@@ -1,88 +1,665 @@
 # models.py
 from db import db
-from datetime import date
+from datetime import date, datetime, timedelta
+import re
+import threading
+from cache import LRUCache
+from search import NameIndex, tokenize
+
+# read-through caches for the detail lookups screens repeat on every click; each
+# write below invalidates exactly the keys it changes once its transaction commits.
+# Cached rows are shared between callers: treat them as read-only.
+CACHE_TTL = 60      # seconds: upper bound on seeing another terminal's change late
+_patient_cache = LRUCache('patient', maxsize=2048, ttl=CACHE_TTL)
+_appt_cache = LRUCache('appointment_detail', maxsize=1024, ttl=CACHE_TTL)
+_pres_cache = LRUCache('latest_prescription', maxsize=1024, ttl=CACHE_TTL)
+_bill_cache = LRUCache('bill', maxsize=256, ttl=CACHE_TTL)
+
+# --- Change log ---
+# Every write below also appends (table, row id, op) to change_log in its own
+# transaction, so open screens can poll "what changed since change_id X"
+# with one indexed query instead of re-reading their whole list.
+CHANGE_OVERLAP = 200    # change ids re-read behind the watermark (MySQL may commit ids out of order)
+CHANGE_LIMIT = 500      # more changes than this in one poll: reload the list instead
+
+def _log_change(cur, table, row_id, op='U'):
+    cur.execute("INSERT INTO change_log (tbl, row_id, op) VALUES (%s,%s,%s)", (table, row_id, op))
+
+def last_change_id():
+    return db.fetchone("SELECT COALESCE(MAX(change_id), 0) AS id FROM change_log")['id']
+
+def changes_since(table, after_id, limit=CHANGE_LIMIT):
+    """[{'change_id', 'row_id', 'op'}] for `table` with change_id > after_id, oldest first."""
+    return db.fetchall("""SELECT change_id, row_id, op FROM change_log
+                          WHERE tbl = %s AND change_id > %s ORDER BY change_id LIMIT %s""",
+                       (table, after_id, limit), prepared=True)
+
+class ChangeFeed:
+    """
+    Ids of `table` rows changed since the previous poll().
+
+    poll() returns None when the caller should (re)load its whole list: on
+    the first call, and when more than CHANGE_LIMIT changes piled up. The
+    watermark is taken before that load, so nothing committed meanwhile is
+    lost. Each poll re-reads CHANGE_OVERLAP ids behind the watermark and
+    skips the changes it has already returned, which catches a transaction
+    that took a lower id but committed after a higher one.
+    """
+    def __init__(self, table):
+        self.table = table
+        self.last = None
+        self._seen = set()      # change ids inside the overlap window already returned
+
+    def poll(self):
+        if self.last is None:
+            self.last = last_change_id()
+            # the coming full load covers everything already in the window
+            self._seen = {r['change_id'] for r in changes_since(self.table, max(0, self.last - CHANGE_OVERLAP),
+                                                                  CHANGE_OVERLAP)}
+            return None
+        floor = max(0, self.last - CHANGE_OVERLAP)
+        rows = changes_since(self.table, floor, CHANGE_LIMIT + CHANGE_OVERLAP)
+        if len(rows) > CHANGE_LIMIT:
+            self.last, self._seen = None, set()
+            return self.poll()
+        fresh = [r for r in rows if r['change_id'] not in self._seen]
+        if rows:
+            self.last = max(self.last, rows[-1]['change_id'])
+        self._seen = {r['change_id'] for r in rows if r['change_id'] > self.last - CHANGE_OVERLAP}
+        return list(dict.fromkeys(r['row_id'] for r in fresh))
 
 # --- Patients ---
+PATIENT_COLS = "patient_id, name, age, gender, phone"
+
+# token-prefix index over patient names, built on first name search and then
+# caught up from the primary key on every search (picks up other terminals' inserts).
+# The catch-up watermark only moves here: this terminal's own inserts are added
+# on commit but must not skip lower ids another terminal committed meanwhile.
+# Like ChangeFeed, each catch-up re-reads NAME_INDEX_OVERLAP ids behind the
+# watermark: a transaction can take a lower id but commit after a higher one.
+NAME_INDEX_OVERLAP = 200
+_name_index = NameIndex()
+_name_index_lock = threading.Lock()
+_name_index_loaded = False
+_name_index_synced = 0      # highest patient_id read by _sync_name_index
+
+def _sync_name_index():
+    global _name_index_loaded, _name_index_synced
+    with _name_index_lock:
+        if not _name_index_loaded:
+            rows = db.fetchall("SELECT patient_id, name FROM patient")
+            _name_index.bulk_load((r['patient_id'], r['name']) for r in rows)
+            _name_index_synced = max((r['patient_id'] for r in rows), default=0)
+            _name_index_loaded = True
+            return
+        for r in db.fetchall("SELECT patient_id, name FROM patient WHERE patient_id > %s ORDER BY patient_id",
+                             (max(0, _name_index_synced - NAME_INDEX_OVERLAP),)):
+            if r['patient_id'] not in _name_index:      # own inserts and the overlap come back here
+                _name_index.add(r['patient_id'], r['name'])
+            _name_index_synced = max(_name_index_synced, r['patient_id'])
+
 def insert_patient(name, age, gender, phone, address):
     q = "INSERT INTO patient (name,age,gender,phone,address) VALUES (%s,%s,%s,%s,%s)"
-    db.execute(q, (name, age, gender, phone, address))
+    def work(cur):
+        cur.execute(q, (name, age, gender, phone, address))
+        pid = cur.lastrowid
+        _log_change(cur, 'patient', pid, 'I')
+        def committed():
+            if _name_index_loaded:
+                _name_index.add(pid, name)
+            _patient_cache.invalidate(pid)
+        db.after_commit(committed)
+        return pid
+    return db.atomic(work)
+
+def get_patient(patient_id):
+    """One patient row (with address), or None. Cached."""
+    return _patient_cache.get_or_load(patient_id, lambda: db.fetchone(
+        f"SELECT {PATIENT_COLS}, address FROM patient WHERE patient_id=%s", (patient_id,), prepared=True))
 
 def list_patients(limit=1000):
-    return db.fetchall("SELECT patient_id,name,age,gender,phone FROM patient ORDER BY created_at DESC LIMIT %s", (limit,))
+    return db.fetchall(f"SELECT {PATIENT_COLS} FROM patient ORDER BY created_at DESC LIMIT %s", (limit,))
+
+def get_patients_by_ids(ids):
+    """Patient rows for `ids`, returned in the same order as `ids`."""
+    if not ids:
+        return []
+    marks = ",".join(["%s"] * len(ids))
+    rows = db.fetchall(f"SELECT {PATIENT_COLS} FROM patient WHERE patient_id IN ({marks})", tuple(ids))
+    by_id = {r['patient_id']: r for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+def _digits(qstr):
+    d = qstr.replace(" ", "").replace("-", "").lstrip("+")
+    return d if d.isdigit() else None
+
+def _patient_ids_matching(qstr, limit):
+    """Ids of patients matching an id/phone (digits) or name query, best first."""
+    digits = _digits(qstr)
+    if not digits:
+        _sync_name_index()
+        return _name_index.search(qstr, limit)
+    ids = []
+    if len(digits) <= 9:
+        ids = [r['patient_id'] for r in db.fetchall("SELECT patient_id FROM patient WHERE patient_id = %s", (int(digits),))]
+    ids += [r['patient_id'] for r in db.fetchall("SELECT patient_id FROM patient WHERE phone LIKE %s ORDER BY phone LIMIT %s",
+                                                 (digits + "%", limit))]
+    return list(dict.fromkeys(ids))[:limit]
+
+def _words_match(rows, query):
+    words = tokenize(query)
+    return [r for r in rows if all(any(t.startswith(w) for t in tokenize(r['name'])) for w in words)]
+
+def narrow_by_name(rows, query):
+    """
+    Rows (each with 'name') from a complete search for a shorter prefix of
+    `query`, filtered to those `query` matches: every word a prefix of a word
+    of the name, as the name index does. None for queries with digits (id,
+    phone, date), which only the database can answer.
+    """
+    if any(c.isdigit() for c in query):
+        return None
+    return _words_match(rows, query)
 
 def search_patients(query, limit=200):
     """
-    Search patients by ID (exact), name (partial) or phone (partial).
-    If query is empty, returns recent patients (same as list_patients).
+    Search patients by ID (exact), phone (prefix) or name (word prefixes, any order).
+    Digit-only input goes to the primary key and the phone index; anything
+    else goes to the in-process name index. If query is empty, returns recent
+    patients (same as list_patients).
     """
     qstr = query.strip() if query is not None else ""
     if not qstr:
         return list_patients(limit)
-    # treat possible integer id
-    try:
-        pid = int(qstr)
-    except:
-        pid = -1
-    like = f"%{qstr}%"
-    sql = """SELECT patient_id, name, age, gender, phone
-             FROM patient
-             WHERE patient_id = %s OR name LIKE %s OR phone LIKE %s
-             ORDER BY created_at DESC
-             LIMIT %s"""
-    return db.fetchall(sql, (pid, like, like, limit))
+    return get_patients_by_ids(_patient_ids_matching(qstr, limit))
+
+# --- Dashboard rollups ---
+# Daily summary tables kept in step with the base tables by the write functions
+# below (same transaction), so dashboard reads scan days, not rows. The disease
+# distribution reads the `uses` counters of the diagnosis dictionary instead.
+_BUMP_REVENUE = """INSERT INTO daily_revenue (day, total, bills) VALUES (CURDATE(), %s, %s)
+                   ON DUPLICATE KEY UPDATE total = total + VALUES(total), bills = bills + VALUES(bills)"""
+_BUMP_STATUS = """INSERT INTO daily_appointment_status (day, status, cnt) VALUES (%s, %s, %s)
+                  ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)"""
+_BUMP_DIAGNOSIS = "UPDATE diagnosis SET uses = uses + 1 WHERE diagnosis_id = %s"
+
+def rebuild_rollups():
+    """
+    Recompute every rollup table and diagnosis counter from the base tables
+    (backfill / repair), after filling in diagnosis ids and prescription
+    items missing from rows written outside the app.
+    """
+    backfill_diagnoses()
+    backfill_prescription_items()
+    def work(cur):
+        cur.execute("DELETE FROM daily_revenue")
+        cur.execute("""INSERT INTO daily_revenue (day, total, bills)
+                       SELECT date, COALESCE(SUM(total_amount),0), COUNT(*) FROM billing
+                       WHERE date IS NOT NULL GROUP BY date""")
+        cur.execute("DELETE FROM daily_appointment_status")
+        cur.execute("""INSERT INTO daily_appointment_status (day, status, cnt)
+                       SELECT date, status, COUNT(*) FROM appointment
+                       WHERE status IS NOT NULL GROUP BY date, status""")
+        cur.execute("UPDATE diagnosis SET uses = 0")
+        cur.execute("""SELECT diagnosis_id, COUNT(*) AS n FROM prescription
+                       WHERE diagnosis_id IS NOT NULL GROUP BY diagnosis_id""")
+        counts = [(r['n'], r['diagnosis_id']) for r in cur.fetchall()]
+        if counts:
+            cur.executemany("UPDATE diagnosis SET uses = %s WHERE diagnosis_id = %s", counts)
+    db.atomic(work)
+
+# --- Diagnoses ---
+# Free-text diagnoses are interned in the diagnosis dictionary: one row per
+# normalized spelling ("Viral Fever" and "viral  fever " are one entry) with
+# a running `uses` count, and each prescription stores its diagnosis_id.
+DIAGNOSIS_CHOICES = 5000    # most used entries kept in memory for autocompletion
+DIAGNOSIS_CHUNK = 5000      # prescriptions updated per backfill transaction
+_diagnosis_ids = {}         # norm -> diagnosis_id; ids never change, so entries never go stale
+_diagnosis_list_cache = LRUCache('diagnosis_list', maxsize=1, ttl=CACHE_TTL)
+
+def normalize_diagnosis(text):
+    """Dictionary key: whitespace collapsed, case folded ('Viral  Fever ' -> 'viral fever')."""
+    return " ".join((text or "").split()).casefold()[:255]
+
+def _intern(cur, table, ids, name, norm, on_added=None):
+    """
+    Id of the `table` entry (name, norm) from the in-process map `ids`, or
+    inserted in cur's transaction if new; the map learns it on commit.
+    """
+    entry_id = ids.get(norm)
+    if entry_id is not None:
+        return entry_id
+    cur.execute(f"INSERT IGNORE INTO {table} (name, norm) VALUES (%s,%s)", (name, norm))
+    added = cur.rowcount == 1
+    # a locking read also sees an entry another terminal committed after this transaction began
+    cur.execute(f"SELECT {table}_id AS id FROM {table} WHERE norm = %s FOR UPDATE", (norm,))
+    entry_id = cur.fetchone()['id']
+    def remember():
+        ids[norm] = entry_id
+        if added and on_added:
+            on_added()
+    db.after_commit(remember)
+    return entry_id
+
+def _diagnosis_id(cur, diagnosis):
+    """diagnosis_id for the text, added to the dictionary in cur's transaction if new; None when blank."""
+    norm = normalize_diagnosis(diagnosis)
+    if not norm:
+        return None
+    return _intern(cur, 'diagnosis', _diagnosis_ids, " ".join(diagnosis.split())[:255], norm,
+                   _diagnosis_list_cache.clear)
+
+def _load_diagnoses():
+    rows = db.fetchall("""SELECT diagnosis_id, name, norm, uses FROM diagnosis
+                          ORDER BY uses DESC LIMIT %s""", (DIAGNOSIS_CHOICES,))
+    _diagnosis_ids.update((r['norm'], r['diagnosis_id']) for r in rows)
+    return rows
+
+def narrow_diagnoses(rows, query):
+    """Rows (each with 'name') whose words start with the words of `query`, order kept."""
+    return _words_match(rows, query)
+
+def diagnosis_choices(query, limit=20):
+    """Dictionary entries matching `query` (see narrow_diagnoses), most used first; "" lists the most used."""
+    return narrow_diagnoses(_diagnosis_list_cache.get_or_load('all', _load_diagnoses), query)[:limit]
+
+def backfill_diagnoses(chunk=DIAGNOSIS_CHUNK):
+    """
+    Set diagnosis_id on prescriptions saved without one (from before the
+    dictionary, bulk loads, SQL scripts). New entries are named after their
+    most common spelling. Returns the number of prescriptions updated;
+    rebuild_rollups() calls it and then recounts `uses`.
+    """
+    spellings = {}      # norm -> (count, spelling)
+    for r in db.fetchall("""SELECT diagnosis, COUNT(*) AS n FROM prescription
+                            WHERE diagnosis_id IS NULL AND diagnosis IS NOT NULL GROUP BY diagnosis"""):
+        norm = normalize_diagnosis(r['diagnosis'])
+        if norm and r['n'] > spellings.get(norm, (0,))[0]:
+            spellings[norm] = (r['n'], " ".join(r['diagnosis'].split())[:255])
+    if not spellings:
+        return 0
+    db.executemany("INSERT IGNORE INTO diagnosis (name, norm) VALUES (%s,%s)",
+                   [(name, norm) for norm, (_, name) in spellings.items()])
+    ids = {r['norm']: r['diagnosis_id'] for r in db.fetchall("SELECT diagnosis_id, norm FROM diagnosis")}
+    _diagnosis_ids.update(ids)
+    _diagnosis_list_cache.clear()
+    done, after = 0, 0
+    while True:
+        rows = db.fetchall("""SELECT prescription_id, diagnosis FROM prescription
+                              WHERE prescription_id > %s AND diagnosis_id IS NULL
+                              ORDER BY prescription_id LIMIT %s""", (after, chunk))
+        updates = [(ids[norm], r['prescription_id']) for r in rows
+                   if (norm := normalize_diagnosis(r['diagnosis'])) in ids]
+        if updates:
+            db.executemany("UPDATE prescription SET diagnosis_id = %s WHERE prescription_id = %s", updates)
+        done += len(updates)
+        if len(rows) < chunk:
+            return done
+        after = rows[-1]['prescription_id']
 
 # --- Appointments ---
+class SlotTaken(Exception):
+    """The (date, time_slot) already has an appointment."""
+    def __init__(self, ap_date, time_slot):
+        super().__init__(f"{time_slot} on {ap_date} is already booked")
+        self.date, self.time_slot = ap_date, time_slot
+
 def create_appointment(patient_id, ap_date, time_slot):
-    q = "INSERT INTO appointment (patient_id,date,time_slot,status) VALUES (%s,%s,%s,'Pending')"
-    db.execute(q, (patient_id, ap_date, time_slot))
+    """
+    Book a Pending appointment and return its id. The slot is claimed in
+    appointment_slot (primary key date, time_slot) in the same transaction,
+    so of two receptionists booking one slot at once exactly one succeeds and
+    the other gets SlotTaken. An empty time_slot (walk-in) claims nothing.
+    Inside an outer transaction, rolling it back after SlotTaken is up to the caller.
+    """
+    def work(cur):
+        cur.execute("INSERT INTO appointment (patient_id,date,time_slot,status) VALUES (%s,%s,%s,'Pending')",
+                    (patient_id, ap_date, time_slot))
+        appt_id = cur.lastrowid
+        _log_change(cur, 'appointment', appt_id, 'I')
+        if time_slot:
+            cur.execute("INSERT INTO appointment_slot (date, time_slot, appointment_id) VALUES (%s,%s,%s)",
+                        (ap_date, time_slot, appt_id))
+        cur.execute(_BUMP_STATUS, (ap_date, 'Pending', 1))
+        return appt_id
+    try:
+        return db.atomic(work)
+    except db.backend.integrity_errors as e:
+        if not db.backend.is_duplicate(e):
+            raise
+        raise SlotTaken(ap_date, time_slot) from e
 
 def list_appointments_for_date(ap_date):
     q = """SELECT a.appointment_id, a.time_slot, a.status, p.name
            FROM appointment a JOIN patient p ON a.patient_id=p.patient_id
            WHERE a.date=%s ORDER BY a.time_slot"""
-    return db.fetchall(q, (ap_date,))
+    return db.fetchall(q, (ap_date,), prepared=True)
+
+# keyset pagination: rows are ordered by (date, time_slot, appointment_id) DESC and the
+# next page starts strictly after the last row seen, so every page costs the same.
+# time_slot is NOT NULL (migration 9): a NULL would match neither < nor = in the keyset
+APPT_PAGE_SIZE = 100
+
+def appointment_cursor(row):
+    """Cursor for the page that follows `row` (last row of the current page)."""
+    return (row['date'], row['time_slot'] or '', row['appointment_id'])
+
+def _after_cursor(cursor):
+    """WHERE fragment + params selecting rows that sort after `cursor`."""
+    d, ts, aid = cursor
+    return ("(a.date < %s OR (a.date = %s AND (a.time_slot < %s OR (a.time_slot = %s AND a.appointment_id < %s))))",
+            [d, d, ts, ts, aid])
+
+def _appointments_page(conds, params, cursor, limit):
+    conds = list(conds)
+    params = list(params)
+    if cursor:
+        frag, cparams = _after_cursor(cursor)
+        conds.append(frag)
+        params += cparams
+    where = ("WHERE " + " AND ".join(conds)) if conds else ""
+    q = f"""SELECT a.appointment_id, p.name, a.date, a.time_slot, a.status
+            FROM appointment a JOIN patient p ON a.patient_id = p.patient_id
+            {where}
+            ORDER BY a.date DESC, a.time_slot DESC, a.appointment_id DESC
+            LIMIT %s"""
+    return db.fetchall(q, (*params, limit))
+
+def list_appointments_page(cursor=None, limit=APPT_PAGE_SIZE):
+    """
+    One page of all appointments, newest first.
+    cursor: None for the first page, else appointment_cursor(last row of previous page).
+    """
+    return _appointments_page([], [], cursor, limit)
+
+# at most this many matching patients (best first) are expanded into an
+# appointment search, so a page costs the same few queries on any table size
+APPT_SEARCH_PATIENTS = 500
+
+def _date_range(qstr):
+    """(start, end) half-open date range for 'YYYY-MM-DD', 'DD-MM-YYYY', 'DD/MM/YYYY' or 'YYYY-MM'; else None."""
+    for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y"):
+        try:
+            d = datetime.strptime(qstr, fmt).date()
+            return d, d + timedelta(days=1)
+        except ValueError:
+            pass
+    try:
+        d = datetime.strptime(qstr, "%Y-%m").date()
+    except ValueError:
+        return None
+    return d, (d + timedelta(days=32)).replace(day=1)
+
+def search_appointments(query, cursor=None, limit=APPT_PAGE_SIZE):
+    """
+    Search appointments by date, phone or patient name, newest first, paged
+    like list_appointments_page.
+    A date (or YYYY-MM month) becomes a range on appointment.date; a phone
+    number or name is resolved to patient ids first (phone index / name
+    index) and then joined to appointments through idx_appt_patient_date.
+    Only the best APPT_SEARCH_PATIENTS matching patients are covered; see
+    appointment_search_truncated.
+    """
+    qstr = query.strip() if query is not None else ""
+    if not qstr:
+        return list_appointments_page(cursor, limit)
+    rng = _date_range(qstr)
+    if rng:
+        return _appointments_page(["a.date >= %s", "a.date < %s"], [rng[0], rng[1]], cursor, limit)
+    pids = _patient_ids_matching(qstr, APPT_SEARCH_PATIENTS)
+    if not pids:
+        return []
+    marks = ",".join(["%s"] * len(pids))
+    return _appointments_page([f"a.patient_id IN ({marks})"], pids, cursor, limit)
+
+def appointment_search_truncated(query):
+    """True when search_appointments(query) matches more patients than it covers (APPT_SEARCH_PATIENTS)."""
+    qstr = query.strip() if query is not None else ""
+    if not qstr or _date_range(qstr):
+        return False
+    return len(_patient_ids_matching(qstr, APPT_SEARCH_PATIENTS + 1)) > APPT_SEARCH_PATIENTS
+
+def appointment_choices(query, limit=20):
+    """Appointments for a picker, newest first: an appointment id, or anything
+    search_appointments accepts; the most recent ones when query is empty."""
+    qstr = query.strip() if query is not None else ""
+    rows = []
+    if qstr.isdigit() and len(qstr) <= 9:
+        rows = _appointments_page(["a.appointment_id = %s"], [int(qstr)], None, 1)
+    seen = {r['appointment_id'] for r in rows}
+    return rows + [r for r in search_appointments(qstr, None, limit - len(rows)) if r['appointment_id'] not in seen]
+
+def get_appointments_by_ids(ids):
+    """List rows (appointment_id, name, date, time_slot, status) for `ids`, in no particular order."""
+    if not ids:
+        return []
+    marks = ",".join(["%s"] * len(ids))
+    return db.fetchall(f"""SELECT a.appointment_id, p.name, a.date, a.time_slot, a.status
+                           FROM appointment a JOIN patient p ON a.patient_id = p.patient_id
+                           WHERE a.appointment_id IN ({marks})""", tuple(ids))
+
+def get_appointment_detail(appt_id):
+    """Appointment row plus the patient's name, age, gender and phone, or None. Cached."""
+    return _appt_cache.get_or_load(appt_id, lambda: db.fetchone(
+        """SELECT a.*, p.name, p.age, p.gender, p.phone
+           FROM appointment a JOIN patient p ON a.patient_id=p.patient_id
+           WHERE a.appointment_id=%s""", (appt_id,), prepared=True))
 
 def mark_appointment_completed(appt_id):
-    db.execute("UPDATE appointment SET status='Completed' WHERE appointment_id=%s", (appt_id,))
+    def work(cur):
+        cur.execute("SELECT date, status FROM appointment WHERE appointment_id=%s FOR UPDATE", (appt_id,))
+        row = cur.fetchone()
+        if not row or row['status'] == 'Completed':
+            return
+        cur.execute("UPDATE appointment SET status='Completed' WHERE appointment_id=%s", (appt_id,))
+        _log_change(cur, 'appointment', appt_id)
+        cur.execute(_BUMP_STATUS, (row['date'], row['status'], -1))
+        cur.execute(_BUMP_STATUS, (row['date'], 'Completed', 1))
+        db.after_commit(lambda: _appt_cache.invalidate(appt_id))
+    db.atomic(work)
+
+# --- Medicines ---
+# The catalog holds one row per normalized medicine name with its price.
+# Each prescription's medicines text is also stored as prescription_items
+# (one line per medicine), so billing and PDFs never re-parse the text.
+ITEMS_CHUNK = 5000      # prescriptions parsed per backfill transaction
+_medicine_ids = {}      # norm -> medicine_id; ids never change, so entries never go stale
+# comma or newline separated; '\n' also as two characters, as SQL scripts run without escapes store it
+_MEDICINE_SEP = re.compile(r",|\r?\n|\\n")
+
+def normalize_medicine(name):
+    """Catalog key: whitespace collapsed, case folded."""
+    return " ".join((name or "").split()).casefold()[:200]
+
+def parse_medicines(text):
+    """Medicine names in a prescription's medicines text, in order, blanks dropped."""
+    return [n[:200] for n in (" ".join(p.split()) for p in _MEDICINE_SEP.split(text or "")) if n]
+
+def _insert_prescription_items(cur, prescription_id, medicines):
+    names = parse_medicines(medicines)
+    if not names:
+        return
+    ids = [_intern(cur, 'medicine', _medicine_ids, n, normalize_medicine(n)) for n in names]
+    cur.execute("INSERT INTO prescription_items (prescription_id, line, medicine_id, qty) VALUES "
+                + ",".join(["(%s,%s,%s,1)"] * len(ids)),
+                [v for line, mid in enumerate(ids, 1) for v in (prescription_id, line, mid)])
+
+def prescription_items(prescription_id):
+    """[{'line', 'name', 'qty', 'price'}] of a prescription, in order, named and priced from the catalog."""
+    return db.fetchall("""SELECT i.line, m.name, i.qty, m.price FROM prescription_items i
+                          JOIN medicine m ON m.medicine_id = i.medicine_id
+                          WHERE i.prescription_id = %s ORDER BY i.line""", (prescription_id,), prepared=True)
+
+def billable_medicines(appt_id):
+    """Bill lines [{'item_name', 'qty', 'price'}] for the latest prescription of the appointment."""
+    return db.fetchall("""SELECT m.name AS item_name, i.qty, m.price FROM prescription_items i
+                          JOIN medicine m ON m.medicine_id = i.medicine_id
+                          WHERE i.prescription_id = (SELECT prescription_id FROM prescription WHERE appointment_id = %s
+                                                     ORDER BY created_at DESC LIMIT 1)
+                          ORDER BY i.line""", (appt_id,), prepared=True)
+
+def _load_medicine_ids():
+    _medicine_ids.update((r['norm'], r['medicine_id']) for r in db.fetchall("SELECT medicine_id, norm FROM medicine"))
+
+def set_medicine_prices(prices, reprice=True):
+    """
+    Add or re-price catalog entries from {name: price}; returns {name: medicine_id}.
+    reprice=False only adds the names missing from the catalog and keeps existing prices.
+    """
+    rows = [(" ".join(n.split())[:200], normalize_medicine(n), p) for n, p in prices.items() if normalize_medicine(n)]
+    if rows and reprice:
+        db.executemany("""INSERT INTO medicine (name, norm, price) VALUES (%s,%s,%s)
+                          ON DUPLICATE KEY UPDATE price = VALUES(price)""", rows)
+    elif rows:
+        db.executemany("INSERT IGNORE INTO medicine (name, norm, price) VALUES (%s,%s,%s)", rows)
+    _load_medicine_ids()
+    return {n: _medicine_ids[normalize_medicine(n)] for n in prices if normalize_medicine(n)}
+
+def _price_from_bills():
+    """Give unpriced catalog entries the price of the latest bill line with the same name."""
+    last = db.fetchall("""SELECT b.item_name, b.price FROM billing_items b
+                          JOIN (SELECT MAX(item_id) AS item_id FROM billing_items GROUP BY item_name) l
+                            ON l.item_id = b.item_id""")
+    prices = {normalize_medicine(r['item_name']): r['price'] for r in last}
+    unpriced = db.fetchall("SELECT medicine_id, norm FROM medicine WHERE price = 0")
+    updates = [(prices[r['norm']], r['medicine_id']) for r in unpriced if prices.get(r['norm'])]
+    if updates:
+        db.executemany("UPDATE medicine SET price = %s WHERE medicine_id = %s", updates)
+
+def backfill_prescription_items(chunk=ITEMS_CHUNK):
+    """
+    Parse the medicines text of prescriptions that have no items yet (saved
+    before prescription_items, SQL scripts) into items, one transaction per
+    chunk. Names new to the catalog are added and priced from past bills
+    where possible, otherwise at 0. Returns the number of prescriptions filled.
+    """
+    _load_medicine_ids()
+    done, after, added = 0, 0, False
+    while True:
+        rows = db.fetchall("""SELECT pr.prescription_id, pr.medicines FROM prescription pr
+                              WHERE pr.prescription_id > %s AND pr.medicines IS NOT NULL AND pr.medicines <> ''
+                                AND NOT EXISTS (SELECT 1 FROM prescription_items i
+                                                WHERE i.prescription_id = pr.prescription_id)
+                              ORDER BY pr.prescription_id LIMIT %s""", (after, chunk))
+        parsed = [(r['prescription_id'], parse_medicines(r['medicines'])) for r in rows]
+        new = {normalize_medicine(n): n for _, names in parsed for n in names}
+        new = [(n, norm) for norm, n in new.items() if norm not in _medicine_ids]
+        if new:
+            db.executemany("INSERT IGNORE INTO medicine (name, norm) VALUES (%s,%s)", new)
+            _load_medicine_ids()
+            added = True
+        items = [(pid, line, _medicine_ids[normalize_medicine(n)])
+                 for pid, names in parsed for line, n in enumerate(names, 1)]
+        if items:
+            db.executemany("INSERT INTO prescription_items (prescription_id, line, medicine_id, qty) "
+                           "VALUES (%s,%s,%s,1)", items)
+        done += sum(1 for _, names in parsed if names)
+        if len(rows) < chunk:
+            break
+        after = rows[-1]['prescription_id']
+    if added:
+        _price_from_bills()
+    return done
 
 # --- Prescriptions ---
 def save_prescription(appt_id, diagnosis, medicines, dosage, notes, follow_up):
-    q = """INSERT INTO prescription (appointment_id, diagnosis, medicines, dosage, notes, follow_up_date)
-           VALUES (%s,%s,%s,%s,%s,%s)"""
-    db.execute(q, (appt_id, diagnosis, medicines, dosage, notes, follow_up))
+    q = """INSERT INTO prescription (appointment_id, diagnosis, diagnosis_id, medicines, dosage, notes, follow_up_date)
+           VALUES (%s,%s,%s,%s,%s,%s,%s)"""
+    def work(cur):
+        dx_id = _diagnosis_id(cur, diagnosis)
+        cur.execute(q, (appt_id, diagnosis, dx_id, medicines, dosage, notes, follow_up))
+        pres_id = cur.lastrowid
+        _log_change(cur, 'prescription', pres_id, 'I')
+        _insert_prescription_items(cur, pres_id, medicines)
+        if dx_id is not None:
+            cur.execute(_BUMP_DIAGNOSIS, (dx_id,))
+        db.after_commit(lambda: _pres_cache.invalidate(appt_id))
+    db.atomic(work)
+
+def complete_consultation(appt_id, diagnosis, medicines, dosage, notes, follow_up):
+    """Save the prescription and mark the appointment Completed in one commit."""
+    def work():
+        save_prescription(appt_id, diagnosis, medicines, dosage, notes, follow_up)
+        mark_appointment_completed(appt_id)
+    db.run_in_transaction(work)
+
+def _load_latest_prescription(appt_id):
+    pres = db.fetchone("SELECT * FROM prescription WHERE appointment_id=%s ORDER BY created_at DESC LIMIT 1",
+                       (appt_id,), prepared=True)
+    if pres:
+        pres['items'] = prescription_items(pres['prescription_id'])
+    return pres
 
 def latest_prescription_for_appt(appt_id):
-    return db.fetchone("SELECT * FROM prescription WHERE appointment_id=%s ORDER BY created_at DESC LIMIT 1", (appt_id,))
+    """Latest prescription row of the appointment, with its 'items' (see prescription_items), or None."""
+    return _pres_cache.get_or_load(appt_id, lambda: _load_latest_prescription(appt_id))
 
 # --- Billing (itemized) ---
+ITEM_ROWS_PER_INSERT = 500
+
+def _bill_total(items):
+    return sum(i['qty'] * i['price'] for i in items)
+
+def _insert_bills(cur, bills):
+    """
+    Insert [(appointment_id, items)] on an open transaction cursor and return
+    the bill ids. One INSERT per bill (its id comes back on the cursor, no
+    LAST_INSERT_ID() round trip), then all items in multi-row INSERTs and a
+    single revenue rollup update.
+    """
+    bill_ids, rows, grand = [], [], 0
+    for appointment_id, items in bills:
+        total = _bill_total(items)
+        cur.execute("INSERT INTO billing (appointment_id, total_amount, date) VALUES (%s,%s,CURDATE())", (appointment_id, total))
+        bill_id = cur.lastrowid
+        bill_ids.append(bill_id)
+        rows += [(bill_id, it['item_name'], it['qty'], it['price']) for it in items]
+        grand += total
+    if bill_ids:
+        marks = ",".join(["(%s,%s,%s)"] * len(bill_ids))
+        cur.execute(f"INSERT INTO change_log (tbl, row_id, op) VALUES {marks}",
+                    [v for b in bill_ids for v in ('billing', b, 'I')])
+    for i in range(0, len(rows), ITEM_ROWS_PER_INSERT):
+        chunk = rows[i:i + ITEM_ROWS_PER_INSERT]
+        marks = ",".join(["(%s,%s,%s,%s)"] * len(chunk))
+        cur.execute(f"INSERT INTO billing_items (bill_id, item_name, qty, price) VALUES {marks}",
+                    [v for row in chunk for v in row])
+    if bill_ids:
+        cur.execute(_BUMP_REVENUE, (grand, len(bill_ids)))
+        # bills are write-once; only a reused id (rows deleted outside the app) can be stale
+        db.after_commit(lambda: [_bill_cache.invalidate(b) for b in bill_ids])
+    return bill_ids
+
 def create_bill(appointment_id, items):
     """
     items: list of dicts {'item_name':..., 'qty':int, 'price':float}
-    returns bill_id
-    """
-    total = sum(i['qty'] * i['price'] for i in items)
-    # Keep original column names used in app (total_amount + date)
-    db.execute("INSERT INTO billing (appointment_id, total_amount, date) VALUES (%s,%s,CURDATE())", (appointment_id, total))
-    # get last inserted bill_id
-    row = db.fetchone("SELECT LAST_INSERT_ID() AS id")
-    bill_id = row['id']
-    params = []
-    for it in items:
-        params.append((bill_id, it['item_name'], it['qty'], it['price']))
-    db.executemany("INSERT INTO billing_items (bill_id, item_name, qty, price) VALUES (%s,%s,%s,%s)", params)
-    return bill_id
+    returns bill_id. The bill, its items and the revenue rollup commit together.
+    """
+    return db.atomic(lambda cur: _insert_bills(cur, [(appointment_id, items)])[0])
+
+def create_bills(bills):
+    """
+    Batch billing (e.g. end-of-day cashier run): bills is a list of
+    (appointment_id, items) pairs, all created in one transaction.
+    Returns the bill ids in the same order; nothing is saved if any bill fails.
+    """
+    return db.atomic(lambda cur: _insert_bills(cur, bills))
+
+def _load_bill(bill_id):
+    bill = db.fetchone("SELECT * FROM billing WHERE bill_id=%s", (bill_id,), prepared=True)
+    if bill is None:
+        return None
+    return bill, db.fetchall("SELECT * FROM billing_items WHERE bill_id=%s", (bill_id,), prepared=True)
 
 def get_bill(bill_id):
-    bill = db.fetchone("SELECT * FROM billing WHERE bill_id=%s", (bill_id,))
-    items = db.fetchall("SELECT * FROM billing_items WHERE bill_id=%s", (bill_id,))
-    return bill, items
+    return _bill_cache.get_or_load(bill_id, lambda: _load_bill(bill_id)) or (None, [])
 
 # --- Helpers ---
 def get_pending_appointments_today():
     today = date.today().isoformat()
-    return db.fetchall("""SELECT a.appointment_id, p.name, a.time_slot FROM appointment a
+    return db.fetchall("""SELECT a.appointment_id, p.name, a.date, a.time_slot, a.status FROM appointment a
                           JOIN patient p ON a.patient_id=p.patient_id
-                          WHERE a.date=%s AND a.status='Pending' ORDER BY a.time_slot""", (today,))
+                          WHERE a.date=%s AND a.status='Pending' ORDER BY a.time_slot""", (today,), prepared=True)
 
 def get_appointments_for_billing():
     # appointments (recent) that can be billed
@@ -97,11 +674,10 @@ def get_revenue_last_n_days(n=30):
     Returns list of dicts with keys: date (DATE), total (sum)
     """
     # MySQL: CURDATE() - INTERVAL n DAY
-    q = """SELECT date AS date, COALESCE(SUM(total_amount),0) AS total
-           FROM billing
-           WHERE date >= (CURDATE() - INTERVAL %s DAY)
-           GROUP BY date
-           ORDER BY date"""
+    q = """SELECT day AS date, total
+           FROM daily_revenue
+           WHERE day >= (CURDATE() - INTERVAL %s DAY)
+           ORDER BY day"""
     return db.fetchall(q, (n,))
 
 def get_age_group_counts():
@@ -139,39 +715,33 @@ def get_appointment_status_counts():
     """
     Returns list of dicts: {'status':..., 'cnt':...}
     """
-    q = "SELECT status, COUNT(*) AS cnt FROM appointment GROUP BY status"
+    q = """SELECT status, SUM(cnt) AS cnt FROM daily_appointment_status
+           GROUP BY status HAVING SUM(cnt) > 0"""
     return db.fetchall(q)
 
 def get_today_revenue():
-    return db.fetchone("SELECT COALESCE(SUM(total_amount),0) AS total FROM billing WHERE date = CURDATE()")['total']
+    return db.fetchone("SELECT COALESCE(SUM(total),0) AS total FROM daily_revenue WHERE day = CURDATE()")['total']
 
 def get_total_revenue():
-    return db.fetchone("SELECT COALESCE(SUM(total_amount),0) AS total FROM billing")['total']
+    return db.fetchone("SELECT COALESCE(SUM(total),0) AS total FROM daily_revenue")['total']
 
 def get_disease_distribution(limit=10):
-    q = """
-        SELECT diagnosis, COUNT(*) AS cnt
-        FROM prescription
-        WHERE diagnosis IS NOT NULL AND diagnosis <> ''
-        GROUP BY diagnosis
-        ORDER BY cnt DESC
-        LIMIT %s
-    """
+    q = """SELECT name AS diagnosis, uses AS cnt FROM diagnosis
+           WHERE uses > 0 ORDER BY uses DESC LIMIT %s"""
     return db.fetchall(q, (limit,))
 
 def get_revenue_for_date(d):
-    row = db.fetchone("SELECT COALESCE(SUM(total_amount),0) AS total FROM billing WHERE date=%s", (d,))
+    row = db.fetchone("SELECT total FROM daily_revenue WHERE day=%s", (d,))
     return row['total'] if row else 0
 
 def get_appointment_status_counts_for_date(date_str):
     return db.fetchall("""
-        SELECT status, COUNT(*) AS cnt
-        FROM appointment
-        WHERE date = %s
-        GROUP BY status
+        SELECT status, cnt
+        FROM daily_appointment_status
+        WHERE day = %s AND cnt > 0
     """, (date_str,))
 def count_all_appointments():
-    row = db.fetchone("SELECT COUNT(*) AS cnt FROM appointment")
+    row = db.fetchone("SELECT COALESCE(SUM(cnt),0) AS cnt FROM daily_appointment_status")
     return row['cnt'] if row else 0
 
 
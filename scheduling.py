@@ -0,0 +1,176 @@
+# scheduling.py
+"""
+Appointment slot grid and per-day occupancy.
+
+The working day is cut into SLOT_MINUTES slots over SESSIONS (the grid).
+Each day's bookings are held as one integer bitmap, bit i set when grid slot
+i is taken, so "next free slot" is a couple of word operations on a mask of
+a few dozen bits instead of a query per click. Masks are loaded per day (or
+a whole week in one query) from appointment_slot and re-read after
+REFRESH_S, which picks up other terminals' bookings.
+
+The bitmap only answers questions; booking goes through
+models.create_appointment, where the appointment_slot primary key decides
+between two receptionists racing for the same slot. The loser gets
+models.SlotTaken, that day's mask is re-read and the next free slots can be
+offered straight away.
+"""
+import bisect
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import models
+from db import db
+
+SESSIONS = [("09:00", "13:00"), ("14:00", "17:00")]     # [start, end) of each consulting session
+SLOT_MINUTES = 20
+REFRESH_S = 30          # seconds a loaded day is trusted before it is re-read
+
+
+def make_grid(sessions=SESSIONS, minutes=SLOT_MINUTES):
+    """Slot start times ('HH:MM', ascending) covering `sessions`."""
+    grid = []
+    for start, end in sessions:
+        t = datetime.strptime(start, "%H:%M")
+        stop = datetime.strptime(end, "%H:%M")
+        while t + timedelta(minutes=minutes) <= stop:
+            grid.append(t.strftime("%H:%M"))
+            t += timedelta(minutes=minutes)
+    return grid
+
+GRID = make_grid()
+
+
+def _day(d):
+    return date.fromisoformat(d) if isinstance(d, str) else d
+
+
+class Occupancy:
+    """
+    date -> bitmap of booked grid slots.
+
+    Bookings whose time_slot is not on the grid (older free-form entries,
+    walk-ins) are still protected by appointment_slot but do not show up here.
+    """
+    def __init__(self, grid=GRID, refresh=REFRESH_S):
+        self.grid = list(grid)
+        self.index = {s: i for i, s in enumerate(self.grid)}
+        self.full = (1 << len(self.grid)) - 1
+        self.refresh = refresh
+        self._days = {}     # date -> (loaded_at, mask)
+        self._lock = threading.Lock()
+
+    def load(self, first, last):
+        """(Re)read every day in [first, last] with one query."""
+        masks = dict.fromkeys((first + timedelta(days=k) for k in range((last - first).days + 1)), 0)
+        for r in db.fetchall("""SELECT date, time_slot FROM appointment_slot
+                                WHERE date >= %s AND date <= %s""", (first, last)):
+            i = self.index.get(r['time_slot'])
+            if i is not None:
+                masks[r['date']] |= 1 << i
+        now = time.monotonic()
+        with self._lock:
+            for d, m in masks.items():
+                self._days[d] = (now, m)
+
+    def mask(self, day):
+        entry = self._days.get(day)
+        if entry is None or time.monotonic() - entry[0] > self.refresh:
+            self.load(day, day)
+            entry = self._days[day]
+        return entry[1]
+
+    def mark(self, day, slot):
+        i = self.index.get(slot)
+        if i is None:
+            return
+        with self._lock:
+            entry = self._days.get(day)
+            if entry is not None:
+                self._days[day] = (entry[0], entry[1] | 1 << i)
+
+    def forget(self, day=None):
+        with self._lock:
+            if day is None:
+                self._days.clear()
+            else:
+                self._days.pop(day, None)
+
+    def free_slots(self, day, n=5, after=None):
+        """Up to n free grid slots on `day`, earliest first, starting at `after` ('HH:MM') if given."""
+        free = ~self.mask(day) & self.full
+        if after:
+            free &= ~((1 << bisect.bisect_left(self.grid, after)) - 1)
+        out = []
+        while free and len(out) < n:
+            low = free & -free                  # lowest set bit = earliest free slot
+            out.append(self.grid[low.bit_length() - 1])
+            free ^= low
+        return out
+
+    def is_free(self, day, slot):
+        i = self.index.get(slot)
+        return i is not None and not self.mask(day) >> i & 1
+
+    def day_grid(self, day):
+        """[(slot, booked)] for every grid slot of `day`."""
+        m = self.mask(day)
+        return [(s, bool(m >> i & 1)) for i, s in enumerate(self.grid)]
+
+    def week(self, start, days=7):
+        """{date: [(slot, booked)]} for `days` days from `start`, read in one query."""
+        self.load(start, start + timedelta(days=days - 1))
+        return {start + timedelta(days=k): self.day_grid(start + timedelta(days=k)) for k in range(days)}
+
+
+_occupancy = Occupancy()
+
+
+def _not_before_now(day, after):
+    if after is None and day == date.today():
+        return datetime.now().strftime("%H:%M")
+    return after
+
+def free_slots(day, n=5, after=None):
+    """Up to n free slots on `day` (date or 'YYYY-MM-DD'); today's start from the current time."""
+    day = _day(day)
+    return _occupancy.free_slots(day, n, _not_before_now(day, after))
+
+def next_free(day, after=None):
+    slots = free_slots(day, 1, after)
+    return slots[0] if slots else None
+
+def day_grid(day):
+    return _occupancy.day_grid(_day(day))
+
+def week_grid(start, days=7):
+    return _occupancy.week(_day(start), days)
+
+
+def book(patient_id, day, slot):
+    """
+    Book `slot` on `day` for the patient; returns the appointment id.
+    Raises ValueError for a slot off the grid and models.SlotTaken (with
+    .suggestions, the next free slots) when someone else got there first.
+    """
+    day = _day(day)
+    if slot not in _occupancy.index:
+        raise ValueError(f"{slot} is not a bookable slot ({GRID[0]}-{GRID[-1]}, every {SLOT_MINUTES} min)")
+    try:
+        appt_id = models.create_appointment(patient_id, day, slot)
+    except models.SlotTaken as e:
+        _occupancy.forget(day)
+        e.suggestions = free_slots(day, 5, slot)
+        raise
+    db.after_commit(lambda: _occupancy.mark(day, slot))
+    return appt_id
+
+
+def backfill():
+    """Claim appointment_slot rows for appointments booked without one (the earliest wins a double-booked slot)."""
+    db.execute("""INSERT IGNORE INTO appointment_slot (date, time_slot, appointment_id)
+                  SELECT date, time_slot, MIN(appointment_id) FROM appointment
+                  WHERE time_slot IS NOT NULL AND time_slot <> ''
+                  GROUP BY date, time_slot""")
+    _occupancy.forget()
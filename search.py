@@ -0,0 +1,145 @@
+# search.py
+import bisect
+import heapq
+import re
+import sys
+import threading
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [sys.intern(t) for t in _WORD.findall((text or "").lower())]
+
+
+EDGE = 3    # word prefixes up to this length get their own precomputed id list
+
+
+class NameIndex:
+    """
+    In-process token-prefix index over patient names.
+
+    vocab     sorted list of distinct lower-cased name tokens (for prefix ranges)
+    postings  token -> ascending list of patient ids containing that token
+    edges     prefix of length 1..EDGE -> ascending ids having a token with that
+              prefix, so short, very common prefixes ("a", "sh") need no merge
+    names     patient id -> " tok1 tok2 " (substring checks for the other query words)
+
+    A query word matches a name token it is a prefix of; every query word has
+    to match. Results come back full-word matches first, then newest patient
+    first, and the scan stops as soon as `limit` ids are found.
+    """
+    def __init__(self):
+        self._vocab = []
+        self._postings = {}
+        self._edges = {}
+        self._names = {}
+        self._lock = threading.RLock()
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, pid):
+        return pid in self._names
+
+    @staticmethod
+    def _joined(toks):
+        return " " + " ".join(toks) + " "
+
+    @staticmethod
+    def _insert(lists, key, pid):
+        plist = lists.get(key)
+        if plist is None:
+            lists[key] = [pid]
+            return True
+        if plist[-1] < pid:
+            plist.append(pid)
+        else:
+            i = bisect.bisect_left(plist, pid)
+            if i == len(plist) or plist[i] != pid:
+                plist.insert(i, pid)
+        return False
+
+    def add(self, pid, name):
+        toks = tokenize(name)
+        with self._lock:
+            self._names[pid] = self._joined(toks)
+            for t in set(toks):
+                if self._insert(self._postings, t, pid):
+                    bisect.insort(self._vocab, t)
+            for e in {t[:n] for t in toks for n in range(1, EDGE + 1)}:
+                self._insert(self._edges, e, pid)
+            self.max_id = max(self.max_id, pid)
+
+    def bulk_load(self, rows):
+        """rows: iterable of (patient_id, name). Much faster than add() per row."""
+        with self._lock:
+            postings, edges = self._postings, self._edges
+            for pid, name in rows:
+                toks = tokenize(name)
+                self._names[pid] = self._joined(toks)
+                for t in set(toks):
+                    postings.setdefault(t, []).append(pid)
+                for e in {t[:n] for t in toks for n in range(1, EDGE + 1)}:
+                    edges.setdefault(e, []).append(pid)
+                if pid > self.max_id:
+                    self.max_id = pid
+            for plist in postings.values():
+                plist.sort()
+            for plist in edges.values():
+                plist.sort()
+            self._vocab = sorted(postings)
+
+    def _lists(self, word):
+        """Posting lists whose union is every id with a token starting with `word`."""
+        if len(word) <= EDGE:
+            plist = self._edges.get(word)
+            return [plist] if plist else []
+        i = bisect.bisect_left(self._vocab, word)
+        j = bisect.bisect_left(self._vocab, word + "\uffff", i)
+        return [self._postings[t] for t in self._vocab[i:j]]
+
+    def _scan(self, stream, needles, limit, found, seen):
+        names = self._names
+        for pid in stream:
+            if pid in seen:
+                continue
+            seen.add(pid)
+            joined = names[pid]
+            for n in needles:
+                if n not in joined:
+                    break
+            else:
+                found.append(pid)
+                if len(found) >= limit:
+                    return True
+        return False
+
+    def search(self, query, limit=50):
+        words = tokenize(query)
+        if not words:
+            return []
+        found, seen = [], set()
+        with self._lock:
+            # tier 1: every word is a whole token; scan the rarest word's ids
+            exact = [self._postings.get(w) for w in words]
+            if all(exact):
+                lead = min(range(len(words)), key=lambda k: len(exact[k]))
+                needles = [f" {w} " for k, w in enumerate(words) if k != lead]
+                if self._scan(reversed(exact[lead]), needles, limit, found, seen):
+                    return found
+            # tier 2: word prefixes
+            lists = [self._lists(w) for w in words]
+            if not all(lists):
+                return found
+            lead = min(range(len(words)), key=lambda k: sum(map(len, lists[k])))
+            needles = [f" {w}" for k, w in enumerate(words) if k != lead]
+            if len(lists[lead]) == 1:
+                stream = reversed(lists[lead][0])
+            else:
+                stream = heapq.merge(*map(reversed, lists[lead]), reverse=True)
+            # ids rejected in tier 1 can still match on prefixes, so start afresh
+            seen = set(found)
+            self._scan(stream, needles, limit, found, seen)
+            return found
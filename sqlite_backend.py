@@ -0,0 +1,275 @@
+# sqlite_backend.py
+"""
+In-process SQLite storage for db.DB (DB_BACKEND = 'sqlite'), for single-desk
+clinics and offline runs: no server, no network round trip per query.
+
+The connection and cursor wrappers expose the small part of the
+mysql.connector API that db.py uses, and translate the MySQL dialect that
+models.py speaks (%s placeholders, CURDATE(), date - INTERVAL n DAY,
+ON DUPLICATE KEY UPDATE / VALUES(), FOR UPDATE, INSERT IGNORE, LEFT()).
+CURDATE() and RAND() are provided as SQL functions. The database runs in WAL mode so
+readers never wait for the writer; the schema is created on first connect.
+"""
+import random
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+MIN_VERSION = (3, 35, 0)        # ON CONFLICT DO UPDATE without a conflict target
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',    # WAL + NORMAL: durable at checkpoints, no fsync per commit
+    'foreign_keys': 'ON',
+    'busy_timeout': 10000,      # ms a writer waits for the write lock
+    'cache_size': -65536,       # 64 MB page cache per connection
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
+STATEMENT_CACHE = 256           # compiled statements kept per connection
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  user_id INTEGER PRIMARY KEY,
+  username VARCHAR(50) UNIQUE NOT NULL,
+  password VARCHAR(255) NOT NULL,
+  role TEXT NOT NULL DEFAULT 'doctor' CHECK (role IN ('admin','doctor')),
+  full_name VARCHAR(100)
+);
+CREATE TABLE IF NOT EXISTS patient (
+  patient_id INTEGER PRIMARY KEY,
+  name VARCHAR(100) NOT NULL,
+  age INT,
+  gender VARCHAR(10),
+  phone VARCHAR(20),
+  address TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_patient_phone ON patient (phone);
+CREATE INDEX IF NOT EXISTS idx_patient_created ON patient (created_at);
+CREATE TABLE IF NOT EXISTS appointment (
+  appointment_id INTEGER PRIMARY KEY,
+  patient_id INT NOT NULL REFERENCES patient(patient_id) ON DELETE CASCADE,
+  date DATE NOT NULL,
+  time_slot VARCHAR(20) NOT NULL DEFAULT '',
+  status TEXT DEFAULT 'Pending' CHECK (status IN ('Pending','Completed')),
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_appt_date_slot ON appointment (date, time_slot);
+CREATE INDEX IF NOT EXISTS idx_appt_patient_date ON appointment (patient_id, date);
+CREATE INDEX IF NOT EXISTS idx_appt_date_status_slot ON appointment (date, status, time_slot);
+CREATE TABLE IF NOT EXISTS appointment_slot (
+  date DATE NOT NULL,
+  time_slot VARCHAR(20) NOT NULL,
+  appointment_id INT NOT NULL UNIQUE REFERENCES appointment(appointment_id) ON DELETE CASCADE,
+  PRIMARY KEY (date, time_slot)
+);
+CREATE TABLE IF NOT EXISTS diagnosis (
+  diagnosis_id INTEGER PRIMARY KEY,
+  name VARCHAR(255) NOT NULL,
+  norm VARCHAR(255) NOT NULL UNIQUE,
+  uses INT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_diagnosis_uses ON diagnosis (uses);
+CREATE TABLE IF NOT EXISTS prescription (
+  prescription_id INTEGER PRIMARY KEY,
+  appointment_id INT NOT NULL REFERENCES appointment(appointment_id) ON DELETE CASCADE,
+  diagnosis TEXT,
+  diagnosis_id INT REFERENCES diagnosis(diagnosis_id),
+  medicines TEXT,
+  dosage TEXT,
+  notes TEXT,
+  follow_up_date DATE,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_pres_appt_created ON prescription (appointment_id, created_at);
+CREATE TABLE IF NOT EXISTS medicine (
+  medicine_id INTEGER PRIMARY KEY,
+  name VARCHAR(200) NOT NULL,
+  norm VARCHAR(200) NOT NULL UNIQUE,
+  price DECIMAL(10,2) NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS prescription_items (
+  prescription_id INT NOT NULL REFERENCES prescription(prescription_id) ON DELETE CASCADE,
+  line SMALLINT NOT NULL,
+  medicine_id INT NOT NULL REFERENCES medicine(medicine_id),
+  qty INT NOT NULL DEFAULT 1,
+  PRIMARY KEY (prescription_id, line)
+);
+CREATE TABLE IF NOT EXISTS billing (
+  bill_id INTEGER PRIMARY KEY,
+  appointment_id INT NOT NULL REFERENCES appointment(appointment_id) ON DELETE CASCADE,
+  total_amount DECIMAL(10,2),
+  date DATE,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_billing_appt ON billing (appointment_id);
+CREATE INDEX IF NOT EXISTS idx_billing_date ON billing (date);
+CREATE TABLE IF NOT EXISTS billing_items (
+  item_id INTEGER PRIMARY KEY,
+  bill_id INT NOT NULL REFERENCES billing(bill_id) ON DELETE CASCADE,
+  item_name VARCHAR(200) NOT NULL,
+  qty INT NOT NULL DEFAULT 1,
+  price DECIMAL(10,2) NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_items_bill ON billing_items (bill_id);
+CREATE TABLE IF NOT EXISTS change_log (
+  change_id INTEGER PRIMARY KEY AUTOINCREMENT,      -- AUTOINCREMENT: ids never reused after pruning
+  tbl VARCHAR(30) NOT NULL,
+  row_id INT NOT NULL,
+  op CHAR(1) NOT NULL DEFAULT 'U',
+  changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_change_tbl ON change_log (tbl, change_id);
+CREATE TABLE IF NOT EXISTS daily_revenue (
+  day DATE PRIMARY KEY,
+  total DECIMAL(12,2) NOT NULL DEFAULT 0,
+  bills INT NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS daily_appointment_status (
+  day DATE NOT NULL,
+  status VARCHAR(20) NOT NULL,
+  cnt INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, status)
+);
+"""
+
+# Python values in and out: DATE / TIMESTAMP / DECIMAL columns come back as
+# date / datetime / Decimal, like they do from MySQL
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(" "))
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()[:10]))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("DECIMAL", lambda b: Decimal(b.decode()))
+
+
+# --- dialect ---
+_RULES = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"(\w+\(\)|\?)\s*([-+])\s*INTERVAL\s+(\?|\d+)\s+DAY", re.I), r"date(\1, '\2' || \3 || ' days')"),
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.I), ""),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bLAST_INSERT_ID\(\)", re.I), "last_insert_rowid()"),
+    (re.compile(r"\bLEFT\(", re.I), "left_chars("),        # LEFT is a keyword in SQLite (LEFT JOIN)
+]
+
+_UPSERT = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+_UPSERT_VALUE = re.compile(r"\bVALUES\((\w+)\)", re.I)
+
+@lru_cache(maxsize=1024)
+def translate(q):
+    """MySQL statement text -> SQLite. Only the constructs this app uses."""
+    for pattern, repl in _RULES:
+        q = pattern.sub(repl, q)
+    parts = _UPSERT.split(q, maxsplit=1)
+    if len(parts) == 2:
+        # VALUES(col) only means "the value being inserted" inside the update clause
+        q = parts[0] + "ON CONFLICT DO UPDATE SET" + _UPSERT_VALUE.sub(r"excluded.\1", parts[1])
+    return q
+
+def _left(s, n):
+    return None if s is None else str(s)[:n]
+
+
+class Cursor:
+    def __init__(self, raw, dictionary):
+        self._cur = raw
+        self.dictionary = dictionary
+
+    def execute(self, q, params=()):
+        self._cur.execute(translate(q), tuple(params or ()))
+
+    def executemany(self, q, seq):
+        self._cur.executemany(translate(q), seq)
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cur.description or ())
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def fetchall(self):
+        rows = self._cur.fetchall()
+        if not self.dictionary:
+            return rows
+        names = self.column_names
+        return [dict(zip(names, r)) for r in rows]
+
+    def fetchone(self):
+        row = self._cur.fetchone()
+        if row is None or not self.dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def close(self):
+        self._cur.close()
+
+
+class Connection:
+    """sqlite3 connection with the mysql.connector surface db.DB relies on."""
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, dictionary=False, buffered=False, prepared=False):
+        # sqlite3 already caches compiled statements per connection, so prepared needs nothing extra
+        return Cursor(self.raw.cursor(), dictionary)
+
+    def start_transaction(self):
+        # take the write lock up front: a deferred transaction that later writes can fail with SQLITE_BUSY
+        self.raw.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def ping(self, reconnect=False):
+        self.raw.execute("SELECT 1").fetchone()
+
+    def close(self):
+        self.raw.close()
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    errors = (sqlite3.Error,)
+    retry_errors = ()           # no network to lose: a failed statement is a real error
+    integrity_errors = (sqlite3.IntegrityError,)
+
+    def __init__(self, cfg):
+        if sqlite3.sqlite_version_info < MIN_VERSION:
+            raise RuntimeError(f"SQLite {'.'.join(map(str, MIN_VERSION))}+ required, found {sqlite3.sqlite_version}")
+        self.path = cfg['path']
+        self.pragmas = dict(PRAGMAS, **cfg.get('pragmas', {}))
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        raw = sqlite3.connect(self.path, timeout=self.pragmas['busy_timeout'] / 1000, isolation_level=None,
+                              check_same_thread=False,      # the pool hands a connection to one thread at a time
+                              detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=STATEMENT_CACHE)
+        for name, value in self.pragmas.items():
+            raw.execute(f"PRAGMA {name} = {value}")
+        raw.create_function("CURDATE", 0, lambda: date.today().isoformat())
+        raw.create_function("left_chars", 2, _left, deterministic=True)
+        raw.create_function("RAND", 0, random.random)
+        with self._schema_lock:
+            if not self._schema_ready:
+                raw.executescript(SCHEMA)
+                self._schema_ready = True
+        return Connection(raw)
+
+    @staticmethod
+    def is_duplicate(e):
+        return str(e).startswith("UNIQUE constraint failed")
@@ -0,0 +1,72 @@
+# tasks.py
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox, TclError
+
+POLL_MS = 30        # how often the Tk loop checks for finished work
+WORKERS = 4         # keep <= db.POOL_SIZE so workers don't queue on the pool
+
+
+class TaskRunner:
+    """
+    Runs blocking work (database queries) on a small thread pool and hands
+    results back to Tk on the main thread through after().
+
+    Every task belongs to the screen that was showing when it was submitted.
+    cancel_stale() (called from ClinicApp.clear) drops callbacks of tasks from
+    previous screens and cancels the ones that have not started yet.
+    sticky=True tasks (app-wide work such as the startup connect) are exempt.
+    """
+    def __init__(self, root, workers=WORKERS):
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clinic-db")
+        self._finished = queue.SimpleQueue()
+        self._pending = {}     # future -> sticky
+        self._screen = 0
+        self._polling = False
+
+    def submit(self, fn, *args, on_done=None, on_error=None, sticky=False):
+        screen = None if sticky else self._screen
+        fut = self.pool.submit(fn, *args)
+        self._pending[fut] = sticky
+        fut.add_done_callback(lambda f: self._finished.put((screen, f, on_done, on_error)))
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._drain)
+        return fut
+
+    def cancel_stale(self):
+        self._screen += 1
+        for fut, sticky in list(self._pending.items()):
+            if not sticky:
+                fut.cancel()
+
+    def shutdown(self):
+        self.cancel_stale()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _drain(self):
+        while True:
+            try:
+                screen, fut, on_done, on_error = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.pop(fut, None)
+            if (screen is not None and screen != self._screen) or fut.cancelled():
+                continue
+            exc = fut.exception()
+            try:
+                if exc is not None:
+                    (on_error or self._report)(exc)
+                elif on_done:
+                    on_done(fut.result())
+            except TclError:
+                pass    # widget went away while the result was in flight
+        if self._pending:
+            self.root.after(POLL_MS, self._drain)
+        else:
+            self._polling = False
+
+    @staticmethod
+    def _report(exc):
+        messagebox.showerror("Database Error", str(exc))
@@ -1,59 +1,167 @@
 # utils.py
+import io
+import threading
+from contextlib import contextmanager
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 from datetime import datetime
+import metrics
+
+W, H = A4
+FONT, BOLD, SIZE = "Helvetica", "Helvetica-Bold", 11
+
+_a85 = {'lock': threading.Lock(), 'depth': 0, 'saved': None}
+
+@contextmanager
+def _binary_streams():
+    """
+    Keep compressed streams binary while ours are written: ASCII85 only makes
+    PDFs 25% larger and is the single most expensive step of rendering a short
+    document. rl_config is process-wide, so the caller's setting comes back
+    once the last concurrent render (app worker threads) is done.
+    """
+    with _a85['lock']:
+        if not _a85['depth']:
+            _a85['saved'], rl_config.useA85 = rl_config.useA85, 0
+        _a85['depth'] += 1
+    try:
+        yield
+    finally:
+        with _a85['lock']:
+            _a85['depth'] -= 1
+            if not _a85['depth']:
+                rl_config.useA85 = _a85['saved']
+
+
+def _label(c, x, y, text):
+    # static label; returns x where the variable value starts
+    c.drawString(x, y, text)
+    return x + stringWidth(text, FONT, SIZE)
+
+# Static page layouts: drawn once per PdfRenderer as form XObjects, then stamped
+# onto every page. Each returns the x offsets its variable fields start at.
+def _prescription_layout(c):
+    c.setFont(BOLD, 14)
+    c.drawString(40, H-60, "City Care Clinic")
+    c.setFont(FONT, SIZE)
+    c.drawString(40, H-140, "Diagnosis:")
+    c.drawString(40, H-250, "Medicines & Dosage:")
+    c.drawString(40, H-500, "Doctor Signature: ____________________")
+    return {'name': _label(c, 40, H-90, "Patient Name: "), 'phone': _label(c, 40, H-110, "Phone: "),
+            'notes': _label(c, 40, H-380, "Notes: "), 'follow': _label(c, 40, H-410, "Follow-up Date: "),
+            'date': _label(c, 40, H-460, "Date: ")}
+
+def _invoice_layout(c):
+    c.setFont(BOLD, 16); c.drawString(40, H-60, "City Care Clinic   Invoice")
+    c.setFont(FONT, SIZE)
+    y = H-150
+    c.drawString(40, y, "Item"); c.drawString(320, y, "Qty"); c.drawString(420, y, "Price"); c.drawString(520, y, "Amount")
+    return {'patient': _label(c, 40, H-90, "Patient / Visit: "), 'bill': _label(c, 40, H-110, "Bill ID: ")}
+
+
+class PdfRenderer:
+    """
+    Renders prescriptions / invoices into one in-memory PDF, one or more
+    pages per document. With templates on, the static layout of each
+    document type is defined once per renderer as a form XObject and reused
+    by every page, so each document only adds its variable text. A renderer
+    holding a single document gains nothing from the form, so the one-shot
+    helpers below turn templates off. Use getvalue() for the bytes.
+    """
+    LAYOUTS = {'prescription': _prescription_layout, 'invoice': _invoice_layout}
+
+    def __init__(self, templates=True, compress=True):
+        self.buf = io.BytesIO()
+        self.c = canvas.Canvas(self.buf, pagesize=A4, pageCompression=int(compress))
+        self.templates = templates
+        self._forms = {}
+        self.documents = 0
+
+    def _stamp(self, kind):
+        c = self.c
+        if not self.templates:
+            x = self.LAYOUTS[kind](c)
+        else:
+            if kind not in self._forms:
+                c.beginForm(kind)
+                self._forms[kind] = self.LAYOUTS[kind](c)
+                c.endForm()
+            c.doForm(kind)
+            x = self._forms[kind]
+        c.setFont(FONT, SIZE)
+        return x
+
+    @metrics.timed('pdf', 'prescription page')
+    def prescription(self, patient_info, prescription):
+        # patient_info: dict with name, age, gender, phone, address
+        # prescription: dict with diagnosis, items (or medicines), dosage, notes, follow_up_date, created_at
+        c = self.c
+        x = self._stamp('prescription')
+        c.drawString(x['name'], H-90, f"{patient_info.get('name','')}")
+        c.drawString(300, H-90, f"Age: {patient_info.get('age','')}  Gender: {patient_info.get('gender','')}")
+        c.drawString(x['phone'], H-110, f"{patient_info.get('phone','')}")
+        t = c.beginText(40, H-160); t.setFont(FONT, SIZE)
+        for line in (prescription.get('diagnosis') or "").split("\n"):
+            t.textLine(line)
+        c.drawText(t)
+        t2 = c.beginText(40, H-270); t2.setFont(FONT, SIZE)
+        dos = prescription.get('dosage','')
+        items = prescription.get('items')
+        if not items:   # not itemized yet (see models.backfill_prescription_items): split the text the same way
+            import models   # pure helper; importing db opens no connection
+            items = [{'line': i, 'name': n} for i, n in enumerate(models.parse_medicines(prescription.get('medicines')), 1)]
+        for it in items:
+            t2.textLine(f"{it['line']}. {it['name']} - {dos}")
+        c.drawText(t2)
+        c.drawString(x['notes'], H-380, f"{prescription.get('notes','')}")
+        c.drawString(x['follow'], H-410, f"{prescription.get('follow_up_date') or 'N/A'}")
+        c.drawString(x['date'], H-460, f"{prescription.get('created_at') or datetime.now()}")
+        c.showPage()
+        self.documents += 1
+
+    @metrics.timed('pdf', 'invoice page')
+    def invoice(self, bill, items, patient_name):
+        c = self.c
+        x = self._stamp('invoice')
+        c.drawString(x['patient'], H-90, f"{patient_name}")
+        c.drawString(x['bill'], H-110, f"{bill['bill_id']}   Date: {bill['date']}")
+        y = H-170
+        total = 0
+        for it in items:
+            amt = it['qty'] * float(it['price'])
+            c.drawString(40, y, it['item_name'])
+            c.drawString(320, y, str(it['qty']))
+            c.drawString(420, y, f"{it['price']:.2f}")
+            c.drawString(520, y, f"{amt:.2f}")
+            total += amt
+            y -= 18
+            if y < 120:
+                c.showPage(); c.setFont(FONT, SIZE); y = H-60
+        c.drawString(420, y-10, "Total:"); c.drawString(520, y-10, f"{total:.2f}")
+        c.showPage()
+        self.documents += 1
+
+    @metrics.timed('pdf', 'write document')
+    def getvalue(self):
+        with _binary_streams():     # stream filters are picked when the document is formatted
+            self.c.save()
+        return self.buf.getvalue()
+
+
+def render_prescription_pdf(patient_info, prescription):
+    r = PdfRenderer(templates=False); r.prescription(patient_info, prescription)
+    return r.getvalue()
+
+def render_invoice_pdf(bill, items, patient_name):
+    r = PdfRenderer(templates=False); r.invoice(bill, items, patient_name)
+    return r.getvalue()
 
 def export_prescription_pdf(filename, patient_info, prescription):
-    # patient_info: dict with name, age, gender, phone, address
-    # prescription: dict with diagnosis, medicines, dosage, notes, follow_up_date, created_at
-    c = canvas.Canvas(filename, pagesize=A4)
-    w, h = A4
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(40, h-60, "City Care Clinic")
-    c.setFont("Helvetica", 11)
-    c.drawString(40, h-90, f"Patient Name: {patient_info.get('name','')}")
-    c.drawString(300, h-90, f"Age: {patient_info.get('age','')}  Gender: {patient_info.get('gender','')}")
-    c.drawString(40, h-110, f"Phone: {patient_info.get('phone','')}")
-    c.drawString(40, h-140, "Diagnosis:")
-    t = c.beginText(40, h-160); t.setFont("Helvetica", 11)
-    for line in (prescription.get('diagnosis') or "").split("\n"):
-        t.textLine(line)
-    c.drawText(t)
-    c.drawString(40, h-250, "Medicines & Dosage:")
-    t2 = c.beginText(40, h-270); t2.setFont("Helvetica", 11)
-    meds = prescription.get('medicines','')
-    dos = prescription.get('dosage','')
-    meds_list = [m.strip() for m in meds.split(",") if m.strip()]
-    for i,m in enumerate(meds_list, start=1):
-        t2.textLine(f"{i}. {m} - {dos}")
-    c.drawText(t2)
-    c.drawString(40, h-380, f"Notes: {prescription.get('notes','')}")
-    c.drawString(40, h-410, f"Follow-up Date: {prescription.get('follow_up_date') or 'N/A'}")
-    c.drawString(40, h-460, f"Date: {prescription.get('created_at') or datetime.now()}")
-    c.drawString(40, h-500, "Doctor Signature: ____________________")
-    c.save()
+    with open(filename, "wb") as f:
+        f.write(render_prescription_pdf(patient_info, prescription))
 
 def export_invoice_pdf(filename, bill, items, patient_name):
-    c = canvas.Canvas(filename, pagesize=A4)
-    w, h = A4
-    c.setFont("Helvetica-Bold", 16); c.drawString(40, h-60, "City Care Clinic   Invoice")
-    c.setFont("Helvetica", 11)
-    c.drawString(40, h-90, f"Patient / Visit: {patient_name}")
-    c.drawString(40, h-110, f"Bill ID: {bill['bill_id']}   Date: {bill['date']}")
-    # table header
-    y = h-150
-    c.drawString(40, y, "Item"); c.drawString(320, y, "Qty"); c.drawString(420, y, "Price"); c.drawString(520, y, "Amount")
-    y -= 20
-    total = 0
-    for it in items:
-        amt = it['qty'] * float(it['price'])
-        c.drawString(40, y, it['item_name'])
-        c.drawString(320, y, str(it['qty']))
-        c.drawString(420, y, f"{it['price']:.2f}")
-        c.drawString(520, y, f"{amt:.2f}")
-        total += amt
-        y -= 18
-        if y < 120:
-            c.showPage(); y = h-60
-    c.drawString(420, y-10, "Total:"); c.drawString(520, y-10, f"{total:.2f}")
-    c.save()
+    with open(filename, "wb") as f:
+        f.write(render_invoice_pdf(bill, items, patient_name))
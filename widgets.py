@@ -0,0 +1,339 @@
+# widgets.py
+import bisect
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+
+class TreeSync:
+    """
+    Keeps a Treeview's rows in step with a changing source, touching only
+    the items that actually changed.
+
+    row_key(row) -> key             one item per key (iid = str(key))
+    row_values(row) -> tuple        values shown
+    sort_key(row) -> comparable     optional: items kept in this order
+                                    (reverse=True for newest first); else
+                                    new rows are appended
+    keep(row) -> bool               optional: rows failing it are removed
+                                    (e.g. an appointment no longer pending)
+
+    apply(rows, removed) upserts `rows` and deletes the `removed` keys: the
+    delta path. replace(rows) reconciles the tree with a full result; it
+    still only inserts, moves, updates or deletes what differs, so a full
+    refresh does not flicker or lose the selection.
+    """
+    def __init__(self, tree, row_key, row_values, sort_key=None, reverse=False, keep=None):
+        self.tree = tree
+        self.row_key = row_key
+        self.row_values = row_values
+        self.sort_key = sort_key
+        self.reverse = reverse
+        self.keep = keep
+        self._values = {}       # iid -> values shown
+        self._sort = {}         # iid -> sort key
+        self._order = []        # ascending (sort key, iid)
+
+    def __contains__(self, key):
+        return str(key) in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def _index(self, sk, iid):
+        pos = bisect.bisect_left(self._order, (sk, iid))
+        return len(self._order) - pos if self.reverse else pos
+
+    def _put(self, row):
+        iid = str(self.row_key(row))
+        if self.keep and not self.keep(row):
+            self._drop(iid)
+            return
+        values = tuple(self.row_values(row))
+        sk = self.sort_key(row) if self.sort_key else None
+        if iid not in self._values:
+            index = "end"
+            if sk is not None:
+                index = self._index(sk, iid)
+                bisect.insort(self._order, (sk, iid))
+                self._sort[iid] = sk
+            self.tree.insert("", index, iid=iid, values=values)
+            self._values[iid] = values
+            return
+        if sk is not None and sk != self._sort[iid]:
+            self._order.remove((self._sort[iid], iid))
+            self.tree.move(iid, "", self._index(sk, iid))
+            bisect.insort(self._order, (sk, iid))
+            self._sort[iid] = sk
+        if values != self._values[iid]:
+            self.tree.item(iid, values=values)
+            self._values[iid] = values
+
+    def _drop(self, iid):
+        if self._values.pop(iid, None) is None:
+            return
+        self.tree.delete(iid)
+        sk = self._sort.pop(iid, None)
+        if sk is not None:
+            self._order.remove((sk, iid))
+
+    def apply(self, rows=(), removed=()):
+        for r in rows:
+            self._put(r)
+        for key in removed:
+            self._drop(str(key))
+
+    def replace(self, rows):
+        """Show exactly `rows` (in sort_key order, else in the given order)."""
+        if self.keep:
+            rows = [r for r in rows if self.keep(r)]
+        wanted = {str(self.row_key(r)) for r in rows}
+        for iid in [i for i in self._values if i not in wanted]:
+            self._drop(iid)
+        for r in rows:
+            self._put(r)
+        if self.sort_key is None:
+            for i, r in enumerate(rows):
+                iid = str(self.row_key(r))
+                if self.tree.index(iid) != i:
+                    self.tree.move(iid, "", i)
+
+    def clear(self):
+        self.tree.delete(*self._values)
+        self._values.clear()
+        self._sort.clear()
+        self._order.clear()
+
+
+class PagedTreeview(ttk.Treeview):
+    """
+    Treeview that loads its rows page by page.
+
+    fetch_page(cursor, limit) -> rows     runs on the TaskRunner (worker thread)
+    row_values(row) -> tuple              values shown for a row
+    row_cursor(row) -> cursor             cursor passed to fetch the page after `row`
+
+    The next page is requested when the visible area reaches `prefetch`
+    (fraction of the loaded rows), so memory and query cost grow with what
+    the user actually scrolls through, not with the table size.
+
+    With row_key, rows are kept by key (see TreeSync, ordered by row_cursor,
+    newest first) and apply_changes() can merge changed rows into the
+    loaded pages.
+    """
+    def __init__(self, master, runner, fetch_page, row_values, row_cursor,
+                 page_size=100, prefetch=0.8, row_key=None, **kw):
+        super().__init__(master, **kw)
+        self.runner = runner
+        self.fetch_page = fetch_page
+        self.row_values = row_values
+        self.row_cursor = row_cursor
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.scrollbar = ttk.Scrollbar(master, orient="vertical", command=self.yview)
+        self.configure(yscrollcommand=self._on_scroll)
+        self._cursor = None
+        self._exhausted = False
+        self._loading = False
+        self._gen = 0
+        self.sync = TreeSync(self, row_key, row_values, sort_key=row_cursor, reverse=True) if row_key else None
+
+    def reset(self, fetch_page=None):
+        """Drop all rows and start again from the first page."""
+        if fetch_page is not None:
+            self.fetch_page = fetch_page
+        self._gen += 1
+        if self.sync:
+            self.sync.clear()
+        self.delete(*self.get_children())
+        self._cursor = None
+        self._exhausted = False
+        self._loading = False
+        self._load_more()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) >= self.prefetch:
+            self._load_more()
+
+    def _load_more(self):
+        if self._loading or self._exhausted:
+            return
+        self._loading = True
+        gen = self._gen
+        self.runner.submit(self.fetch_page, self._cursor, self.page_size,
+                           on_done=lambda rows: self._append(gen, rows))
+
+    def _append(self, gen, rows):
+        if gen != self._gen:
+            return
+        self._loading = False
+        if self.sync:
+            self.sync.apply(rows)
+        else:
+            for r in rows:
+                self.insert("", "end", values=self.row_values(r))
+        if rows:
+            self._cursor = self.row_cursor(rows[-1])
+        self._exhausted = len(rows) < self.page_size
+        # if the page did not fill the view, Tk reports last == 1.0 through
+        # yscrollcommand and _on_scroll asks for the next one
+
+    def apply_changes(self, rows, insert=True):
+        """
+        Merge changed rows (needs row_key): loaded rows are updated in place;
+        new ones are inserted only if they sort within the loaded pages (later
+        pages will bring the rest), and only when `insert` (e.g. not while a
+        search result is showing).
+        """
+        fresh = [r for r in rows if self.sync.row_key(r) in self.sync or
+                 (insert and (self._exhausted or (self._cursor is not None and self.row_cursor(r) > self._cursor)))]
+        self.sync.apply(fresh)
+
+
+class AutocompleteEntry(ttk.Entry):
+    """
+    Entry that looks matches up in the database as the user types and shows
+    the best few in a drop-down list.
+
+    fetch(query, limit) -> rows           runs on the TaskRunner; "" means "recent"
+    row_label(row) -> str                 text shown for a row (and put in the entry)
+    row_key(row) -> value                 what .value holds once a row is picked
+    narrow(rows, query) -> rows | None    optional: filter a complete result for a
+                                          shorter prefix down to `query`, or None
+                                          when only the database can tell
+
+    Lookups wait `delay_ms` after the last keystroke. Results are kept per
+    query; a fetch that returned fewer than `fetch_limit` rows is complete,
+    so a longer query starting with it is answered by narrow() with no round
+    trip. Only the first `shown` rows are listed. Up/Down/Return/Escape work
+    from the entry; on_select(row) is called when a row is picked.
+    """
+    CACHE_QUERIES = 64
+
+    def __init__(self, master, runner, fetch, row_label, row_key, narrow=None, on_select=None,
+                 shown=15, fetch_limit=100, delay_ms=250, **kw):
+        self.var = kw.pop('textvariable', None) or tk.StringVar(master)
+        super().__init__(master, textvariable=self.var, **kw)
+        self.runner = runner
+        self.fetch = fetch
+        self.row_label = row_label
+        self.row_key = row_key
+        self.narrow = narrow
+        self.on_select = on_select
+        self.shown = shown
+        self.fetch_limit = fetch_limit
+        self.delay_ms = delay_ms
+        self.value = None           # row_key of the picked row, None while typing
+        self.row = None
+        self._results = OrderedDict()     # normalized query -> rows
+        self._rows = []                   # rows behind the list entries
+        self._after = None
+        self._gen = 0
+        self._list = tk.Listbox(self.winfo_toplevel(), height=shown, exportselection=False)
+        self._list.bind("<ButtonRelease-1>", lambda e: self._pick())
+        self.bind("<KeyRelease>", self._on_key)
+        self.bind("<Down>", lambda e: self._move(1))
+        self.bind("<Up>", lambda e: self._move(-1))
+        self.bind("<Return>", lambda e: self._pick())
+        self.bind("<Escape>", lambda e: self._hide())
+        self.bind("<FocusIn>", lambda e: self._schedule(0) if not self.var.get() else None)
+        self.bind("<FocusOut>", lambda e: self.after(150, self._hide))   # let a click on the list land first
+        self.bind("<Destroy>", lambda e: self._list.destroy() if e.widget is self else None)
+
+    def clear(self):
+        self.var.set("")
+        self.value = self.row = None
+        self._hide()
+
+    def forget_results(self):
+        """Drop cached lookups (e.g. after adding a row the list should show)."""
+        self._results.clear()
+
+    # --- lookup ---
+    def _on_key(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        self.value = self.row = None
+        self._schedule(self.delay_ms)
+
+    def _schedule(self, delay):
+        if self._after is not None:
+            self.after_cancel(self._after)
+        self._after = self.after(delay, self._lookup)
+
+    @staticmethod
+    def _norm(query):
+        return " ".join(query.lower().split())
+
+    def _cached(self, q):
+        rows = self._results.get(q)
+        if rows is not None:
+            self._results.move_to_end(q)
+            return rows
+        if self.narrow is None:
+            return None
+        # longest shorter prefix with a complete result
+        for n in range(len(q) - 1, -1, -1):
+            rows = self._results.get(q[:n])
+            if rows is not None and len(rows) < self.fetch_limit:
+                return self.narrow(rows, q)
+        return None
+
+    def _lookup(self):
+        self._after = None
+        self._gen += 1
+        q = self._norm(self.var.get())
+        rows = self._cached(q)
+        if rows is not None:
+            self._show(rows)
+            return
+        gen = self._gen
+        self.runner.submit(self.fetch, q, self.fetch_limit, on_done=lambda rows: self._fetched(gen, q, rows))
+
+    def _fetched(self, gen, q, rows):
+        self._results[q] = rows
+        while len(self._results) > self.CACHE_QUERIES:
+            self._results.popitem(last=False)
+        if gen == self._gen:
+            self._show(rows)
+
+    # --- drop-down ---
+    def _show(self, rows):
+        self._rows = rows[:self.shown]
+        self._list.delete(0, "end")
+        if not self._rows or self.focus_get() is not self:
+            self._hide()
+            return
+        for r in self._rows:
+            self._list.insert("end", self.row_label(r))
+        self._list.configure(height=len(self._rows))
+        self._list.place(in_=self, relx=0, rely=1, relwidth=1)
+        self._list.lift()
+
+    def _hide(self):
+        self._list.place_forget()
+
+    def _move(self, step):
+        if not self._list.winfo_ismapped():
+            self._schedule(0)
+            return "break"
+        cur = self._list.curselection()
+        i = max(0, min(len(self._rows) - 1, (cur[0] + step) if cur else 0))
+        self._list.selection_clear(0, "end")
+        self._list.selection_set(i)
+        self._list.see(i)
+        return "break"
+
+    def _pick(self):
+        cur = self._list.curselection()
+        if not cur or not self._list.winfo_ismapped():
+            return
+        row = self._rows[cur[0]]
+        self.value, self.row = self.row_key(row), row
+        self.var.set(self.row_label(row))
+        self.icursor("end")
+        self._hide()
+        if self.on_select:
+            self.on_select(row)
+        return "break"